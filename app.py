@@ -1,16 +1,35 @@
 import os
-import requests
 import re
 import json
-import sqlite3
 import time
 import base64
-from datetime import datetime, date
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, send_from_directory, Response
+import hashlib
+import secrets
+import tempfile
+from urllib.parse import unquote
+from datetime import datetime, date, timedelta
+from functools import wraps
+from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, send_from_directory, send_file, Response, g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event as sa_event, select, union
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import defer, joinedload, selectinload
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+from markupsafe import escape
 from werkzeug.utils import secure_filename
 from werkzeug.security import generate_password_hash, check_password_hash
+import discord_outbox
+from perf import PerfMonitor
+from strategy_cache import PayloadCache
+from car_catalog import CatalogCache, CarRow
+import revisions
+import telemetry_store
+import session_cookie
+import image_variants
+import upload_store
+import static_assets
+import race_archive
 
 app = Flask(__name__)
 
@@ -25,29 +44,28 @@ WEB_PUBLIC_URL = "https://legacyesportsclub.etern8.app"
 basedir = os.path.abspath(os.path.dirname(__file__))
 db_name = 'legacy_strategy.db'
 
-# Preferencia: Carpeta instance > Carpeta raíz
+# Preferencia: Carpeta instance > Carpeta raíz (create_app() crea las carpetas)
 instance_path = os.path.join(basedir, 'instance')
-if not os.path.exists(instance_path):
-    os.makedirs(instance_path)
-    
 db_path = os.path.join(instance_path, db_name)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.secret_key = 'LEGACY_2026_KEY' 
+app.secret_key = session_cookie.SECRET_KEY   # compartida con telemetry_service.py
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024 
 
 UPLOAD_FOLDER = os.path.join('static', 'uploads')
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'pdf'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 # 3. Webhook Discord
 DISCORD_WEBHOOK_URL = "https://discord.com/api/webhooks/1461067385736794285/ocjLAfJE2en90MjwsftvESrPp5OduaySwxhaFhY8yBevQbD_i3R1Ktwwl5__pPpixezL"
 
-db = SQLAlchemy(app)
+# Extensiones sin app: create_app() las engancha (importar app.py no abre la BD ni toca disco)
+db = SQLAlchemy()
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
+perf = PerfMonitor()                    # init_app en create_app(): PERF_MONITOR puede venir en su config
+strategy_cache = None                   # PayloadCache, en create_app() (tamaño según config)
+car_catalog = CatalogCache()
 
 @login_manager.user_loader
 def load_user(user_id): return User.query.get(int(user_id))
@@ -68,11 +86,13 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(200), nullable=False)
     role = db.Column(db.String(20), default='privateer')
     is_approved = db.Column(db.Boolean, default=False)
-    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=True, index=True)
     requested_team = db.Column(db.String(100), nullable=True)
     driver_profile = db.relationship('Driver', backref='user', uselist=False)
     def set_password(self, p): self.password_hash = generate_password_hash(p)
     def check_password(self, p): return check_password_hash(self.password_hash, p)
+# orden del panel de admin (pendientes primero, más nuevos primero) sin TEMP B-TREE
+db.Index('ix_user_approved_id', User.is_approved, User.id.desc())
 
 class Driver(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -91,17 +111,15 @@ class Driver(db.Model):
     social_twitch = db.Column(db.String(100), nullable=True)
     country = db.Column(db.String(50), default="España")
     
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True, index=True)
     
     # Relaciones
     palmares = db.relationship('Palmares', backref='driver', lazy=True, cascade="all, delete-orphan")
     achievements = db.relationship('Achievement', backref='driver', lazy=True, cascade="all, delete-orphan")
 
     def to_dict(self):
-        email_val = ""
-        if self.user_id:
-            usuario = User.query.get(self.user_id)
-            if usuario: email_val = usuario.email
+        # usa la relación (cargada con joinedload en las vistas) en vez de una consulta por piloto
+        email_val = self.user.email if self.user_id and self.user else ""
         return {'id': self.id, 'name': self.name, 'discord': self.discord, 'iracing_id': self.iracing_id, 'simulators': self.simulators, 'hardware': self.hardware, 'number': self.number, 'photo': self.photo, 'email': email_val}
 
 class Palmares(db.Model):
@@ -109,13 +127,13 @@ class Palmares(db.Model):
     title_name = db.Column(db.String(150), nullable=False)
     year = db.Column(db.String(10), nullable=True)
     image = db.Column(db.String(150), nullable=False)
-    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False, index=True)
 
 class Achievement(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     year = db.Column(db.String(10), nullable=True)
     title = db.Column(db.String(200), nullable=False)
-    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=False, index=True)
 
 event_drivers = db.Table('event_drivers', db.Column('event_id', db.Integer, db.ForeignKey('event.id'), primary_key=True), db.Column('driver_id', db.Integer, db.ForeignKey('driver.id'), primary_key=True))
 
@@ -130,9 +148,12 @@ class Event(db.Model):
     week = db.Column(db.Integer)
     alert_sent = db.Column(db.Boolean, default=False)
     broadcast = db.Column(db.String(500), nullable=True)
-    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=True)
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=True, index=True)
     driver_id = db.Column(db.Integer, nullable=True)
+    # Fecha materializada desde date_str (parse_smart_date) para ordenar/filtrar en SQL
+    event_date = db.Column(db.Date, nullable=True)
     drivers = db.relationship('Driver', secondary=event_drivers, backref=db.backref('events_participated', lazy=True))
+    __table_args__ = (db.Index('ix_event_type_date', 'type', 'event_date'),)
 
 class Strategy(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -144,63 +165,220 @@ class Strategy(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     team_id = db.Column(db.Integer, db.ForeignKey('team.id'), nullable=True)
     is_shared = db.Column(db.Boolean, default=False)
+    version = db.Column(db.Integer, default=1, nullable=False)  # se incrementa en cada actualización (clave de caché / ETag)
+    cache_token = db.Column(db.String(16), nullable=False, default=lambda: secrets.token_hex(8))  # SQLite reutiliza ids borrados: distingue la fila en caché/ETag
+    # Una rama del listado por índice: propias y compartidas del equipo (rowid/id va implícito en la clave)
+    __table_args__ = (db.Index('ix_strategy_user_created', 'user_id', 'created_at'), db.Index('ix_strategy_team_shared_created', 'team_id', 'is_shared', 'created_at'))
+
+class StrategyRevision(db.Model):
+    # Historial compacto: snapshot completo cada revisions.SNAPSHOT_EVERY versiones, parches JSON entre medias
+    id = db.Column(db.Integer, primary_key=True)
+    strategy_id = db.Column(db.Integer, db.ForeignKey('strategy.id', ondelete='CASCADE'), nullable=False)
+    rev = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'snapshot' | 'patch'
+    data = db.Column(db.Text, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    name = db.Column(db.String(120))
+    car_class = db.Column(db.String(50))
+    car_name = db.Column(db.String(120))
+    author_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint('strategy_id', 'rev', name='uq_strategy_revision'),)
+
+class UploadBlob(db.Model):
+    # Blobs de static/uploads direccionados por contenido (ver upload_store.py); los referencian Driver.photo y Palmares.image
+    name = db.Column(db.String(80), primary_key=True)
+    original_name = db.Column(db.String(200))
+    size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    touched_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class IbtSummary(db.Model):
+    # Resúmenes por vuelta de archivos .ibt, cacheados por hash del contenido (ver ibt_reader.py)
+    sha256 = db.Column(db.String(64), primary_key=True)
+    filename = db.Column(db.String(200))
+    size = db.Column(db.BigInteger, nullable=False)
+    data = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# --- ARCHIVO DE CARRERAS (ver race_archive.py) ---
+class RaceSession(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    session_key = db.Column(db.String(100), unique=True, nullable=False)
+    # los eventos pasados se borran (check_events_status): se guarda también el nombre
+    event_id = db.Column(db.Integer, db.ForeignKey('event.id'), nullable=True, index=True)
+    event_name = db.Column(db.String(100))
+    track = db.Column(db.String(150))
+    session_type = db.Column(db.String(30))
+    started_at = db.Column(db.DateTime)
+    ended_at = db.Column(db.DateTime)
+    cars = db.Column(db.Integer, default=0)
+    laps = db.Column(db.Integer, default=0)
+
+class RaceResult(db.Model):
+    session_id = db.Column(db.Integer, db.ForeignKey('race_session.id'), primary_key=True)
+    car_idx = db.Column(db.Integer, primary_key=True)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=True, index=True)     # solo si un único piloto llevó el coche
+    iracing_name = db.Column(db.String(100))        # el que estaba al volante al terminar
+    cust_id = db.Column(db.Integer)
+    car_number = db.Column(db.String(10))
+    position = db.Column(db.Integer)
+    laps = db.Column(db.Integer, default=0)
+    best_lap = db.Column(db.Float)
+    median_lap = db.Column(db.Float)
+    pace_delta = db.Column(db.Float)        # mediana de vueltas limpias - la del ganador (s)
+    consistency = db.Column(db.Float)       # media de la desviación típica por stint (s)
+    incidents = db.Column(db.Integer, default=0)
+    seconds = db.Column(db.Float, default=0)
+
+class RaceDriverResult(db.Model):
+    # Un coche puede tener varios pilotos (resistencia): cada seat es uno, con sus vueltas, stints e incidentes
+    session_id = db.Column(db.Integer, db.ForeignKey('race_session.id'), primary_key=True)
+    car_idx = db.Column(db.Integer, primary_key=True)
+    seat = db.Column(db.Integer, primary_key=True)
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), nullable=True, index=True)
+    iracing_name = db.Column(db.String(100))
+    cust_id = db.Column(db.Integer)
+    laps = db.Column(db.Integer, default=0)
+    best_lap = db.Column(db.Float)
+    median_lap = db.Column(db.Float)
+    pace_delta = db.Column(db.Float)
+    consistency = db.Column(db.Float)
+    incidents = db.Column(db.Integer, default=0)
+    seconds = db.Column(db.Float, default=0)
+
+class RaceLap(db.Model):
+    session_id = db.Column(db.Integer, db.ForeignKey('race_session.id'), primary_key=True)
+    car_idx = db.Column(db.Integer, primary_key=True)
+    lap = db.Column(db.Integer, primary_key=True)
+    seat = db.Column(db.Integer)
+    lap_time = db.Column(db.Float)
+    position = db.Column(db.Integer)
+    pit = db.Column(db.Boolean, default=False)
+
+class RaceStint(db.Model):
+    session_id = db.Column(db.Integer, db.ForeignKey('race_session.id'), primary_key=True)
+    car_idx = db.Column(db.Integer, primary_key=True)
+    stint = db.Column(db.Integer, primary_key=True)
+    seat = db.Column(db.Integer)
+    start_lap = db.Column(db.Integer)
+    end_lap = db.Column(db.Integer)
+    laps = db.Column(db.Integer)
+    avg_lap = db.Column(db.Float)
+    stdev = db.Column(db.Float)
+
+class RacePitStop(db.Model):
+    session_id = db.Column(db.Integer, db.ForeignKey('race_session.id'), primary_key=True)
+    car_idx = db.Column(db.Integer, primary_key=True)
+    stop = db.Column(db.Integer, primary_key=True)
+    lap = db.Column(db.Integer)
+    pit_in_at = db.Column(db.Float)
+    duration = db.Column(db.Float)
+
+class DriverRaceStats(db.Model):
+    # Sumas acumuladas al archivar cada carrera: la ficha del piloto divide, no recorre el historial
+    driver_id = db.Column(db.Integer, db.ForeignKey('driver.id'), primary_key=True)
+    races = db.Column(db.Integer, default=0, nullable=False)
+    laps = db.Column(db.Integer, default=0, nullable=False)
+    seconds = db.Column(db.Float, default=0, nullable=False)
+    incidents = db.Column(db.Integer, default=0, nullable=False)
+    pace_delta_sum = db.Column(db.Float, default=0, nullable=False)
+    pace_delta_n = db.Column(db.Integer, default=0, nullable=False)
+    stint_stdev_sum = db.Column(db.Float, default=0, nullable=False)
+    stint_n = db.Column(db.Integer, default=0, nullable=False)
+    driver = db.relationship('Driver', backref=db.backref('race_stats', uselist=False, cascade="all, delete-orphan"))
+
+    @property
+    def avg_pace_delta(self): return self.pace_delta_sum / self.pace_delta_n if self.pace_delta_n else None
+    @property
+    def consistency(self): return self.stint_stdev_sum / self.stint_n if self.stint_n else None
+    @property
+    def incidents_per_hour(self): return self.incidents * 3600.0 / self.seconds if self.seconds else None
 
 class Car(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     category = db.Column(db.String(50), nullable=False)
     name = db.Column(db.String(120), nullable=False)
+    tank_liters = db.Column(db.Float, nullable=True)
+
+class CacheVersion(db.Model):
+    # Sello de versión de cachés en memoria compartido entre workers (fila 'cars': ver car_catalog.py)
+    __tablename__ = 'cache_version'
+    name = db.Column(db.String(40), primary_key=True)
+    version = db.Column(db.Integer, default=1, nullable=False)
+
+class Notification(db.Model):
+    # Outbox de Discord: los handlers encolan aquí y discord_outbox.py entrega en segundo plano
+    __tablename__ = 'notification_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    payload = db.Column(db.Text, nullable=False)
+    coalesce_key = db.Column(db.String(50), nullable=True)
+    digest_line = db.Column(db.String(300), nullable=True)
+    status = db.Column(db.String(10), default='pending', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.Float, default=time.time, nullable=False)
+    locked_until = db.Column(db.Float, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.Float, nullable=True)
+    __table_args__ = (db.Index('ix_outbox_status_next', 'status', 'next_attempt_at'),)
 
 # ==========================================
-# UTILIDADES Y MIGRACIÓN AUTOMÁTICA
+# UTILIDADES Y MIGRACIONES
 # ==========================================
 
 def allowed_file(filename): return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def check_and_migrate():
-    with app.app_context():
-        db.create_all()
-        
-        legacy = Team.query.filter_by(name="Legacy eSports").first()
-        if not legacy: db.session.add(Team(name="Legacy eSports")); db.session.commit()
-        admin = User.query.filter_by(username="admin").first()
-        if not admin:
-            admin = User(username="admin", email="admin@legacy.es", role="admin", is_approved=True, team_id=legacy.id)
-            admin.set_password("LEGACY2026"); db.session.add(admin); db.session.commit()
-
-        # Migración Inteligente
-        try:
-            real_db_path = db_path
-            if not os.path.exists(real_db_path) and os.path.exists(os.path.join(basedir, db_name)):
-                real_db_path = os.path.join(basedir, db_name)
-            
-            conn = sqlite3.connect(real_db_path)
-            c = conn.cursor()
-            
-            cols_to_check = [
-                ("driver", "biography TEXT"),
-                ("driver", "social_twitter TEXT"),
-                ("driver", "social_instagram TEXT"),
-                ("driver", "social_twitch TEXT"),
-                ("driver", "country TEXT DEFAULT 'España'"),
-                ("driver", "user_id INTEGER"),
-                ("strategy", "user_id INTEGER"),
-                ("strategy", "team_id INTEGER"),
-                ("strategy", "is_shared BOOLEAN DEFAULT 0"),
-                ("event", "team_id INTEGER"),
-                ("event", "alert_sent BOOLEAN DEFAULT 0"),
-                ("event", "broadcast TEXT")
-            ]
-            
-            for table, col_def in cols_to_check:
-                try:
-                    c.execute(f"ALTER TABLE {table} ADD COLUMN {col_def}")
-                    print(f"🔧 [Auto-Fix] Columna añadida: {table}.{col_def}")
-                except sqlite3.OperationalError: pass 
-
-            conn.commit(); conn.close()
-        except Exception as e: print(f"⚠️ Nota DB: {e}")
-
-check_and_migrate()
+def store_upload(f):
+    # Por contenido: la misma foto subida dos veces comparte blob. Se copia por bloques (sin cargarla en memoria)
+    # y las variantes responsive se generan en segundo plano solo para blobs nuevos.
+    name, size, new = upload_store.write_blob(f.stream, app.config['UPLOAD_FOLDER'], f.filename)
+    blob = db.session.get(UploadBlob, name) or UploadBlob(name=name, original_name=secure_filename(f.filename)[:200], size=size)
+    blob.touched_at = datetime.utcnow()     # protege de gc_uploads() hasta que la fila que lo usa se guarde
+    db.session.add(blob)
+    if new: image_variants.enqueue(app.config['UPLOAD_FOLDER'], name)
+    return name
+
+UPLOAD_GC_GRACE = timedelta(hours=1)
+
+def gc_uploads(grace=UPLOAD_GC_GRACE):
+    """Borra blobs (y sus variantes) que ya no referencia ningún Driver.photo ni Palmares.image."""
+    referenced = select(Driver.photo).where(Driver.photo.isnot(None)).union(select(Palmares.image).where(Palmares.image.isnot(None)))
+    orphans = UploadBlob.query.filter(UploadBlob.touched_at < datetime.utcnow() - grace, UploadBlob.name.notin_(referenced)).all()
+    freed = sum(upload_store.remove_blob(app.config['UPLOAD_FOLDER'], b.name) for b in orphans)
+    for b in orphans: db.session.delete(b)
+    db.session.commit()
+    return len(orphans), freed
+
+@app.cli.command("gc-uploads")
+def gc_uploads_command():
+    """Recoge los blobs huérfanos de static/uploads."""
+    count, freed = gc_uploads()
+    print(f"🧹 {count} blobs eliminados, {freed / 1024 / 1024:.1f} MB liberados")
+
+# Los blobs y sus variantes no cambian nunca de contenido: caché de un año sin revalidar
+IMMUTABLE_UPLOAD_RE = re.compile(r"^uploads/(v/)?[0-9a-f]{64}\.")
+
+@app.after_request
+def immutable_uploads(response):
+    if request.endpoint == 'static' and response.status_code in (200, 304) and IMMUTABLE_UPLOAD_RE.match((request.view_args or {}).get('filename', '')):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True; response.cache_control.max_age = 31536000; response.cache_control.immutable = True
+    return response
+
+@app.template_global()
+def picture_sources(filename):
+    """srcset WebP/JPEG de las variantes de image_variants.py, o None si aún no están (se sirve el original)."""
+    found = image_variants.variants(app.config['UPLOAD_FOLDER'], filename) if filename else {}
+    if not found: return None
+    # el avatar (recorte cuadrado) no entra en srcset: solo se usa explícitamente para miniaturas redondas
+    widths = sorted({w: base for kind, (w, base) in found.items() if kind != 'avatar'}.items())
+    srcset = lambda ext: ", ".join(f"{url_for('static', filename=f'uploads/{base}.{ext}')} {w}w" for w, base in widths)
+    if not widths: return None
+    largest = widths[-1][1]
+    return {"webp": srcset("webp"), "jpeg": srcset("jpg"), "src": url_for('static', filename=f"uploads/{largest}.jpg"),
+            "avatar": url_for('static', filename=f"uploads/{found['avatar'][1]}.jpg") if 'avatar' in found else None,
+            "avatar_webp": url_for('static', filename=f"uploads/{found['avatar'][1]}.webp") if 'avatar' in found else None}
 
 MONTH_MAP = {'ene': 1, 'enero': 1, 'jan': 1, 'feb': 2, 'febrero': 2, 'mar': 3, 'marzo': 3, 'abr': 4, 'abril': 4, 'apr': 4, 'may': 5, 'mayo': 5, 'jun': 6, 'junio': 6, 'jul': 7, 'julio': 7, 'ago': 8, 'agosto': 8, 'aug': 8, 'sep': 9, 'sept': 9, 'septiembre': 9, 'oct': 10, 'octubre': 10, 'nov': 11, 'noviembre': 11, 'dic': 12, 'diciembre': 12, 'dec': 12}
 def parse_smart_date(date_text):
@@ -212,24 +390,91 @@ def parse_smart_date(date_text):
         if month > 0: return date(max(datetime.now().year, 2026), month, day)
     except: return None
 
+@app.cli.command("migrate")
+def migrate_command():
+    """Aplica las migraciones pendientes (ver migrations.py)."""
+    run_migrations()
+
+def run_migrations():
+    import migrations
+    from types import SimpleNamespace
+    ctx = SimpleNamespace(parse_smart_date=parse_smart_date, generate_password_hash=generate_password_hash, upload_folder=app.config['UPLOAD_FOLDER'])
+    with app.app_context(): return migrations.run_migrations(db.engine, ctx)
+
+# --- CONTADOR DE CONSULTAS (modo test) ---
+# Con app.config['TESTING'] cada request cuenta sus SQL en g.query_count (cabecera X-Query-Count)
+# y las vistas marcadas con @query_budget(n) fallan si superan n, sea cual sea el nº de filas.
+@sa_event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_app_context() and "query_count" in g: g.query_count += 1
+
+@app.before_request
+def _start_query_count():
+    if app.config.get("TESTING"): g.query_count = 0
+
+@app.after_request
+def _report_query_count(response):
+    if app.config.get("TESTING") and "query_count" in g: response.headers["X-Query-Count"] = str(g.query_count)
+    return response
+
+def query_budget(n):
+    def deco(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not app.config.get("TESTING"): return view(*args, **kwargs)
+            start = g.get("query_count", 0); g.query_count = start
+            rv = view(*args, **kwargs)
+            used = g.query_count - start
+            assert used <= n, f"{request.endpoint}: {used} consultas SQL (presupuesto {n})"
+            return rv
+        return wrapper
+    return deco
+
 def check_events_status():
     today = date.today()
-    for ev in Event.query.all():
-        rd = parse_smart_date(ev.date_str)
-        if rd and rd < today: db.session.delete(ev)
-        elif rd == today and ev.type == "Private" and not ev.alert_sent:
-            send_race_day_alert(ev); ev.alert_sent = True
+    # borrado en bloque de eventos pasados (sin cargar cada evento ni su lista de pilotos)
+    past = Event.query.filter(Event.event_date < today)
+    RaceSession.query.filter(RaceSession.event_id.in_(past.with_entities(Event.id).scalar_subquery())).update({RaceSession.event_id: None}, synchronize_session=False)
+    db.session.execute(event_drivers.delete().where(event_drivers.c.event_id.in_(past.with_entities(Event.id).scalar_subquery())))
+    past.delete(synchronize_session=False)
+    for ev in Event.query.filter(Event.type == "Private", Event.event_date == today, Event.alert_sent == False).all():
+        send_race_day_alert(ev); ev.alert_sent = True
     db.session.commit()
 
 # --- NOTIFICACIONES CON ENLACE (DEEP LINKING) ---
+# Ventana de agrupación: ráfagas con la misma coalesce_key se envían como un solo digest
+DISCORD_COALESCE_WINDOW = 60.0
+
+def queue_discord(body, coalesce_key=None, digest_line=None):
+    """Encola un payload de webhook en la outbox; nunca hace red dentro del request."""
+    if "PEGAR_AQUI" in DISCORD_WEBHOOK_URL: return
+    now = time.time()
+    due = now + (DISCORD_COALESCE_WINDOW if coalesce_key else 0)
+    if coalesce_key:
+        # si ya hay una ventana abierta para la clave (filas sin intentar aún), se une a ella y sale en el mismo digest
+        open_due = db.session.scalar(select(db.func.min(Notification.next_attempt_at)).where(Notification.status == 'pending', Notification.coalesce_key == coalesce_key,
+                                                                                             Notification.attempts == 0, Notification.next_attempt_at > now))
+        if open_due: due = open_due
+    db.session.add(Notification(payload=json.dumps(body), coalesce_key=coalesce_key, digest_line=digest_line, next_attempt_at=due)); db.session.commit()
+    discord_outbox.ensure_worker(db.engine.url.database, DISCORD_WEBHOOK_URL); discord_outbox.notify()
+
+@app.before_request
+def start_discord_outbox():
+    # Entrega lo pendiente de ejecuciones anteriores aunque no se encole nada nuevo
+    discord_outbox.ensure_worker(db.engine.url.database, DISCORD_WEBHOOK_URL)
+
+@app.before_request
+def start_image_variants():
+    # Genera en segundo plano las variantes que falten (subidas antiguas o tras un despliegue)
+    image_variants.ensure_worker(app.config['UPLOAD_FOLDER'])
+
 def send_race_day_alert(ev):
     if "PEGAR_AQUI" in DISCORD_WEBHOOK_URL: return
     d_list = "\n".join([f"🏎️ **{d.name}** #{d.number}" for d in ev.drivers]) if ev.drivers else "TBD"
     embed = {"title": f"🎥 ¡HOY CORRE EL EQUIPO! | {ev.name}", "description": f"Cita en **{ev.track}**.", "color": 0xCCFF00, "fields": [{"name": "📍 Info", "value": f"{ev.track}\n{ev.car_class}", "inline": True}, {"name": "⏰ Hora", "value": ev.time_str, "inline": True}, {"name": "👥 Pilotos", "value": d_list}, {"name": "📺 TV", "value": ev.broadcast or "No TV"}]}
-    try: requests.post(DISCORD_WEBHOOK_URL, json={"content": "@everyone", "embeds": [embed]})
-    except: pass
+    queue_discord({"content": "@everyone", "embeds": [embed]})
 
-def send_discord_alert(title, description, color=0xCCFF00, fields=[], url=None):
+def send_discord_alert(title, description, color=0xCCFF00, fields=[], url=None, coalesce_key=None, digest_line=None):
     if "PEGAR_AQUI" in DISCORD_WEBHOOK_URL: return
     
     embed = {
@@ -242,8 +487,7 @@ def send_discord_alert(title, description, color=0xCCFF00, fields=[], url=None):
     
     if url: embed["url"] = url # Hace el título clicable con la ID
 
-    try: requests.post(DISCORD_WEBHOOK_URL, json={"embeds": [embed]})
-    except: pass
+    queue_discord({"embeds": [embed]}, coalesce_key=coalesce_key, digest_line=digest_line)
 
 # ==========================================
 # RUTAS DE LA APLICACIÓN
@@ -267,7 +511,7 @@ def register():
         new_user = User(username=request.form.get('username'), email=request.form.get('email'), role='privateer', is_approved=False, requested_team=req_team if role_type == 'team' else None)
         new_user.set_password(request.form.get('password')); db.session.add(new_user); db.session.commit()
         
-        send_discord_alert("🔔 Nuevo Registro", f"Usuario: **{new_user.username}** solicita acceso.", 0xFFA500, url=f"{WEB_PUBLIC_URL}/admin")
+        send_discord_alert("🔔 Nuevo Registro", f"Usuario: **{new_user.username}** solicita acceso.", 0xFFA500, url=f"{WEB_PUBLIC_URL}/admin", coalesce_key="register", digest_line=f"**{new_user.username}** solicita acceso")
         
         flash('Enviado.'); return redirect(url_for('login'))
     return render_template('register.html')
@@ -276,10 +520,17 @@ def register():
 @login_required
 def logout(): logout_user(); return redirect(url_for('index'))
 
+# La página no depende del usuario: se renderiza una vez con un marcador y por respuesta solo se pega el nonce
+LIVE_TIMING_NONCE = "__CSP_NONCE__"
+_live_timing_parts = None
+
 @app.route("/live-timing")
 @login_required
 def live_timing():
-    return render_template("live_timing.html")
+    global _live_timing_parts
+    if _live_timing_parts is None or app.debug: _live_timing_parts = render_template("live_timing.html", csp_nonce=LIVE_TIMING_NONCE).split(LIVE_TIMING_NONCE)
+    g.csp_nonce = base64.b64encode(os.urandom(16)).decode('ascii')
+    return g.csp_nonce.join(_live_timing_parts)
 
 @app.route("/")
 def index(): check_events_status(); return render_template("index.html", user=current_user)
@@ -288,17 +539,19 @@ def index(): check_events_status(); return render_template("index.html", user=cu
 
 @app.route("/drivers", methods=["GET", "POST"])
 @login_required
+@query_budget(6)
 def drivers():
     if current_user.role != 'admin' and current_user.role != 'member': return redirect(url_for('index'))
     if request.method == "POST" and current_user.role == 'admin':
         name = request.form.get("name")
         f = request.files.get('photo'); photo_filename = 'default_driver.png'
         if f and allowed_file(f.filename):
-            fn = secure_filename(f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{f.filename}")
-            f.save(os.path.join(app.config['UPLOAD_FOLDER'], fn)); photo_filename = fn
+            photo_filename = store_upload(f)
         d = Driver(name=name, discord=request.form.get("discord"), iracing_id=request.form.get("iracing_id"), simulators=request.form.get("simulators"), hardware=request.form.get("hardware"), number=request.form.get("number"), photo=photo_filename, country="España")
         db.session.add(d); db.session.commit()
-    return render_template("drivers.html", drivers=Driver.query.all())
+        return redirect(url_for('drivers'))     # PRG: el presupuesto de consultas es el del listado, no el de la subida
+    query = Driver.query.options(joinedload(Driver.user), joinedload(Driver.race_stats), selectinload(Driver.palmares), selectinload(Driver.achievements))
+    return render_template("drivers.html", drivers=query.all())
 
 @app.route("/drivers/update/<int:id>", methods=["POST"])
 @login_required
@@ -321,8 +574,7 @@ def update_driver(id):
 
     f = request.files.get('photo')
     if f and allowed_file(f.filename):
-        fn = secure_filename(f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{f.filename}")
-        f.save(os.path.join(app.config['UPLOAD_FOLDER'], fn)); d.photo = fn
+        d.photo = store_upload(f)
 
     if d.user_id:
         u = User.query.get(d.user_id)
@@ -331,7 +583,7 @@ def update_driver(id):
             if "account_password" in request.form and len(request.form.get("account_password")) > 0:
                 u.set_password(request.form.get("account_password")); flash("🔐 Contraseña cambiada.")
 
-    try: db.session.commit(); flash("✅ Perfil actualizado.")
+    try: db.session.commit(); flash("✅ Perfil actualizado."); gc_uploads()
     except Exception as e: db.session.rollback(); flash(f"⚠️ Error: {str(e)}")
     return redirect(url_for('drivers'))
 
@@ -342,7 +594,7 @@ def add_palmares(id):
     if d.user_id != current_user.id and current_user.role != 'admin': return jsonify({"error":"No auth"}), 403
     title = request.form.get("title"); year = request.form.get("year"); f = request.files.get("diploma")
     if f and title and allowed_file(f.filename):
-        fn = secure_filename(f"palm_{d.id}_{datetime.now().strftime('%H%M%S')}_{f.filename}"); f.save(os.path.join(app.config['UPLOAD_FOLDER'], fn))
+        fn = store_upload(f)
         db.session.add(Palmares(title_name=title, year=year, image=fn, driver_id=d.id)); db.session.commit(); flash("🏆 Diploma añadido.")
     return redirect(url_for('drivers'))
 
@@ -350,7 +602,7 @@ def add_palmares(id):
 @login_required
 def delete_palmares(pid):
     p = Palmares.query.get_or_404(pid)
-    if p.driver.user_id == current_user.id or current_user.role == 'admin': db.session.delete(p); db.session.commit()
+    if p.driver.user_id == current_user.id or current_user.role == 'admin': db.session.delete(p); db.session.commit(); gc_uploads()
     return redirect(url_for('drivers'))
 
 @app.route("/drivers/achievement/add/<int:id>", methods=["POST"])
@@ -373,12 +625,17 @@ def delete_achievement(aid):
 @app.route("/drivers/delete/<int:id>", methods=["POST"])
 @login_required
 def delete_driver(id):
-    if current_user.role == 'admin': d = Driver.query.get_or_404(id); db.session.delete(d); db.session.commit()
+    if current_user.role == 'admin':
+        d = Driver.query.get_or_404(id)
+        for model in (RaceResult, RaceDriverResult):     # el archivo conserva el nombre de iRacing
+            model.query.filter_by(driver_id=d.id).update({model.driver_id: None}, synchronize_session=False)
+        db.session.delete(d); db.session.commit(); gc_uploads()
     return redirect(url_for('drivers'))
 
 # --- CALENDARIO & ESTRATEGIA (CON DEEP LINKING) ---
 
 @app.route("/calendar", methods=["GET", "POST"])
+@query_budget(10)
 def calendar():
     if not current_user.is_authenticated: return redirect(url_for('login'))
     check_events_status()
@@ -389,23 +646,20 @@ def calendar():
         time_str = request.form.get("time_str"); car_class = request.form.get("car_class")
         week_val = request.form.get("week"); broadcast = request.form.get("broadcast")
         driver_ids = request.form.getlist("driver_ids")
-        new_event = Event(type=e_type, name=name, track=track, date_str=date_str, time_str=time_str, car_class=car_class, week=int(week_val or 0), broadcast=broadcast, team_id=current_user.team_id)
+        parsed_date = parse_smart_date(date_str)
+        new_event = Event(type=e_type, name=name, track=track, date_str=date_str, time_str=time_str, car_class=car_class, week=int(week_val or 0), broadcast=broadcast, team_id=current_user.team_id, event_date=parsed_date)
         for d_id in driver_ids:
             if d := Driver.query.get(int(d_id)): new_event.drivers.append(d)
         db.session.add(new_event); db.session.commit()
-        today = date.today(); parsed_date = parse_smart_date(date_str)
-        if e_type == "Private" and parsed_date == today:
+        if e_type == "Private" and parsed_date == date.today():
             send_race_day_alert(new_event); new_event.alert_sent = True; db.session.commit()
         return redirect(url_for('calendar'))
-    query = Event.query
+    # Una sola consulta: filtra pasados, ordena por (type, event_date) usando ix_event_type_date; sin fecha al final
+    query = Event.query.filter(Event.type.in_(("Special", "Endurance", "Series", "Private")), (Event.event_date >= date.today()) | (Event.event_date == None))
     if current_user.team_id: query = query.filter((Event.team_id == current_user.team_id) | (Event.team_id == None))
-    def event_sorter(e): d = parse_smart_date(e.date_str); return d if d else date(3000, 1, 1)
-    events = query.all()
-    specials = sorted([e for e in events if e.type == "Special"], key=event_sorter)
-    enduros = sorted([e for e in events if e.type == "Endurance"], key=event_sorter)
-    dailies = sorted([e for e in events if e.type == "Series"], key=event_sorter)
-    privates = sorted([e for e in events if e.type == "Private"], key=event_sorter)
-    return render_template("calendar.html", specials=specials, enduros=enduros, dailies=dailies, privates=privates, drivers=Driver.query.all())
+    buckets = {"Special": [], "Endurance": [], "Series": [], "Private": []}
+    for e in query.options(selectinload(Event.drivers)).order_by(Event.type, Event.event_date.asc().nullslast()).all(): buckets[e.type].append(e)
+    return render_template("calendar.html", specials=buckets["Special"], enduros=buckets["Endurance"], dailies=buckets["Series"], privates=buckets["Private"], drivers=Driver.query.all())
 
 @app.route("/calendar/delete/<int:id>", methods=["POST"])
 @login_required
@@ -414,22 +668,95 @@ def delete_event(id):
     if current_user.role == 'admin' or ev.team_id == current_user.team_id: db.session.delete(ev); db.session.commit()
     return redirect(url_for('calendar'))
 
+# --- LISTADO DE ESTRATEGIAS (proyección sin payload + paginación keyset) ---
+STRATEGY_PAGE_SIZE = 100
+STRATEGY_PAGE_MAX = 500
+
+def parse_strategy_cursor(raw):
+    """'<created_at ISO>,<id>' -> (datetime | None, id); created_at vacío = estrategia sin fecha. Lanza ValueError si el formato no es válido."""
+    ts, sid = raw.rsplit(',', 1)
+    return datetime.fromisoformat(ts) if ts else None, int(sid)
+
+def strategy_cursor_cond(before):
+    """Filas posteriores al cursor en el orden (created_at DESC, id DESC); en SQLite las fechas NULL van al final."""
+    ts, sid = before
+    if ts is None: return Strategy.created_at.is_(None) & (Strategy.id < sid)
+    return (Strategy.created_at < ts) | ((Strategy.created_at == ts) & (Strategy.id < sid)) | Strategy.created_at.is_(None)
+
+def strategy_page_select(user_id, team_id, before=None, limit=STRATEGY_PAGE_SIZE):
+    """
+    SELECT de una página de estrategias accesibles (propias + compartidas del equipo), más recientes primero.
+    Cada rama del OR va por su índice compuesto ya ordenada y limitada; UNION elimina duplicados.
+    Nunca lee payload. Pide limit + 1 filas para saber si hay página siguiente.
+    """
+    cols = (Strategy.id, Strategy.name, Strategy.car_class, Strategy.car_name, Strategy.created_at, Strategy.user_id)
+    branches = []
+    for cond in (Strategy.user_id == user_id, (Strategy.team_id == team_id) & (Strategy.is_shared == True)):
+        q = select(*cols).where(cond)
+        if before: q = q.where(strategy_cursor_cond(before))
+        branches.append(select(q.order_by(Strategy.created_at.desc(), Strategy.id.desc()).limit(limit + 1).subquery()))
+    u = union(*branches).subquery()
+    return select(u, User.username.label("author")).outerjoin(User, User.id == u.c.user_id).order_by(u.c.created_at.desc(), u.c.id.desc()).limit(limit + 1)
+
+def strategy_page(before=None, limit=STRATEGY_PAGE_SIZE):
+    """Página de estrategias del usuario actual. Devuelve (filas, next_cursor)."""
+    rows = db.session.execute(strategy_page_select(current_user.id, current_user.team_id, before, limit)).all()
+    if len(rows) <= limit: return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], f"{last.created_at.isoformat() if last.created_at else ''},{last.id}"
+
+def strategy_page_from_request():
+    before = parse_strategy_cursor(request.args["before"]) if request.args.get("before") else None
+    limit = max(1, min(request.args.get("limit", STRATEGY_PAGE_SIZE, type=int), STRATEGY_PAGE_MAX))
+    return strategy_page(before, limit)
+
 @app.route("/estrategia")
 @login_required
 def estrategia():
-    cars_by_cat = {}
-    for c in Car.query.order_by(Car.category, Car.name).all():
-        if c.category not in cars_by_cat: cars_by_cat[c.category] = []
-        cars_by_cat[c.category].append(c.name)
-    query = Strategy.query.filter((Strategy.user_id == current_user.id) | ((Strategy.team_id == current_user.team_id) & (Strategy.is_shared == True)))
-    return render_template("race_strategy.html", car_categories=cars_by_cat, strategies=query.order_by(Strategy.created_at.desc()).all(), drivers_db=Driver.query.all())
+    cars_by_cat = cars_catalog().by_category
+    try: strategies, next_cursor = strategy_page_from_request()
+    except ValueError: return redirect(url_for('estrategia'))
+    return render_template("race_strategy.html", car_categories=cars_by_cat, strategies=strategies, next_cursor=next_cursor, drivers_db=Driver.query.all())
+
+# --- HISTORIAL DE REVISIONES ---
+def record_strategy_revision(s, prev_payload, payload):
+    """Guarda la revisión s.version: parche contra prev_payload, o snapshot si toca (ver revisions.needs_snapshot)."""
+    plan = revisions.encode(payload)
+    last_snap = db.session.query(db.func.max(StrategyRevision.rev)).filter(StrategyRevision.strategy_id == s.id, StrategyRevision.kind == 'snapshot').scalar()
+    kind, data = 'snapshot', plan
+    if prev_payload is not None and last_snap is not None:
+        since = db.session.query(db.func.coalesce(db.func.sum(StrategyRevision.size), 0)).filter(StrategyRevision.strategy_id == s.id, StrategyRevision.rev > last_snap).scalar()
+        patch = revisions.encode(revisions.json_diff(prev_payload, payload))
+        if not revisions.needs_snapshot(s.version, last_snap, since + len(patch), len(plan)) and len(patch) < len(plan): kind, data = 'patch', patch
+    db.session.add(StrategyRevision(strategy_id=s.id, rev=s.version, kind=kind, data=data, size=len(data), name=s.name, car_class=s.car_class, car_name=s.car_name, author_id=current_user.id))
+
+def load_strategy_revision(sid, rev):
+    """Reconstruye el payload de una revisión: snapshot más cercano + como mucho K-1 parches."""
+    snap = db.session.query(db.func.max(StrategyRevision.rev)).filter(StrategyRevision.strategy_id == sid, StrategyRevision.kind == 'snapshot', StrategyRevision.rev <= rev).scalar()
+    if snap is None: return None, None
+    rows = StrategyRevision.query.filter(StrategyRevision.strategy_id == sid, StrategyRevision.rev >= snap, StrategyRevision.rev <= rev).order_by(StrategyRevision.rev).all()
+    if not rows or rows[-1].rev != rev: return None, None
+    return rows[-1], revisions.rebuild([(r.kind, r.data) for r in rows])
+
+def apply_strategy_update(strategy, name, car_class, car_name, payload):
+    """Sobrescribe la estrategia guardando antes la revisión (no hace commit)."""
+    try: prev = json.loads(strategy.payload) if strategy.payload else {}
+    except Exception: prev = None
+    # estrategias anteriores al historial: la versión actual pasa a ser el snapshot base
+    if prev is not None and not StrategyRevision.query.filter_by(strategy_id=strategy.id).first():
+        record_strategy_revision(strategy, None, prev)
+    strategy.name = name; strategy.car_class = car_class; strategy.car_name = car_name
+    strategy.payload = json.dumps(payload); strategy.created_at = datetime.utcnow()
+    strategy.version = (strategy.version or 0) + 1
+    record_strategy_revision(strategy, prev, payload)
 
 @app.route("/estrategia/guardar", methods=["POST"])
 @login_required
 def estrategia_guardar():
     data = request.get_json(force=True)
     s = Strategy(name=data.get("name", "Sin"), car_class=data.get("car_class", "GT3"), car_name=data.get("car_name", "Desc"), payload=json.dumps(data.get("payload", {})), user_id=current_user.id, team_id=current_user.team_id, is_shared=True)
-    db.session.add(s); db.session.commit()
+    db.session.add(s); db.session.flush()
+    record_strategy_revision(s, None, data.get("payload", {})); db.session.commit()
     try:
         fields = [{"name": "📂 Nombre", "value": s.name, "inline": True}, {"name": "🏎️ Coche", "value": f"{s.car_name} ({s.car_class})", "inline": True}, {"name": "👨‍🔧 Autor", "value": current_user.username, "inline": False}]
         
@@ -445,23 +772,126 @@ def estrategia_actualizar(sid):
     strategy = Strategy.query.get_or_404(sid)
     if strategy.user_id != current_user.id and current_user.role != 'admin': return jsonify({"ok": False})
     data = request.get_json(force=True)
-    strategy.name = data.get("name", strategy.name); strategy.car_class = data.get("car_class", strategy.car_class); strategy.car_name = data.get("car_name", strategy.car_name); strategy.payload = json.dumps(data.get("payload", {})); strategy.created_at = datetime.utcnow()
+    apply_strategy_update(strategy, data.get("name", strategy.name), data.get("car_class", strategy.car_class), data.get("car_name", strategy.car_name), data.get("payload", {}))
     db.session.commit()
     try:
         fields = [{"name": "📂 Nombre", "value": strategy.name, "inline": True}, {"name": "🏎️ Coche", "value": f"{strategy.car_name} ({strategy.car_class})", "inline": True}, {"name": "👨‍🔧 Editor", "value": current_user.username, "inline": False}]
         
         # LINK DIRECTO: Al actualizar, también envía el link
-        send_discord_alert("📝 Estrategia Actualizada", "Se han guardado cambios en la estrategia.", color=0xFFA500, fields=fields, url=f"{WEB_PUBLIC_URL}/estrategia?id={strategy.id}")
+        send_discord_alert("📝 Estrategia Actualizada", "Se han guardado cambios en la estrategia.", color=0xFFA500, fields=fields, url=f"{WEB_PUBLIC_URL}/estrategia?id={strategy.id}", coalesce_key="strategy_update", digest_line=f"[{strategy.name}]({WEB_PUBLIC_URL}/estrategia?id={strategy.id}) · {current_user.username}")
         
     except: pass
     return jsonify({"ok": True})
 
+@app.route("/api/estrategia/<int:sid>/revisiones")
+@login_required
+def api_estrategia_revisiones(sid):
+    s = Strategy.query.options(defer(Strategy.payload)).get_or_404(sid)
+    if not (s.user_id == current_user.id or (s.team_id == current_user.team_id and s.is_shared) or current_user.role == 'admin'):
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    rows = db.session.query(StrategyRevision.rev, StrategyRevision.kind, StrategyRevision.size, StrategyRevision.name, StrategyRevision.car_name, StrategyRevision.car_class, StrategyRevision.created_at, User.username).outerjoin(User, User.id == StrategyRevision.author_id).filter(StrategyRevision.strategy_id == sid).order_by(StrategyRevision.rev.desc()).all()
+    return jsonify({"ok": True, "current": s.version, "revisions": [{"rev": r.rev, "kind": r.kind, "size": r.size, "name": r.name, "car_name": r.car_name, "car_class": r.car_class, "created_at": r.created_at.isoformat() if r.created_at else None, "author": r.username or ""} for r in rows]})
+
+@app.route("/api/estrategia/<int:sid>/revisiones/<int:rev>")
+@login_required
+def api_estrategia_revision(sid, rev):
+    s = Strategy.query.options(defer(Strategy.payload)).get_or_404(sid)
+    if not (s.user_id == current_user.id or (s.team_id == current_user.team_id and s.is_shared) or current_user.role == 'admin'):
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    row, payload = load_strategy_revision(sid, rev)
+    if row is None: return jsonify({"ok": False, "error": "revisión no encontrada"}), 404
+    return jsonify({"ok": True, "id": sid, "rev": rev, "name": row.name, "car_name": row.car_name, "car_class": row.car_class, "created_at": row.created_at.isoformat() if row.created_at else None, "payload": payload})
+
+@app.route("/estrategia/<int:sid>/restaurar/<int:rev>", methods=["POST"])
+@login_required
+def estrategia_restaurar(sid, rev):
+    strategy = Strategy.query.get_or_404(sid)
+    if strategy.user_id != current_user.id and current_user.role != 'admin': return jsonify({"ok": False})
+    row, payload = load_strategy_revision(sid, rev)
+    if row is None: return jsonify({"ok": False, "error": "revisión no encontrada"}), 404
+    # restaurar crea una revisión nueva: el historial nunca se reescribe
+    apply_strategy_update(strategy, row.name or strategy.name, row.car_class or strategy.car_class, row.car_name or strategy.car_name, payload)
+    db.session.commit()
+    return jsonify({"ok": True, "version": strategy.version})
+
+# --- PLANIFICADOR DE STINTS (NumPy, ver stint_planner.py) ---
+@app.route("/api/strategy/plan", methods=["POST"])
+@login_required
+def api_strategy_plan():
+    # Devuelve los mejores planes con el mismo esquema de relays que guarda /estrategia/guardar
+    import stint_planner
+    try: result = stint_planner.plan(request.get_json(silent=True) or {})
+    except (ValueError, TypeError) as e: return jsonify({"ok": False, "error": str(e)}), 400
+    return jsonify({"ok": True, **result})
+
+# --- BÚSQUEDA (FTS5, ver migración 009) ---
+SEARCH_LIMIT = 10
+
+def fts_query(q):
+    """Texto libre -> consulta FTS5 segura: cada palabra entre comillas y como prefijo (AND implícito)."""
+    words = re.findall(r"\w+", q or "", re.UNICODE)[:8]
+    return " ".join(f'"{w}"*' for w in words)
+
+def render_snippet(raw):
+    # snippet() marca con \x02/\x03; escapamos el texto y luego ponemos <mark>
+    return str(escape(raw or "")).replace("\x02", "<mark>").replace("\x03", "</mark>")
+
+@app.route("/api/search")
+@login_required
+def api_search():
+    """
+    Búsqueda rankeada (bm25) en estrategias, pilotos y eventos con snippets.
+    Mismo alcance que los listados: estrategias propias o compartidas del equipo, eventos del equipo o globales,
+    pilotos solo para admin/member.
+    """
+    match = fts_query(request.args.get("q", ""))
+    if not match: return jsonify({"ok": True, "q": "", "results": []})
+    limit = max(1, min(request.args.get("limit", SEARCH_LIMIT, type=int), 50))
+    params = {"q": match, "uid": current_user.id, "tid": current_user.team_id, "limit": limit}
+    snip = lambda fts: f"snippet({fts}, -1, char(2), char(3), '…', 12)"
+    queries = [
+        ("strategy", f"SELECT s.id, s.name AS title, {snip('strategy_fts')} AS snip, bm25(strategy_fts) AS score FROM strategy_fts JOIN strategy s ON s.id = strategy_fts.rowid "
+                     "WHERE strategy_fts MATCH :q AND (s.user_id = :uid OR (s.team_id IS :tid AND s.is_shared = 1)) ORDER BY score LIMIT :limit"),
+        ("event", f"SELECT e.id, e.name AS title, {snip('event_fts')} AS snip, bm25(event_fts) AS score FROM event_fts JOIN event e ON e.id = event_fts.rowid "
+                  "WHERE event_fts MATCH :q AND (e.team_id IS :tid OR e.team_id IS NULL) ORDER BY score LIMIT :limit"),
+    ]
+    if current_user.role in ('admin', 'member'):
+        queries.append(("driver", f"SELECT d.id, d.name AS title, {snip('driver_fts')} AS snip, bm25(driver_fts) AS score FROM driver_fts JOIN driver d ON d.id = driver_fts.rowid "
+                                  "WHERE driver_fts MATCH :q ORDER BY score LIMIT :limit"))
+    urls = {"strategy": lambda i: url_for('estrategia', id=i), "event": lambda i: url_for('calendar'), "driver": lambda i: url_for('drivers') + f"#driver-{i}"}
+    results = []
+    for kind, sql in queries:
+        for r in db.session.execute(db.text(sql), params):
+            results.append({"type": kind, "id": r.id, "title": r.title, "snippet": render_snippet(r.snip), "score": round(r.score, 4), "url": urls[kind](r.id)})
+    results.sort(key=lambda r: r["score"])  # bm25: más negativo = más relevante
+    return jsonify({"ok": True, "q": request.args.get("q", ""), "results": results[:limit]})
+
+def cached_strategy_response(s, kind, build):
+    """
+    Sirve el JSON de una estrategia desde strategy_cache (clave: formato, id, token, version).
+    ETag = token + versión de la fila: si el cliente ya la tiene respondemos 304 sin tocar el payload.
+    El token aleatorio evita confundir una estrategia borrada con la nueva que reutiliza su id.
+    """
+    etag = f"{kind}-{s.id}-{s.cache_token}-v{s.version or 0}"
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        key = (kind, s.id, s.cache_token, s.version or 0)
+        body = strategy_cache.get(key)
+        if body is None:
+            body = json.dumps(build(s), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            strategy_cache.put(key, body)
+        resp = Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
 @app.route("/estrategia/cargar/<int:sid>")
 @login_required
 def estrategia_cargar(sid):
-    s = Strategy.query.get_or_404(sid)
+    s = Strategy.query.options(defer(Strategy.payload)).get_or_404(sid)
     if s.team_id != current_user.team_id and s.user_id != current_user.id: return jsonify({"error": "No auth"}), 403
-    return jsonify({"id": s.id, "name": s.name, "car_class": s.car_class, "car_name": s.car_name, "payload": json.loads(s.payload)})
+    return cached_strategy_response(s, "cargar", lambda s: {"id": s.id, "name": s.name, "car_class": s.car_class, "car_name": s.car_name, "payload": json.loads(s.payload)})
 
 # --- API: Estrategias (JSON) para Live Timing ---
 
@@ -471,14 +901,13 @@ def api_estrategias():
     """
     Devuelve la lista de estrategias accesibles por el usuario actual.
     Formato: [{id, name, car_name, car_class, created_at}, ...]
+    Paginación keyset: ?limit=N&before=<created_at,id> (usar el campo 'next' de la respuesta).
     """
     try:
-        query = Strategy.query.filter(
-            (Strategy.user_id == current_user.id) |
-            ((Strategy.team_id == current_user.team_id) & (Strategy.is_shared == True))
-        ).order_by(Strategy.created_at.desc())
+        try: rows, next_cursor = strategy_page_from_request()
+        except ValueError: return jsonify({"ok": False, "error": "cursor inválido"}), 400
         items = []
-        for s in query.all():
+        for s in rows:
             items.append({
                 "id": s.id,
                 "name": s.name,
@@ -487,7 +916,7 @@ def api_estrategias():
                 "created_at": s.created_at.isoformat() if s.created_at else None,
                 "author_id": s.user_id
             })
-        return jsonify({"ok": True, "strategies": items})
+        return jsonify({"ok": True, "strategies": items, "next": next_cursor})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
@@ -500,27 +929,28 @@ def api_estrategia_detail(sid):
     payload se guarda en Strategy.payload (texto JSON). Devolvemos payload parseado.
     """
     try:
-        s = Strategy.query.get_or_404(sid)
+        # payload diferido: solo se lee de la BD si la respuesta no está en caché
+        s = Strategy.query.options(defer(Strategy.payload)).get_or_404(sid)
         # Seguridad: permitir acceso si es del usuario o compartida con el team
         if not (s.user_id == current_user.id or (s.team_id == current_user.team_id and s.is_shared) or current_user.role == 'admin'):
             return jsonify({"ok": False, "error": "forbidden"}), 403
 
-        try:
-            payload = json.loads(s.payload) if s.payload else {}
-        except Exception:
-            # si payload no es JSON válido devolvemos raw string
-            payload = {"raw": s.payload}
-
-        resp = {
-            "ok": True,
-            "id": s.id,
-            "name": s.name,
-            "car_name": s.car_name,
-            "car_class": s.car_class,
-            "created_at": s.created_at.isoformat() if s.created_at else None,
-            "payload": payload
-        }
-        return jsonify(resp)
+        def build(s):
+            try:
+                payload = json.loads(s.payload) if s.payload else {}
+            except Exception:
+                # si payload no es JSON válido devolvemos raw string
+                payload = {"raw": s.payload}
+            return {
+                "ok": True,
+                "id": s.id,
+                "name": s.name,
+                "car_name": s.car_name,
+                "car_class": s.car_class,
+                "created_at": s.created_at.isoformat() if s.created_at else None,
+                "payload": payload
+            }
+        return cached_strategy_response(s, "detail", build)
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 # --- fin API estrategias ---
@@ -529,7 +959,8 @@ def api_estrategia_detail(sid):
 @login_required
 def estrategia_borrar(sid):
     s = Strategy.query.get_or_404(sid)
-    if s.user_id == current_user.id or current_user.role == 'admin': db.session.delete(s); db.session.commit()
+    if s.user_id == current_user.id or current_user.role == 'admin':
+        StrategyRevision.query.filter_by(strategy_id=s.id).delete(); db.session.delete(s); db.session.commit(); strategy_cache.discard(sid)
     return jsonify({"ok": True})
 
 @app.route("/estrategia/list")
@@ -537,50 +968,146 @@ def estrategia_borrar(sid):
 def estrategia_list():
     """
     Devuelve JSON con las estrategias accesibles al usuario actual.
+    Misma paginación que /api/estrategias; el cursor siguiente va en la cabecera X-Next-Cursor.
     """
     try:
-        query = Strategy.query.filter(
-            (Strategy.user_id == current_user.id) |
-            ((Strategy.team_id == current_user.team_id) & (Strategy.is_shared == True))
-        ).order_by(Strategy.created_at.desc()).all()
+        try: rows, next_cursor = strategy_page_from_request()
+        except ValueError: return jsonify({"error": "Cursor inválido"}), 400
 
         items = []
-        for s in query:
-            author = ""
-            try:
-                if s.user: author = s.user.username
-            except:
-                author = ""
+        for s in rows:
+            author = s.author or ""
             items.append({
                 "id": s.id,
                 "name": s.name,
                 "car_class": s.car_class,
                 "car_name": s.car_name,
                 "created_at": s.created_at.isoformat() if getattr(s, 'created_at', None) else None,
-                "author": author or ""
+                "author": author
             })
-        return jsonify(items)
+        resp = jsonify(items)
+        if next_cursor: resp.headers["X-Next-Cursor"] = next_cursor
+        return resp
     except Exception as e:
         return jsonify({"error": "No se pudo listar estrategias", "detail": str(e)}), 500
 
+# --- CATÁLOGO DE COCHES (ver car_catalog.py) ---
+def cars_catalog():
+    version = db.session.execute(select(CacheVersion.version).where(CacheVersion.name == 'cars')).scalar() or 0
+    return car_catalog.get(version, lambda: [CarRow(c.id, c.category, c.name, c.tank_liters) for c in Car.query.order_by(Car.category, Car.name)])
+
+def bump_cars_version():
+    """Llamar antes del commit que cambia la tabla car: el sello viaja en la misma transacción."""
+    if not CacheVersion.query.filter_by(name='cars').update({CacheVersion.version: CacheVersion.version + 1}):
+        db.session.add(CacheVersion(name='cars', version=1))
+    car_catalog.invalidate()
+
+@app.route("/api/cars")
+def api_cars():
+    snap = cars_catalog()
+    resp = Response(status=304) if request.if_none_match.contains(snap.etag) else Response(snap.body, mimetype="application/json")
+    resp.set_etag(snap.etag)
+    resp.headers["Cache-Control"] = "public, no-cache"
+    return resp
+
 @app.route("/fuel")
-def fuel(): return render_template("fuel_calc.html", cars=Car.query.order_by(Car.category, Car.name).all())
+def fuel(): return render_template("fuel_calc.html", cars=cars_catalog().cars)
+@app.route("/api/fuel/sweep", methods=["POST"])
+def api_fuel_sweep():
+    # Rejilla what-if de fuel_calc.html (ver fuel_sweep.py). Depósitos: car_ids del garaje, tanks explícitos o tank.
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict): return jsonify({"ok": False, "error": "se esperaba un objeto JSON"}), 400
+    import fuel_sweep
+    try:
+        ids = {int(i) for i in data.get("car_ids") or []}
+        tanks = [(c.name, c.tank_liters or float(data.get("tank") or 0)) for c in cars_catalog().cars if c.id in ids]
+        tanks += [(f"{float(t):g} L", float(t)) for t in data.get("tanks") or []]
+        if not tanks and data.get("tank"): tanks = [(f"{float(data['tank']):g} L", float(data["tank"]))]
+        return jsonify({"ok": True, **fuel_sweep.sweep(data, tanks)})
+    except (ValueError, TypeError) as e: return jsonify({"ok": False, "error": str(e)}), 400
+
 @app.route("/setup-doctor")
 def setup_doctor(): return render_template("setup_doctor.html")
+
+IBT_MAX_BYTES = 2 * 1024 * 1024 * 1024
+IBT_CHUNK = 1024 * 1024
+
+@app.route("/api/setup-doctor/ibt", methods=["POST"])
+@login_required
+def setup_doctor_ibt():
+    # Cuerpo crudo (application/octet-stream, nombre en X-Filename). Se lee de wsgi.input y no de request.stream
+    # porque MAX_CONTENT_LENGTH (16 MB, pensado para fotos) cortaría un .ibt de cientos de MB.
+    size = request.content_length or 0
+    if size <= 0: return jsonify({"ok": False, "error": "archivo vacío"}), 400
+    if size > IBT_MAX_BYTES: return jsonify({"ok": False, "error": "archivo demasiado grande"}), 413
+    src, h, left = request.environ["wsgi.input"], hashlib.sha256(), size
+    tmp = tempfile.NamedTemporaryFile(dir=instance_path, suffix=".ibt", delete=False)
+    try:
+        with tmp:
+            while left > 0:
+                chunk = src.read(min(IBT_CHUNK, left))
+                if not chunk: break
+                h.update(chunk); tmp.write(chunk); left -= len(chunk)
+        if left: return jsonify({"ok": False, "error": "subida incompleta"}), 400
+        digest = h.hexdigest()
+        if cached := db.session.get(IbtSummary, digest):
+            return jsonify({"ok": True, "cached": True, "sha256": digest, **json.loads(cached.data)})
+        import ibt_reader
+        try: summary = ibt_reader.summarize(tmp.name)
+        except ibt_reader.IbtError as e: return jsonify({"ok": False, "error": str(e)}), 400
+        db.session.add(IbtSummary(sha256=digest, filename=secure_filename(unquote(request.headers.get("X-Filename", "")))[:200], size=size, data=json.dumps(summary)))
+        db.session.commit()
+        return jsonify({"ok": True, "cached": False, "sha256": digest, **summary})
+    finally:
+        os.remove(tmp.name)
 @app.route("/garage", methods=["GET", "POST"])
 def garage():
     if request.method == "POST":
         if not current_user.is_authenticated or current_user.role != 'admin': return redirect(url_for('login'))
-        if cat := request.form.get("category"): db.session.add(Car(category=cat, name=request.form.get("name"))); db.session.commit()
-    return render_template("cars.html", cars=Car.query.order_by(Car.category, Car.name).all())
+        if cat := request.form.get("category"): db.session.add(Car(category=cat, name=request.form.get("name"), tank_liters=request.form.get("tank_liters", type=float))); bump_cars_version(); db.session.commit()
+    return render_template("cars.html", cars=cars_catalog().cars)
 @app.route("/garage/delete/<int:id>", methods=["POST"])
 @login_required
 def delete_car(id):
-    if current_user.role == 'admin': c = Car.query.get_or_404(id); db.session.delete(c); db.session.commit()
+    if current_user.role == 'admin': c = Car.query.get_or_404(id); db.session.delete(c); bump_cars_version(); db.session.commit()
     return redirect(url_for('garage'))
 
+# --- PANEL DE ADMIN (paginado en SQL: pendientes primero, luego los más nuevos) ---
+ADMIN_PAGE_SIZE = 50
+ADMIN_PAGE_MAX = 500
+ADMIN_BATCH_MAX = 1000
+ADMIN_STATUS_FILTERS = {'pending': User.is_approved == False, 'active': (User.is_approved == True) & (User.role != 'admin'), 'admin': User.role == 'admin'}
+
+def admin_user_filters(args):
+    """Condiciones de ?q= (usuario, email o solicitud), ?status= y ?team= (id o 'none')."""
+    conds = []
+    if q := (args.get('q') or '').strip():
+        # autoescape: % y _ del texto se buscan literalmente (pepe_lopez) en vez de actuar como comodines
+        conds.append(User.username.icontains(q, autoescape=True) | User.email.icontains(q, autoescape=True) | User.requested_team.icontains(q, autoescape=True))
+    if args.get('status') in ADMIN_STATUS_FILTERS: conds.append(ADMIN_STATUS_FILTERS[args['status']])
+    team = args.get('team')
+    if team == 'none': conds.append(User.team_id.is_(None))
+    elif team and team.isdigit(): conds.append(User.team_id == int(team))
+    return conds
+
+def admin_user_page(conds, before=None, limit=ADMIN_PAGE_SIZE):
+    """
+    Página de usuarios ordenada por (is_approved, id DESC), el orden de ix_user_approved_id: pendientes
+    primero. Cursor '<is_approved>,<id>'. Proyección sin password_hash. Devuelve (filas, next_cursor).
+    """
+    q = select(User.id, User.username, User.email, User.role, User.is_approved, User.team_id, User.requested_team).where(*conds)
+    if before: q = q.where((User.is_approved > before[0]) | ((User.is_approved == before[0]) & (User.id < before[1])))
+    rows = db.session.execute(q.order_by(User.is_approved, User.id.desc()).limit(limit + 1)).all()
+    next_cursor = f"{int(rows[limit - 1].is_approved)},{rows[limit - 1].id}" if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def admin_teams():
+    """Equipos con su nº de miembros en una sola consulta agregada (sin cargar team.members)."""
+    return db.session.execute(select(Team.id, Team.name, db.func.count(User.id).label('members')).outerjoin(User, User.team_id == Team.id).group_by(Team.id).order_by(Team.name)).all()
+
 @app.route("/admin", methods=["GET", "POST"])
 @login_required
+@query_budget(6)
 def admin_panel():
     if current_user.role != 'admin': flash("⛔ Zona restringida."); return redirect(url_for('index'))
     if request.method == "POST":
@@ -594,7 +1121,7 @@ def admin_panel():
         elif action == "delete_team":
             team = Team.query.get(request.form.get("team_id"))
             if team:
-                for member in team.members: member.team_id = None
+                User.query.filter_by(team_id=team.id).update({User.team_id: None}, synchronize_session=False)
                 db.session.delete(team); db.session.commit(); flash(f"🗑️ Equipo eliminado.")
         elif request.form.get("user_id"):
             user = User.query.get(request.form.get("user_id"))
@@ -609,8 +1136,89 @@ def admin_panel():
                     if duplicado: flash("⚠️ Nombre o email ya en uso.")
                     else: user.username = new_user; user.email = new_email; db.session.commit(); flash("✅ Datos actualizados.")
             db.session.commit()
-        return redirect(url_for('admin_panel'))
-    return render_template("admin_panel.html", users=User.query.all(), teams=Team.query.all())
+        # vuelve a la misma página/filtro (el form se envía a la URL actual con su query string)
+        return redirect(url_for('admin_panel', **request.args))
+    try:
+        before = tuple(int(x) for x in request.args["before"].split(',', 1)) if request.args.get("before") else None
+        if before is not None and len(before) != 2: raise ValueError
+    except ValueError: return redirect(url_for('admin_panel'))
+    limit = max(1, min(request.args.get("limit", ADMIN_PAGE_SIZE, type=int), ADMIN_PAGE_MAX))
+    conds = admin_user_filters(request.args)
+    users, next_cursor = admin_user_page(conds, before, limit)
+    total, pending = db.session.execute(select(db.func.count(User.id), db.func.count(User.id).filter(User.is_approved == False)).where(*conds)).one()
+    filters = {k: request.args[k] for k in ('q', 'status', 'team') if request.args.get(k)}
+    return render_template("admin_panel.html", users=users, teams=admin_teams(), total=total, pending=pending or 0, next_cursor=next_cursor, filters=filters)
+
+@app.route("/admin/users/batch", methods=["POST"])
+@login_required
+def admin_users_batch():
+    """
+    Aplica muchas acciones en una transacción: {"ops": [{"user_id": 1, "action": "approve"},
+    {"user_id": 2, "action": "team", "team_id": 3 | null}, {"user_id": 4, "action": "promote"}]}.
+    Un UPDATE ... WHERE id IN (...) por acción/equipo destino. Si algo no valida no se aplica nada.
+    """
+    if current_user.role != 'admin': return jsonify({"ok": False, "error": "forbidden"}), 403
+    ops = (request.get_json(silent=True) or {}).get("ops")
+    if not isinstance(ops, list) or not ops: return jsonify({"ok": False, "error": "ops vacío"}), 400
+    if len(ops) > ADMIN_BATCH_MAX: return jsonify({"ok": False, "error": f"máximo {ADMIN_BATCH_MAX} acciones"}), 413
+    approve, promote, by_team = set(), set(), {}
+    try:
+        for op in ops:
+            uid, action = int(op["user_id"]), op["action"]
+            if action == "approve": approve.add(uid)
+            elif action == "promote": promote.add(uid)
+            elif action == "team": by_team.setdefault(int(op["team_id"]) if op.get("team_id") not in (None, "", "none") else None, set()).add(uid)
+            else: raise ValueError(f"acción desconocida: {action}")
+    except (KeyError, TypeError, ValueError) as e: return jsonify({"ok": False, "error": f"op inválida: {e}"}), 400
+    ids = approve | promote | set().union(*by_team.values())
+    found = set(db.session.scalars(select(User.id).where(User.id.in_(ids))))
+    teams = {t for t in by_team if t is not None}
+    missing_teams = teams - set(db.session.scalars(select(Team.id).where(Team.id.in_(teams)))) if teams else set()
+    if ids - found or missing_teams:
+        return jsonify({"ok": False, "error": "usuarios o equipos inexistentes", "missing_users": sorted(ids - found), "missing_teams": sorted(missing_teams)}), 404
+    upd = lambda uids, values: db.session.execute(User.__table__.update().where(User.id.in_(uids)).values(values))
+    if approve: upd(approve, {"is_approved": True})
+    if promote: upd(promote, {"role": 'admin', "is_approved": True})
+    for team_id, uids in by_team.items(): upd(uids, {"team_id": team_id})
+    db.session.commit()
+    rows = db.session.execute(select(User.id, User.role, User.is_approved, User.team_id).where(User.id.in_(ids))).all()
+    return jsonify({"ok": True, "updated": len(ids), "users": [r._asdict() for r in rows]})
+
+@app.route("/admin/perf", methods=["GET", "POST"])
+@login_required
+def admin_perf():
+    if current_user.role != 'admin': flash("⛔ Zona restringida."); return redirect(url_for('index'))
+    if request.method == "POST": perf.reset(); flash("🧹 Métricas reiniciadas."); return redirect(url_for('admin_perf'))
+    snap = perf.snapshot()
+    rows = sorted(snap["endpoints"].items(), key=lambda kv: -kv[1]["wall_ms"]["p95"])
+    return render_template("admin_perf.html", rows=rows, slow=snap["slow"], since=datetime.fromtimestamp(snap["since"]))
+
+@app.route("/admin/perf.json")
+@login_required
+def admin_perf_json():
+    if current_user.role != 'admin': return jsonify({"ok": False, "error": "forbidden"}), 403
+    return jsonify({"ok": True, **perf.snapshot()})
+
+# --- ASSETS CON HUELLA (ver static_assets.py) ---
+# Se calculan en create_app(); un archivo editado en static/ necesita reiniciar para cambiar de huella.
+assets = None
+
+@app.template_global()
+def asset_url(filename):
+    """URL con huella de un archivo de static/ (caché immutable); la normal si no está en el manifiesto."""
+    hashed = assets.hashed(filename)
+    return url_for('asset', filename=hashed) if hashed else url_for('static', filename=filename)
+
+@app.route('/assets/<path:filename>')
+def asset(filename):
+    found = assets.resolve(filename, request.accept_encodings)
+    if found is None: return "", 404
+    path, mimetype, encoding = found
+    response = send_file(path, mimetype=mimetype, conditional=True, max_age=31536000)
+    if encoding: response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True; response.cache_control.immutable = True
+    return response
 
 # --- RUTAS DE ARCHIVOS ESTÁTICOS (PWA / Manifest / Service Worker) ---
 # Mantener una única definición para evitar colisiones
@@ -619,7 +1227,8 @@ def manifest_json():
     return jsonify({
         "short_name": "Legacy",
         "name": "Legacy eSports Club",
-        "icons": [{"src": "/static/img/favicon.png", "sizes": "192x192", "type": "image/png"}],
+        "icons": [{"src": asset_url('img/icon-192.png'), "sizes": "192x192", "type": "image/png"},
+                  {"src": asset_url('img/icon-512.png'), "sizes": "512x512", "type": "image/png"}],
         "start_url": "/",
         "display": "standalone",
         "theme_color": "#FF5A00",
@@ -630,20 +1239,24 @@ app.add_url_rule('/manifest.json', endpoint='manifest', view_func=manifest_json)
 
 @app.route('/sw.js', endpoint='service_worker_js')
 def service_worker_js():
-    return app.send_static_file('js/sw.js') if os.path.exists('static/js/sw.js') else ("", 204)
+    # static/sw.js con la lista de precache delante; sin caché HTTP para que el navegador vea cada versión nueva
+    with open(os.path.join(app.static_folder, 'sw.js'), encoding='utf-8') as f: body = f.read()
+    head = f"const ASSET_VERSION = {json.dumps(assets.version)};\nconst PRECACHE = {json.dumps(assets.precache(lambda h: url_for('asset', filename=h)))};\n"
+    response = Response(head + body, mimetype='application/javascript')
+    response.cache_control.no_cache = True
+    return response
 # Alias para compatibilidad con la plantilla (url_for('service_worker'))
 app.add_url_rule('/sw.js', endpoint='service_worker', view_func=service_worker_js)
 
 
 # --- TELEMETRÍA (modificado para incluir last_ingest y endpoint /api/telemetry/live) ---
-import time
-from datetime import datetime
-from flask import jsonify, request
-
 # umbral en segundos para considerar la telemetría stale (ajusta si tu bridge envía menos/más frecuentemente)
 TELEMETRY_STALE_THRESHOLD = 8.0
 
-telemetry_data = {
+# live_timing.html puede leer la telemetría de Flask (vacío) o de telemetry_service.py (su URL base)
+app.config.setdefault('TELEMETRY_URL', os.environ.get('LEGACY_TELEMETRY_URL', '').rstrip('/'))
+
+TELEMETRY_DEFAULTS = {
     "connected": False,
     "laps": 0,
     "fuel": 0,
@@ -654,47 +1267,122 @@ telemetry_data = {
     "last_payload": {}
 }
 
+# último frame compartido por todos los workers (mmap en instance/, ver telemetry_store.py); se abre en create_app()
+telemetry = None
+
+# estrategia activa por sesión (team_id del bridge o "default"): va en el propio frame compartido,
+# clave "plans" (ver plan_tracker.py), para que todos los workers la vean. plan_tracker (y con él
+# NumPy) solo se importa cuando hay un plan activo, no al arrancar cada worker.
+def telemetry_view(state):
+    """Frame para los viewers: sin los planes internos, con la proyección del plan de su sesión."""
+    resp = dict(state)
+    plans = resp.pop("plans", None) or {}
+    plan = plans.get(str(resp.get("team_id") or "default"))     # = plan_tracker.session_key(resp)
+    resp["plan"] = plan["projection"] if plan else None
+    return resp
+
 @app.route('/api/telemetry/ingest', methods=['POST'])
 def ingest_telemetry():
     """
-    Recibe payloads enviados por el bridge y actualiza telemetry_data.
+    Recibe payloads enviados por el bridge y los fusiona en el frame compartido (telemetry).
     Además normaliza/guarda track_name y session_type si vienen en el payload.
     """
-    global telemetry_data
     try:
         data = request.get_json(force=True, silent=True) or {}
-        # merge básico (mantiene claves previas si payload no las incluye)
-        telemetry_data.update(data or {})
-
-        # Marca recibido y guarda payload (shallow copy)
         now = time.time()
-        telemetry_data["last_ingest"] = now
-        telemetry_data["timestamp"] = now  # compatibilidad con código existente
-        telemetry_data["last_payload"] = dict(data) if isinstance(data, dict) else data
-        telemetry_data["connected"] = True
-
-        # Normalizar campos que podrían venir con nombres distintos desde distintos bridges
-        telemetry_data["track_name"] = (
-            data.get("track_name")
-            or data.get("track")
-            or data.get("Track")
-            or telemetry_data.get("track_name")
-            or ""
-        )
-
-        telemetry_data["session_type"] = (
-            data.get("session_type")
-            or data.get("session")
-            or data.get("Session")
-            or telemetry_data.get("session_type")
-            or ""
-        )
+
+        closed = []
+        def merge(state):
+            # el recorder compara con el frame anterior antes de fusionar (bajo el lock de telemetry_store)
+            closed.extend(race_recorder.on_frame(state, data, now))
+            state = telemetry_store.merge_frame(state, data, now)
+            if state.get("plans"):
+                # plan vs realidad: solo recalcula en los cruces de meta
+                import plan_tracker
+                plan_tracker.on_frame(state, data, now)
+            return state
+        telemetry.update(merge)
+
+        # sesión terminada: al archivo (fuera del lock; si falla, queda para `flask archive-races`)
+        for path in closed: archive_race(path)
 
         return jsonify({"status": "ok"})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+# --- ARCHIVO POST-SESIÓN (ver race_archive.py) ---
+race_recorder = race_archive.SessionRecorder(os.path.join(instance_path, 'race_journal'))
+# se suman al acumulado del piloto; el resto de columnas de RaceResult solo van a la carrera
+RACE_STATS_COLUMNS = ('races', 'laps', 'seconds', 'incidents', 'pace_delta_sum', 'pace_delta_n', 'stint_stdev_sum', 'stint_n')
+
+def link_race_drivers(rows):
+    """driver_id de cada fila por iracing_id (cust_id del bridge) y, si no, por nombre exacto sin mayúsculas."""
+    by_id, by_name = {}, {}
+    for d in db.session.execute(select(Driver.id, Driver.name, Driver.iracing_id)):
+        if (d.iracing_id or '').strip().isdigit(): by_id[int(d.iracing_id)] = d.id
+        by_name.setdefault(d.name.strip().lower(), d.id)
+    return [by_id.get(r['cust_id']) or by_name.get(r['iracing_name'].strip().lower()) for r in rows]
+
+def link_race_event(track, day):
+    """Evento del calendario de ese día: el de la misma pista, o el único del día."""
+    events = Event.query.filter(Event.event_date == day).all()
+    track = (track or '').lower().split(' (')[0]          # "Spa (Endurance)" -> "spa"
+    same = [e for e in events if track and e.track and (e.track.lower() in track or track in e.track.lower())]
+    if len(same) == 1: return same[0]
+    return events[0] if not same and len(events) == 1 else None
+
+def archive_race(path):
+    """
+    Diario cerrado -> race_session + resultados por coche y por piloto, vueltas, stints y pits con executemany
+    en una transacción, y suma de los agregados por piloto (solo carreras). Devuelve la RaceSession o None.
+    Los agregados salen de race_driver_result: en resistencia cada piloto suma solo lo que condujo.
+    """
+    try:
+        arch = race_archive.build_archive(race_archive.read_journal(path))
+        meta = arch.meta
+        if not meta.get('session_id'): os.remove(path); return None
+        if RaceSession.query.filter_by(session_key=meta['session_id']).first(): os.remove(path); return None    # ya archivada
+        started = datetime.fromtimestamp(meta['started_at']) if meta.get('started_at') else None
+        ev = link_race_event(meta.get('track'), started.date()) if started else None
+        rs = RaceSession(session_key=meta['session_id'], event_id=ev.id if ev else None, event_name=ev.name if ev else None, track=meta.get('track'), session_type=meta.get('session_type'),
+                         started_at=started, ended_at=datetime.fromtimestamp(meta['ended_at']) if meta.get('ended_at') else None, cars=meta['cars'], laps=meta['laps'])
+        db.session.add(rs); db.session.flush()
+        drivers = [{**{k: v for k, v in r.items() if k != 'stints_measured'}, 'driver_id': driver_id} for r, driver_id in zip(arch.drivers, link_race_drivers(arch.drivers))]
+        seats = {}
+        for r in drivers: seats.setdefault(r['car_idx'], []).append(r['driver_id'])
+        # el resultado del coche solo se enlaza a un piloto si lo condujo él solo
+        results = [{**{k: v for k, v in r.items() if k != 'stints_measured'}, 'driver_id': seats[r['car_idx']][0] if len(seats.get(r['car_idx'], ())) == 1 else None} for r in arch.results]
+        # lista de parámetros -> cursor.executemany (una sentencia preparada por tabla)
+        for model, rows in ((RaceResult, results), (RaceDriverResult, drivers), (RaceLap, arch.laps), (RaceStint, arch.stints), (RacePitStop, arch.pits)):
+            if rows: db.session.execute(model.__table__.insert(), [{**row, 'session_id': rs.id} for row in rows])
+        if rs.session_type == 'RACE':
+            totals = {}         # un piloto puede salir en dos coches de la misma carrera: una sola carrera, con todo sumado
+            for r, d in zip(arch.drivers, drivers):
+                if not d['driver_id']: continue
+                t = totals.setdefault(d['driver_id'], dict.fromkeys(RACE_STATS_COLUMNS, 0))
+                t['races'] = 1; t['laps'] += r['laps']; t['seconds'] += r['seconds']; t['incidents'] += r['incidents']
+                t['pace_delta_sum'] += r['pace_delta'] or 0.0; t['pace_delta_n'] += int(r['pace_delta'] is not None)
+                t['stint_stdev_sum'] += (r['consistency'] or 0.0) * r['stints_measured']; t['stint_n'] += r['stints_measured']
+            stats = [{'driver_id': driver_id, **t} for driver_id, t in totals.items()]
+            if stats:
+                t = DriverRaceStats.__table__
+                stmt = sqlite_insert(t)
+                db.session.execute(stmt.on_conflict_do_update(index_elements=[t.c.driver_id], set_={c: t.c[c] + stmt.excluded[c] for c in RACE_STATS_COLUMNS}), stats)
+        db.session.commit()
+        os.remove(path)
+        print(f"🏁 [Archivo] {rs.session_key}: {len(results)} coches, {len(arch.laps)} vueltas, {len(arch.pits)} paradas")
+        return rs
+    except Exception as e:
+        db.session.rollback()
+        print(f"⚠️ [Archivo] {os.path.basename(path)}: {e}")
+        return None
+
+@app.cli.command("archive-races")
+def archive_races_command():
+    """Archiva los diarios de sesiones cerradas que quedaron pendientes."""
+    for path in race_recorder.pending(): archive_race(path)
+
 @app.route('/api/telemetry/live', methods=['GET'])
 def telemetry_live():
     """
@@ -702,50 +1390,56 @@ def telemetry_live():
     Calcula si la telemetría está stale (no se han recibido paquetes recientemente)
     y ajusta el campo 'connected' en la respuesta para que el cliente lo use directamente.
     """
-    global telemetry_data
-    # copia para no exponer referencias internas
-    resp = dict(telemetry_data)
-
-    last = telemetry_data.get("last_ingest") or telemetry_data.get("timestamp") or 0
-    resp["last_ingest"] = last
+    # copia: el dict decodificado se comparte entre requests de este worker
+    resp = telemetry_view(telemetry.state())
+    resp.update(telemetry_store.freshness(resp, time.time(), TELEMETRY_STALE_THRESHOLD))
+    return jsonify(resp)
 
-    # ISO string para debug/lectura
+@app.route('/api/telemetry/plan', methods=['GET', 'POST', 'DELETE'])
+@login_required
+def telemetry_plan():
+    """
+    Activa (POST {strategy_id, team_id?, tz_offset?}), consulta o desactiva la estrategia que se compara con la telemetría.
+    tz_offset: Date.getTimezoneOffset() del navegador, la zona de las horas de los relevos (si falta, la del servidor).
+    """
+    import plan_tracker
+    data = request.get_json(silent=True) or request.args
+    key = plan_tracker.session_key(data)
+    if request.method == 'GET': return jsonify({"ok": True, "plan": plan_tracker.projection(telemetry.state(), key)})
+    found = []
+    if request.method == 'DELETE':
+        telemetry.update(lambda state: found.append(plan_tracker.deactivate(state, key)) or state)
+        return jsonify({"ok": found[0]})
+    s = Strategy.query.get_or_404(int(data.get("strategy_id") or 0))
+    if not (s.user_id == current_user.id or (s.team_id == current_user.team_id and s.is_shared) or current_user.role == 'admin'):
+        return jsonify({"ok": False, "error": "forbidden"}), 403
+    projection = []
     try:
-        resp["last_ingest_iso"] = datetime.utcfromtimestamp(last).isoformat() + "Z" if last else ""
-    except Exception:
-        resp["last_ingest_iso"] = ""
-
-    # decide conectado/desconectado según frescura (server-side)
-    if last:
-        age = time.time() - last
-        if age > TELEMETRY_STALE_THRESHOLD:
-            resp["connected"] = False
-            resp["telemetry_age_seconds"] = age
-        else:
-            resp["connected"] = True
-            resp["telemetry_age_seconds"] = age
-    else:
-        resp["connected"] = False
-        resp["telemetry_age_seconds"] = None
-
-    return jsonify(resp)
+        tz = data.get("tz_offset")
+        tz = int(float(tz)) if tz not in (None, "") else None
+        if tz is not None and not -900 <= tz <= 900: raise ValueError("tz_offset fuera de rango (minutos)")
+        payload = json.loads(s.payload or "{}")
+        telemetry.update(lambda state: projection.append(plan_tracker.activate(state, key, s.id, s.name, payload, tz)) or state)
+    except (ValueError, TypeError) as e: return jsonify({"ok": False, "error": str(e)}), 400
+    return jsonify({"ok": True, "plan": projection[0]})
 # --- ENDPOINT: /api/telemetry/live  (añadir si falta) ---
 @app.route('/api/telemetry/live', methods=['GET'])
 def get_live_telemetry():
     """
-    Devuelve el estado actual de telemetry_data.
+    Devuelve el estado actual de la telemetría compartida.
     Marca connected = False si no hay updates recientes (>5s).
-    Protect: no rompe si telemetry_data no está definido.
+    Protect: no rompe si el frame no se puede leer.
     """
     try:
-        # Si no existe timestamp o telemetry_data, esto no debe lanzar
-        if time.time() - telemetry_data.get("timestamp", 0) > 5:
-            telemetry_data["connected"] = False
+        state = telemetry_view(telemetry.state())
+        # Si no existe timestamp, esto no debe lanzar
+        if time.time() - state.get("timestamp", 0) > 5:
+            state["connected"] = False
     except Exception:
-        # telemetry_data no definido o problemas: devolvemos un payload por defecto
+        # problemas leyendo el frame: devolvemos un payload por defecto
         return jsonify({"connected": False, "timestamp": 0}), 200
 
-    return jsonify(telemetry_data), 200
+    return jsonify(state), 200
 # --- fin endpoint ---
 
 
@@ -890,295 +1584,56 @@ if __name__ == '__main__':
 # ==========================================
 # FIN BLOQUE LIVE TIMING
 # ==========================================
-# --- INYECCIÓN INLINE RESTAURADA (NONCE, clases únicas, logs, reintentos) ---
-# INYECCIÓN: actualizar CSP para permitir fonts/styles + inline script con nonce
+# --- CSP CON NONCE PARA /live-timing ---
+# El JS que antes se inyectaba inline vive en static/js/live_timing_inject.js (asset con huella). La vista
+# live_timing() deja el nonce en g.csp_nonce; este hook solo pone la cabecera y no toca el cuerpo.
+# connect-src permite https: para no bloquear recursos de jsdelivr/cdnjs durante desarrollo.
+LIVE_TIMING_CSP = (
+    "default-src 'self'; "
+    "script-src 'self' 'nonce-{nonce}'; "
+    "connect-src 'self' ws: https: {telemetry_url}; "
+    "img-src 'self' data:; "
+    "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com https://cdnjs.cloudflare.com https://cdn.jsdelivr.net; "
+    "font-src 'self' https://fonts.gstatic.com https://cdnjs.cloudflare.com data:;"
+)
 
 @app.after_request
-def inject_live_timing_with_nonce(response):
-    """
-    Inyecta script inline en /live-timing y ajusta CSP para permitir fonts/styles y conexiones HTTPS necesarias.
-    Esta versión PRESERVA la inyección JS completa que ya tenías y solo actualiza la directiva connect-src
-    para permitir https: (necesario para cargar recursos desde jsdelivr/cdnjs durante desarrollo).
-    """
-    try:
-        # import local para no depender de importaciones externas en la parte superior del archivo
-        import base64
-        from flask import request
-
-        if request.path == '/live-timing' and response.content_type and 'text/html' in response.content_type.lower():
-            # generar nonce único por respuesta
-            nonce = base64.b64encode(os.urandom(16)).decode('ascii')
-
-            # CSP ampliada: permitimos https: en connect-src para evitar bloqueos a CDNs (útil en dev)
-            csp = (
-                "default-src 'self'; "
-                "script-src 'self' 'nonce-{}'; "
-                "connect-src 'self' ws: https:; "
-                "img-src 'self' data:; "
-                "style-src 'self' 'unsafe-inline' https://fonts.googleapis.com https://cdnjs.cloudflare.com https://cdn.jsdelivr.net; "
-                "font-src 'self' https://fonts.gstatic.com https://cdnjs.cloudflare.com data:;"
-            ).format(nonce)
-            response.headers['Content-Security-Policy'] = csp
-
-            body = response.get_data(as_text=True)
-
-            # --- Inyección JS (se conserva tu bloque completo) ---
-            injection = '''<!-- INLINE INJECTION (CSP updated): live_timing strategies modal (nonce) -->
-<script nonce="''' + nonce + '''">
-(function(){
-  try {
-    console && console.log && console.log('inline strategies (nonce) loaded - CSP updated');
-
-    // back button safe attach
-    try {
-      var backEl = document.querySelector('a.btn-nav, .btn-nav');
-      if (backEl && !backEl.dataset._legacy_back_injected) {
-        backEl.addEventListener('click', function(e){ e.preventDefault(); window.location.href = '/'; }, {passive:true});
-        backEl.dataset._legacy_back_injected = '1';
-      }
-    } catch(e){}
-
-    // place badges
-    function placeBadges() {
-      try {
-        var sessionBar = document.querySelector('.session-bar');
-        if (!sessionBar) return;
-        var airSpan = document.getElementById('weatherAir');
-        var insertBeforeNode = airSpan && airSpan.parentElement && sessionBar.contains(airSpan.parentElement) ? airSpan.parentElement : sessionBar.firstElementChild;
-
-        function ensureWrappedSpan(id, initialText) {
-          var existing = document.getElementById(id);
-          var span;
-          if (existing) {
-            span = existing.tagName && existing.tagName.toLowerCase() === 'span' ? existing : (existing.querySelector && existing.querySelector('span#' + id) || existing);
-          } else {
-            span = document.createElement('span');
-            span.id = id;
-            span.className = 'session-val';
-            span.textContent = initialText;
-          }
-          var wrapper = span.parentElement;
-          if (!wrapper || wrapper.classList.contains('session-bar') || (wrapper.tagName && wrapper.tagName.toLowerCase() === 'span')) {
-            wrapper = document.createElement('div');
-            if (span.parentElement) { span.parentElement.replaceChild(wrapper, span); wrapper.appendChild(span); } else { wrapper.appendChild(span); }
-          }
-          if (!span.classList.contains('session-val')) span.classList.add('session-val');
-          if (!sessionBar.contains(wrapper)) {
-            if (insertBeforeNode) sessionBar.insertBefore(wrapper, insertBeforeNode);
-            else sessionBar.appendChild(wrapper);
-          } else {
-            if (insertBeforeNode && wrapper.nextSibling !== insertBeforeNode && wrapper !== insertBeforeNode.previousSibling) {
-              sessionBar.insertBefore(wrapper, insertBeforeNode);
-            }
-          }
-          return span;
-        }
-
-        ensureWrappedSpan('trackNameBadge', 'TRACK: -');
-        ensureWrappedSpan('sessionTypeBadge', 'SESSION: -');
-      } catch(e) { console && console.warn && console.warn('placeBadges error', e); }
-    }
-
-    // strategies logic (abstracción minimal, expone attachLoadButtons)
-    (function(){
-      var API_LIST = '/api/estrategias';
-      var API_DETAIL = function(id){ return '/api/estrategia/' + id; };
-      var TELEMETRY = '/api/telemetry/live';
-
-      function el(tag, attrs, children) {
-        attrs = attrs || {}; children = children || [];
-        var d = document.createElement(tag);
-        for (var k in attrs) {
-          if (!attrs.hasOwnProperty(k)) continue;
-          if (k === 'class') d.className = attrs[k];
-          else if (k === 'html') d.innerHTML = attrs[k];
-          else d.setAttribute(k, attrs[k]);
-        }
-        (Array.isArray(children) ? children : [children]).forEach(function(c){
-          if (!c) return;
-          if (typeof c === 'string') d.appendChild(document.createTextNode(c));
-          else d.appendChild(c);
-        });
-        return d;
-      }
-
-      function createModal() {
-        var overlay = el('div', { class: 'lt-overlay', id: 'lt-strat-overlay', style: 'position:fixed; inset:0; display:flex; align-items:center; justify-content:center; z-index:9999;' });
-        var modal = el('div', { class: 'lt-modal', style: 'background:#0f0f10; color:#fff; border-radius:8px; width:86%; max-width:900px; max-height:80vh; overflow:auto; box-shadow:0 8px 30px rgba(0,0,0,0.6); padding:14px; font-family: inherit;' });
-        var header = el('div', { class: 'lt-modal-header', style: 'display:flex; justify-content:space-between; align-items:center; margin-bottom:8px;' }, [
-          el('div', { style: 'font-weight:700; font-size:1.05rem;' }, ['Cargar Estrategia']),
-          el('button', { class: 'lt-close-btn', style: 'background:transparent; border:1px solid #444; color:#fff; padding:6px 10px; border-radius:6px; cursor:pointer;' }, ['Cerrar'])
-        ]);
-        var content = el('div', { class: 'lt-modal-body', id: 'lt-modal-content', style: 'padding-top:6px;' });
-        modal.appendChild(header); modal.appendChild(content); overlay.appendChild(modal); document.body.appendChild(overlay);
-        overlay.addEventListener('click', function(e){ if (e.target === overlay) overlay.remove(); });
-        var closeBtn = modal.querySelector('.lt-close-btn'); if (closeBtn) closeBtn.addEventListener('click', function(){ overlay.remove(); });
-        return { overlay: overlay, content: content };
-      }
-
-      async function fetchStrategies() {
-        var res = await fetch(API_LIST, { credentials: 'same-origin' });
-        if (!res.ok) throw new Error('HTTP ' + res.status);
-        return await res.json();
-      }
-
-      async function fetchStrategy(id) {
-        var res = await fetch(API_DETAIL(id), { credentials: 'same-origin' });
-        if (!res.ok) throw new Error('HTTP ' + res.status);
-        return await res.json();
-      }
-
-      function renderStrategyPreview(container, strat) {
-        container.innerHTML = '';
-        var meta = el('div', { style: 'margin-bottom:8px; display:flex; gap:10px; align-items:center;' }, [
-          el('div', { style: 'font-weight:700; font-size:1rem;' }, [strat.name || 'Sin nombre']),
-          el('div', { style: 'color:#aaa; font-size:0.9rem;' }, [ (strat.car_name || '') + ' ' + (strat.car_class || '') ])
-        ]);
-        container.appendChild(meta);
-        var stints = (strat.payload && strat.payload.stints) || [];
-        var table = el('table', { style: 'width:100%; border-collapse:collapse; margin-top:6px;' });
-        var thead = el('thead', {}, [
-          el('tr', {}, [
-            el('th', { style:'text-align:left; padding:6px; color:#bbb;'} , ['#']),
-            el('th', { style:'text-align:left; padding:6px; color:#bbb;' } , ['PILOTO']),
-            el('th', { style:'padding:6px; color:#bbb;' } , ['INICIO']),
-            el('th', { style:'padding:6px; color:#bbb;' } , ['FIN']),
-            el('th', { style:'padding:6px; color:#bbb;' } , ['LAPS']),
-            el('th', { style:'padding:6px; color:#bbb;' } , ['FUEL']),
-            el('th', { style:'padding:6px; color:#bbb;' } , ['WX']),
-            el('th', { style:'padding:6px; color:#bbb;' } , ['PIT']),
-            el('th', { style:'padding:6px; color:#bbb;' } , ['NOTAS'])
-          ])
-        ]);
-        var tbody = el('tbody', {});
-        stints.forEach(function(s,i){
-          var tr = el('tr', {}, [
-            el('td', { style:'padding:6px; color:#fff;' }, [String(i+1)]),
-            el('td', { style:'padding:6px; color:#fff;' }, [s.driver || s.name || 'N/A']),
-            el('td', { style:'padding:6px; color:#fff;' }, [s.start || s.inicio || '--:--']),
-            el('td', { style:'padding:6px; color:#fff;' }, [s.end || s.fin || '--:--']),
-            el('td', { style:'padding:6px; color:#fff;' }, [String(s.laps || '')]),
-            el('td', { style:'padding:6px; color:#fff;' }, [String(s.fuel || '')]),
-            el('td', { style:'padding:6px; color:#fff;' }, [s.wx || '-']),
-            el('td', { style:'padding:6px; color:#fff;' }, [s.pit ? 'YES' : '']),
-            el('td', { style:'padding:6px; color:#fff;' }, [s.notes || ''])
-          ]);
-          tbody.appendChild(tr);
-        });
-        table.appendChild(thead); table.appendChild(tbody); container.appendChild(table);
-      }
-
-      async function applyStrategyToPlan(strat) {
-        try {
-          if (!strat || !strat.ok) { alert('Estrategia inválida o no accesible.'); return; }
-          var payload = strat.payload || {};
-          // backward-compatible: prefer payload.stints, fallback to payload.relays (server uses "relays")
-          var stints = Array.isArray(payload.stints) ? payload.stints : (Array.isArray(payload.relays) ? payload.relays.map(function(r){ return { driver: r.driver || r.name, start: r.start, end: r.end, laps: (r.laps ? Number(r.laps) : ''), fuel: r.fuel, wx: '', pit: !!r.pit, notes: r.notes || '' }; }) : []);
-          var tbody = document.getElementById('strategyBody');
-          if (!tbody) { alert('No se encontró plan de carrera en la página.'); return; }
-          tbody.innerHTML = '';
-          var tele = {};
-          try { var r = await fetch(TELEMETRY, { credentials: 'same-origin' }); if (r.ok) tele = await r.json(); } catch(e){ tele = {}; }
-          stints.forEach(function(s, idx){
-            var tr = document.createElement('tr');
-            var names = (tele && tele.grid) ? tele.grid.map(function(g){ return (g.name||'').toLowerCase(); }) : [];
-            var driverName = (s.driver || s.name || '').toLowerCase();
-            var isConn = names.indexOf(driverName) !== -1;
-            var tdIndex = document.createElement('td'); tdIndex.textContent = String(idx+1);
-            var tdPilot = document.createElement('td'); tdPilot.textContent = s.driver || s.name || '---'; tdPilot.className = (isConn ? 'pilot-on' : 'pilot-off'); tdPilot.style.textAlign = 'left';
-            var tdStart = document.createElement('td'); tdStart.textContent = s.start || s.inicio || '--:--';
-            var tdEnd = document.createElement('td'); tdEnd.textContent = s.end || s.fin || '--:--';
-            var tdLaps = document.createElement('td'); tdLaps.textContent = String(s.laps || s.laps_est || '');
-            var tdFuel = document.createElement('td'); tdFuel.textContent = String(s.fuel || '');
-            var tdWx = document.createElement('td'); tdWx.textContent = s.wx || '-';
-            var tdPit = document.createElement('td'); tdPit.textContent = s.pit ? 'YES' : '';
-            var tdNotes = document.createElement('td'); tdNotes.textContent = s.notes || s.notas || '';
-
-            tr.appendChild(tdIndex); tr.appendChild(tdPilot); tr.appendChild(tdStart); tr.appendChild(tdEnd);
-            tr.appendChild(tdLaps); tr.appendChild(tdFuel); tr.appendChild(tdWx); tr.appendChild(tdPit); tr.appendChild(tdNotes);
-            tbody.appendChild(tr);
-          });
-          console && console.log && console.log('Strategy applied, rows:', stints.length);
-        } catch(e) { console && console.error && console.error('applyStrategyToPlan error', e); alert('Error al aplicar estrategia'); }
-      }
-
-      function attachLoadButtons() {
-        var buttons = document.querySelectorAll('.btn-load, #btnLoadStrategy');
-        Array.prototype.forEach.call(buttons, function(btn){
-          try {
-            if (btn.dataset.ltAttached) return;
-            btn.addEventListener('click', async function(ev){
-              try {
-                ev.preventDefault();
-                var modalObj = createModal();
-                var content = modalObj.content;
-                content.innerHTML = '<div style="padding:8px">Cargando estrategias…</div>';
-                var listRes;
-                try { listRes = await fetchStrategies(); } catch(err) { content.innerHTML = '<div style="padding:8px; color:#f88;">No se pudo listar estrategias (comprueba login)</div>'; return; }
-                if (!listRes || !listRes.ok) { content.innerHTML = '<div style="padding:8px; color:#f88;">Error al listar estrategias</div>'; return; }
-                var strategies = listRes.strategies || [];
-                content.innerHTML = '';
-                if (!strategies.length) { content.innerHTML = '<div style="padding:8px; color:#ccc;">No hay estrategias disponibles</div>'; return; }
-                var listWrap = el('div', { style: 'display:flex; gap:10px; flex-direction:column;' });
-                strategies.forEach(function(s){
-                  var item = el('div', { style:'display:flex; justify-content:space-between; align-items:center; gap:8px; padding:8px; border-bottom:1px solid rgba(255,255,255,0.04);' });
-                  var left = el('div', {}, [ el('div', { style:'font-weight:700; color:#fff;' }, [s.name]), el('div', { style:'color:#aaa; font-size:0.85rem;' }, [ (s.car_name||'') + ' · ' + (s.car_class||'') ]) ]);
-                  var actions = el('div', {}, [ el('button', { style:'background:#222; border:1px solid #444; color:#fff; padding:6px 8px; border-radius:6px; cursor:pointer;', 'data-id': s.id }, ['Previsualizar']), el('button', { style:'background:#0a84ff; border:none; color:#fff; padding:6px 8px; border-radius:6px; margin-left:6px; cursor:pointer;', 'data-id': s.id }, ['Cargar']) ]);
-                  item.appendChild(left); item.appendChild(actions); listWrap.appendChild(item);
-                  Array.prototype.forEach.call(actions.querySelectorAll('button'), function(b){
-                    b.addEventListener('click', async function(ev2){
-                      ev2.stopPropagation();
-                      var id = b.getAttribute('data-id');
-                      try {
-                        var detail = await fetchStrategy(id);
-                        if (!detail || !detail.ok) { alert('No se pudo cargar la estrategia (no autorizada o inválida). Comprueba permisos.'); return; }
-                        if (b.textContent && b.textContent.trim() === 'Previsualizar') {
-                          var prev = content.querySelector('#lt-preview'); if (prev) prev.remove();
-                          var preview = el('div', { id:'lt-preview', style:'margin-top:10px;' });
-                          renderStrategyPreview(preview, detail);
-                          content.appendChild(preview);
-                          preview.scrollIntoView({ behavior: 'smooth' });
-                        } else {
-                          await applyStrategyToPlan(detail);
-                          modalObj.overlay.remove();
-                        }
-                      } catch(err) { console && console.error && console.error('action click error', err); alert('Error al obtener la estrategia. Mira la consola.'); }
-                    });
-                  });
-                });
-                content.appendChild(listWrap);
-              } catch(e) { console && console.error && console.error('btn click error', e); }
-            });
-            btn.dataset.ltAttached = '1';
-          } catch(e) { console && console.warn && console.warn('attach btn fail', e); }
-        });
-      }
-
-      window.attachLoadButtons = attachLoadButtons;
-      window.applyStrategyToPlan = applyStrategyToPlan;
-      window.initLiveTimingStrategies = function(){ try { placeBadges(); } catch(e){} try { attachLoadButtons(); } catch(e){} };
-
-      function safeInitRetries(){ var attempts=[0,120,300,800,1500]; attempts.forEach(function(t){ setTimeout(function(){ try{ window.initLiveTimingStrategies(); }catch(e){} }, t); }); }
-      if (document.readyState === 'complete' || document.readyState === 'interactive') safeInitRetries(); else { window.addEventListener('DOMContentLoaded', safeInitRetries); setTimeout(safeInitRetries, 500); }
-
-    })();
-
-  } catch(e) { console && console.error && console.error('inline injection error', e); }
-})();
-</script>
-<!-- END INLINE INJECTION -->'''
-            # solo insertar si existe </body> para no romper otras respuestas
-            if '</body>' in body:
-                body = body.replace('</body>', injection + '</body>')
-                response.set_data(body)
-    except Exception as e:
-        # imprime el error en consola del servidor para debugging sin interrumpir la respuesta
-        try:
-            print("inject_live_timing_with_nonce error:", e)
-        except:
-            pass
+def live_timing_csp(response):
+    nonce = g.get('csp_nonce')
+    if nonce is None: return response
+    response.headers['Content-Security-Policy'] = LIVE_TIMING_CSP.format(nonce=nonce, telemetry_url=app.config['TELEMETRY_URL'])
     return response
-# --- FIN INYECCIÓN (CSP updated) ---# --- FIN INYECCIÓN (CSP updated) ---
+
+# ==========================================
+# FÁBRICA DE LA APP
+# ==========================================
+# Importar app.py solo define modelos y rutas. Lo que toca disco, BD o tarda
+# (carpetas, extensiones, mmap de telemetría, huellas de static/) va aquí, una
+# vez por proceso y después de aplicar la config de quien arranca (tests,
+# gunicorn). Las migraciones siguen siendo un paso aparte (flask migrate).
+#   gunicorn -w 4 'app:create_app()'        flask --app app:create_app migrate
+# bench_startup.py mide y acota el coste de importar app.py.
+# La app es única por proceso (las rutas se registran al importar): llamarla otra
+# vez devuelve la misma, y pedirle otra config es un error en vez de ignorarla.
+def create_app(config=None):
+    global strategy_cache, assets, telemetry
+    if 'sqlalchemy' in app.extensions:
+        changed = sorted(k for k, v in (config or {}).items() if app.config.get(k) != v)
+        if changed: raise RuntimeError(f"create_app(): la app de este proceso ya está configurada; no se puede cambiar {', '.join(changed)}")
+        return app
+    app.config.update(config or {})
+    os.makedirs(instance_path, exist_ok=True)
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    db.init_app(app)
+    login_manager.init_app(app)
+    perf.init_app(app)
+    strategy_cache = PayloadCache(app.config.setdefault('STRATEGY_CACHE_BYTES', 32 * 1024 * 1024))
+    telemetry = telemetry_store.TelemetryStore(app.config.setdefault('TELEMETRY_SHM_PATH', os.path.join(instance_path, "telemetry.shm")), TELEMETRY_DEFAULTS,
+                                               capacity=app.config.setdefault('TELEMETRY_SHM_BYTES', telemetry_store.DEFAULT_CAPACITY))
+    assets = static_assets.AssetManifest(app.static_folder).build()
+    return app
 
 if __name__ == "__main__":
+    create_app()
+    run_migrations()
     app.run(debug=False, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,84 @@
+# ==========================================
+# BENCHMARK DE ARRANQUE (import app.py + create_app)
+# ==========================================
+# Cada worker de gunicorn y cada test importan app.py, así que su coste se
+# paga N veces. Lanza procesos limpios que miden por separado: el framework
+# (Flask + SQLAlchemy + Flask-Login, suelo que no depende de nosotros),
+# `import app` y create_app(). Falla (exit 1) si el import propio de app.py
+# supera el presupuesto o si arrastra alguno de los módulos que deben cargarse
+# bajo demanda (NumPy, requests, Pillow).
+#
+#   python bench_startup.py                        (7 procesos, presupuesto 150 ms)
+#   python bench_startup.py --runs 15 --budget-ms 100 --importtime
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+LAZY_MODULES = ("numpy", "requests", "PIL")     # solo los cargan las rutas/hilos que los usan
+
+PROBE = r"""
+import json, os, sys, time
+t0 = time.perf_counter()
+import flask, flask_sqlalchemy, flask_login, sqlalchemy.orm
+t1 = time.perf_counter()
+import app
+t2 = time.perf_counter()
+tmp = sys.argv[1]
+app.create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(tmp, "bench.db"), "TELEMETRY_SHM_PATH": os.path.join(tmp, "telemetry.shm")})
+t3 = time.perf_counter()
+print(json.dumps({"framework": t1 - t0, "import": t2 - t1, "create": t3 - t2, "loaded": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def probe():
+    with tempfile.TemporaryDirectory(prefix="startup-bench-") as tmp:
+        out = subprocess.run([sys.executable, "-c", PROBE % (LAZY_MODULES,), tmp], cwd=HERE, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def importtime(top=12):
+    """Imports directos de app.py ordenados por coste (python -X importtime, tiempo acumulado)."""
+    err = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=HERE, capture_output=True, text=True).stderr
+    rows = []
+    for line in err.splitlines():
+        if not line.startswith("import time:"): continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2      # -X importtime sangra 2 espacios por nivel
+        if self_us.strip().isdigit() and depth <= 2: rows.append((int(cum_us), int(self_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=7)
+    ap.add_argument("--budget-ms", type=float, default=150.0, help="máximo para la mediana de `import app` (sin el framework)")
+    ap.add_argument("--importtime", action="store_true", help="lista los imports más caros")
+    args = ap.parse_args()
+
+    probe()                                          # calienta la caché de bytecode y de disco
+    runs = [probe() for _ in range(args.runs)]
+    med = lambda k: statistics.median(r[k] for r in runs) * 1e3
+    print(f"{args.runs} procesos (mediana)")
+    print(f"framework     {med('framework'):7.1f} ms   Flask + SQLAlchemy + Flask-Login")
+    print(f"import app    {med('import'):7.1f} ms   presupuesto {args.budget_ms:g} ms")
+    print(f"create_app()  {med('create'):7.1f} ms")
+    if args.importtime:
+        for cum, own, name in importtime(): print(f"  {cum / 1e3:7.1f} ms  (propio {own / 1e3:5.1f})  {name}")
+
+    failures = []
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+    if loaded: failures.append(f"importar app.py + create_app() carga {', '.join(loaded)} (deberían ser diferidos)")
+    if med("import") > args.budget_ms: failures.append(f"import app {med('import'):.1f} ms > {args.budget_ms:g} ms")
+    for f in failures: print(f"❌ {f}")
+    if failures: sys.exit(1)
+    print("✅ dentro de presupuesto")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# ==========================================
+# BENCHMARK DE telemetry_store (N workers, M viewers)
+# ==========================================
+# Simula un despliegue gunicorn: un proceso escribe frames como el bridge
+# (/api/telemetry/ingest) y W procesos "worker" reparten V viewers en hilos que
+# leen el frame y lo serializan como /api/telemetry/live. Comprueba que ningún
+# lector ve un frame a medias y mide latencia de lectura y frescura.
+#
+#   python bench_telemetry.py                      (8 workers, 200 viewers cada 500 ms, 10 s)
+#   python bench_telemetry.py --workers 4 --viewers 50 --hz 60 --poll 0.5
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from telemetry_store import TelemetryStore
+
+
+def make_frame(i, cars):
+    # el mismo contador al principio y al final: un frame roto los tendría distintos
+    return {"frame": i, "laps": i // 100, "fuel": 80 - (i % 1000) * 0.05, "driver": "Bench", "flag": "green",
+            "timing": [{"car_idx": c, "pos": c + 1, "lap": i // 100, "pct": (i * 0.01 + c * 0.013) % 1.0, "gap": c * 0.731,
+                        "name": f"Driver {c:02d}", "car": "Ferrari 296 GT3"} for c in range(cars)],
+            "sent_at": time.time(), "frame_end": i}
+
+
+def writer(path, hz, seconds, cars, ready):
+    store = TelemetryStore(path)
+    ready.wait()
+    period, t_end, i = 1.0 / hz, time.time() + seconds, 0
+    while time.time() < t_end:
+        i += 1
+        frame = make_frame(i, cars)
+        store.update(lambda state: {**state, **frame})
+        time.sleep(max(0.0, period - (time.time() - frame["sent_at"])))
+
+
+def worker(path, viewers, seconds, poll, ready, out):
+    store = TelemetryStore(path)
+    lat, stale, torn, reads = [], [], [0], [0]
+    lock = threading.Lock()
+
+    def viewer():
+        my_lat, my_stale, my_torn, n, seen = [], [], 0, 0, False
+        ready.wait()
+        t_end = time.time() + seconds
+        while time.time() < t_end:
+            t0 = time.perf_counter()
+            resp = dict(store.state())                      # lo que hace telemetry_live()
+            body = json.dumps(resp)
+            my_lat.append(time.perf_counter() - t0)
+            # frame roto: contadores distintos, o JSON ilegible (state() cae a los defaults sin "frame")
+            if resp.get("frame") != resp.get("frame_end") or (seen and "frame" not in resp): my_torn += 1
+            seen = seen or "frame" in resp
+            if resp.get("sent_at"): my_stale.append(time.time() - resp["sent_at"])
+            n += 1
+            if poll: time.sleep(poll)
+        with lock:
+            lat.extend(my_lat); stale.extend(my_stale); torn[0] += my_torn; reads[0] += n
+        del body
+
+    threads = [threading.Thread(target=viewer) for _ in range(viewers)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    out.put({"lat": np.array(lat), "stale": np.array(stale), "torn": torn[0], "reads": reads[0], "retries": store.retries})
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--viewers", type=int, default=200)
+    ap.add_argument("--seconds", type=float, default=10.0)
+    ap.add_argument("--hz", type=float, default=20.0, help="frames/s del bridge")
+    ap.add_argument("--poll", type=float, default=0.5, help="pausa de cada viewer entre lecturas (live_timing_custom.js: 500 ms; 0 = sin pausa)")
+    ap.add_argument("--cars", type=int, default=60)
+    args = ap.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="telemetry-bench-"), "telemetry.shm")
+    TelemetryStore(path).close()
+    ready, out = mp.Event(), mp.Queue()
+    per = [args.viewers // args.workers + (1 if w < args.viewers % args.workers else 0) for w in range(args.workers)]
+    procs = [mp.Process(target=writer, args=(path, args.hz, args.seconds, args.cars, ready))]
+    procs += [mp.Process(target=worker, args=(path, n, args.seconds, args.poll, ready, out)) for n in per]
+    for p in procs: p.start()
+    time.sleep(0.5)
+    ready.set()
+    results = [out.get() for _ in per]
+    for p in procs: p.join()
+
+    lat = np.concatenate([r["lat"] for r in results]) * 1e6
+    stale = np.concatenate([r["stale"] for r in results]) * 1e3
+    reads = sum(r["reads"] for r in results)
+    print(f"{args.workers} workers · {args.viewers} viewers · {args.hz:g} Hz · {args.cars} coches · {os.path.getsize(path) // 1024} KiB mmap")
+    print(f"lecturas      {reads} ({reads / args.seconds:,.0f}/s)")
+    print(f"latencia µs   p50 {np.percentile(lat, 50):.1f}  p99 {np.percentile(lat, 99):.1f}  máx {lat.max():.1f}")
+    print(f"frescura ms   p50 {np.percentile(stale, 50):.1f}  p99 {np.percentile(stale, 99):.1f}")
+    print(f"frames rotos  {sum(r['torn'] for r in results)}   reintentos seqlock {sum(r['retries'] for r in results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@
 # - Actualiza payload con usage_percent, usage_label, usage_debug y fuel_needed
 # - Detecta escala de CarIdxLapDistPct (0..1 vs 0..100) y normaliza
 # - Mantiene el resto de la lógica original (stints, fuel model, grid)
+# - Gap/interval de carrera en segundos reales (TimingLine por checkpoints)
 
 import time
 import requests
@@ -15,6 +16,7 @@ import traceback
 import pickle
 import os
 import sys
+from array import array
 
 URL_DESTINO = "http://127.0.0.1:5000/api/telemetry/ingest"
 AVG_PIT_LOSS = 50.0
@@ -65,6 +67,7 @@ def check_iracing(ir, state):
     try:
         if state.ir_connected and not (getattr(ir, 'is_initialized', False) and getattr(ir, 'is_connected', False)):
             state.ir_connected = False
+            TIMING.reset()
             print("\n[!] iRacing desconectado.")
         elif not state.ir_connected:
             try:
@@ -343,6 +346,153 @@ def usage_label_from_percent(p):
         return f"Uso alto ({p}%)"
     return f"Uso muy alto ({p}%)"
 
+# ===========================
+# Línea de cronometraje (gaps en segundos)
+# ===========================
+# La vuelta se divide en TIMING_CHECKPOINTS puntos. En cada muestra (TIMING_HZ)
+# se interpola el instante (SessionTime) en que cada coche cruzó cada punto y
+# se guarda en arrays fijos por coche: tiempo y vuelta del último cruce de
+# cada checkpoint. El gap entre dos coches es la diferencia de tiempos en el
+# último checkpoint que han cruzado los dos en la misma vuelta: O(1) por coche
+# y memoria acotada (64 coches x checkpoints), sin historial.
+TIMING_CHECKPOINTS = 100      # ~1 s por checkpoint en una vuelta de 100 s
+TIMING_HZ = 15                # muestras por segundo (10-20 va bien con 60 coches)
+TIMING_MAX_CARS = 64          # CarIdx de iRacing: 0..63
+TIMING_MAX_STEP = 0.25        # más de 1/4 de vuelta entre muestras = grúa/reset: no se interpola
+
+
+class TimingLine:
+    def __init__(self, checkpoints=TIMING_CHECKPOINTS, max_cars=TIMING_MAX_CARS):
+        self.k = checkpoints
+        self.max_cars = max_cars
+        self.reset()
+
+    def reset(self):
+        k, n = self.k, self.max_cars
+        self.cp_time = [array('d', [0.0]) * k for _ in range(n)]   # instante del último cruce de cada checkpoint
+        self.cp_lap = [array('i', [-1]) * k for _ in range(n)]     # vuelta (absoluta) de ese cruce
+        self.last_cp = array('i', [-1]) * n                        # último checkpoint cruzado por el coche
+        self.prev_pct = array('d', [-1.0]) * n
+        self.prev_t = array('d', [0.0]) * n
+        self.lap = array('i', [0]) * n                             # vueltas completadas según nuestros cruces de meta
+        self.session_time = -1.0
+
+    def sample(self, session_time, pcts, laps_completed):
+        """Una muestra de SessionTime, CarIdxLapDistPct y CarIdxLapCompleted (listas por CarIdx)."""
+        if session_time < self.session_time:
+            self.reset()                                           # nueva sesión: SessionTime vuelve a empezar
+        self.session_time = session_time
+        k = self.k
+        scale = 100.0 if any(p is not None and p > 1.5 for p in pcts) else 1.0
+        for car in range(min(len(pcts), self.max_cars)):
+            p = pcts[car]
+            if p is None or p < 0:
+                self.prev_pct[car] = -1.0                          # fuera de pista / en el garaje
+                continue
+            p = p / scale
+            p0, t0 = self.prev_pct[car], self.prev_t[car]
+            self.prev_pct[car], self.prev_t[car] = p, session_time
+            official = safe_int(laps_completed[car], -1) if car < len(laps_completed) else -1
+            if p0 < 0:
+                self.lap[car] = max(0, official)
+                continue
+            d = p - p0
+            wrapped = d < -0.5
+            if wrapped:
+                d += 1.0
+            if d <= 0 or d > TIMING_MAX_STEP or session_time <= t0:
+                if wrapped:
+                    self.lap[car] += 1
+                continue
+            dt = session_time - t0
+            lap = self.lap[car]
+            times, laps = self.cp_time[car], self.cp_lap[car]
+            # checkpoints j (en coordenadas continuas) con p0*k < j <= (p0+d)*k
+            for j in range(int(p0 * k) + 1, int((p0 + d) * k) + 1):
+                cp = j % k
+                times[cp] = t0 + dt * ((j / k - p0) / d)
+                laps[cp] = lap + (1 if j >= k else 0)
+                self.last_cp[car] = cp
+            if wrapped:
+                self.lap[car] += 1
+            elif 0.25 < p < 0.75 and 0 <= official != self.lap[car]:
+                # a mitad de vuelta CarIdxLapCompleted es fiable (junto a la meta va con retraso):
+                # corrige nuestro contador (p.ej. salida desde detrás de la línea) y la vuelta en curso
+                for cp in range(k):
+                    if laps[cp] == self.lap[car]:
+                        laps[cp] = official
+                self.lap[car] = official
+
+    def gap(self, car, ref):
+        """
+        (segundos, vueltas) que car va por detrás de ref en su último checkpoint común.
+        Doblado: (None, n). Sin checkpoint común todavía: (None, 0).
+        """
+        if not (0 <= car < self.max_cars and 0 <= ref < self.max_cars):
+            return None, 0
+        cp = self.last_cp[car]
+        if cp < 0:
+            return None, 0
+        lap, ref_lap = self.cp_lap[car][cp], self.cp_lap[ref][cp]
+        if ref_lap == lap:
+            return self.cp_time[car][cp] - self.cp_time[ref][cp], 0
+        if ref_lap > lap:
+            return None, ref_lap - lap
+        # ref aún no ha llegado a este punto en esta vuelta (p.ej. posiciones oficiales que se
+        # actualizan en meta): se mide en el último checkpoint de ref y sale negativo
+        cp = self.last_cp[ref]
+        if cp >= 0 and self.cp_lap[car][cp] == self.cp_lap[ref][cp]:
+            return self.cp_time[car][cp] - self.cp_time[ref][cp], 0
+        return None, 0
+
+    def progress(self, car):
+        """Vueltas + fracción de la última muestra (para el gap estimado mientras no hay checkpoint común)."""
+        if not (0 <= car < self.max_cars) or self.prev_pct[car] < 0:
+            return None
+        return self.lap[car] + self.prev_pct[car]
+
+
+TIMING = TimingLine()
+
+
+def sample_timing(ir):
+    """Muestra para TIMING; se llama a TIMING_HZ, más a menudo que loop()."""
+    try:
+        ir.freeze_var_buffer_latest()
+        session_time = safe_float(ir_get(ir, 'SessionTime', 0))
+        pcts = ir_get(ir, 'CarIdxLapDistPct', None)
+        laps = ir_get(ir, 'CarIdxLapCompleted', None) or []
+        if pcts:
+            TIMING.sample(session_time, [safe_float(v, -1.0) for v in pcts], laps)
+    except Exception:
+        pass
+
+
+def race_gap(car, ref, lap_time):
+    """
+    Gap de car respecto a ref: (segundos, vueltas). Si todavía no hay checkpoint
+    común (recién conectado, salida de boxes) se estima con la distancia x lap_time.
+    """
+    seconds, laps_down = TIMING.gap(car, ref)
+    if seconds is not None or laps_down:
+        return seconds, laps_down
+    a, b = TIMING.progress(car), TIMING.progress(ref)
+    if a is None or b is None:
+        return None, 0
+    behind = b - a
+    if behind >= 1.0:
+        return None, int(behind)
+    return behind * lap_time, 0
+
+
+def format_gap(seconds, laps_down):
+    if laps_down > 0:
+        return f"+{laps_down} L"
+    if seconds is None:
+        return "--"
+    return f"+{seconds:.1f}" if seconds >= 0 else f"{seconds:.1f}"
+
+
 # ===========================
 # Loop principal
 # ===========================
@@ -491,6 +641,11 @@ def loop(ir, state):
         drivers_data = []
         positions = ir_get(ir, 'CarIdxPosition', None)
         pcts = ir_get(ir, 'CarIdxLapDistPct', None)
+        leader_idx = -1
+        try:
+            leader_idx = list(positions).index(1) if positions else -1
+        except ValueError:
+            pass
 
         official_results = []
         try:
@@ -564,15 +719,17 @@ def loop(ir, state):
             sort_value = 0.0
             if session_type == "RACE":
                 diff = leader_laps - off['laps']
-                if pos == 1:
+                gap_s, laps_down = race_gap(idx, leader_idx, avg_lap_time) if leader_idx >= 0 else (None, 0)
+                if gap_s is None and not laps_down and diff > 0:
+                    laps_down = diff                    # sin timing todavía: vueltas oficiales
+                if pos == 1 or idx == leader_idx:
                     display_gap = "LDR"
-                elif diff > 0:
-                    display_gap = f"+{diff} L"
-                    sort_value = diff * 1000.0
-                else:
-                    gap_val = (1.0 - pct) * 100.0
-                    display_gap = f"+{gap_val:.1f}"
-                    sort_value = gap_val
+                elif laps_down > 0:
+                    display_gap = format_gap(None, laps_down)
+                    sort_value = laps_down * 1000.0
+                elif gap_s is not None:
+                    display_gap = format_gap(gap_s, 0)
+                    sort_value = gap_s
             else:
                 if raw_best <= 0:
                     sort_value = 99999.0
@@ -662,6 +819,15 @@ def loop(ir, state):
 
             car_logo = get_brand_logo(d.get('CarScreenName', ''))
 
+            # datos crudos para el archivo post-sesión de la web (race_archive.py)
+            car_lap = 0
+            car_on_pit = False
+            try:
+                car_lap = safe_int(ir_get(ir, 'CarIdxLapCompleted', [0])[idx])
+                car_on_pit = bool(ir_get(ir, 'CarIdxOnPitRoad', [False])[idx])
+            except Exception:
+                pass
+
             drivers_data.append({
                 "pos": pos,
                 "name": str(d['UserName']),
@@ -678,7 +844,14 @@ def loop(ir, state):
                 "s2": s2,
                 "s3": s3,
                 "strat_txt": strat_txt,
-                "strat_cls": strat_cls
+                "strat_cls": strat_cls,
+                "car_idx": idx,
+                "cust_id": safe_int(d.get('UserID', 0)),
+                "lap": car_lap,
+                "last_lap_s": float(raw_last),
+                "best_lap_s": float(raw_best),
+                "on_pit": car_on_pit,
+                "incidents": safe_int(d.get('CurDriverIncidentCount', 0))
             })
 
         # ordenar y calcular intervals
@@ -695,7 +868,7 @@ def loop(ir, state):
                 prev = drivers_data[i - 1]
                 val = abs(curr['sort_val'] - prev['sort_val'])
                 if session_type == "RACE":
-                    drivers_data[i]["int"] = f"+{val:.1f}"
+                    drivers_data[i]["int"] = format_gap(*race_gap(curr['car_idx'], prev['car_idx'], avg_lap_time))
                 else:
                     drivers_data[i]["int"] = f"+{val:.3f}" if val < 5000 else "--"
 
@@ -858,11 +1031,27 @@ def loop(ir, state):
         except NameError:
             usage_debug = {}
 
+        # Identificador y estado de la sesión (la web cierra el archivo en cool down o al cambiar de sesión)
+        try:
+            wk_ids = ir_get(ir, 'WeekendInfo') or {}
+            sub_id = safe_int(wk_ids.get('SubSessionID', 0))
+        except Exception:
+            sub_id = 0
+        sess_num = safe_int(ir_get(ir, 'SessionNum', 0))
+        if sub_id > 0:
+            session_id = f"{sub_id}:{sess_num}"
+        else:
+            # sesiones offline/test: SubSessionID = 0
+            session_id = "local-{}-{}:{}".format(time.strftime('%Y%m%d'), safe_int(ir_get(ir, 'SessionUniqueID', 0)), sess_num)
+        session_state = safe_int(ir_get(ir, 'SessionState', 0))
+
         # Preparar payload final (incluye usage, usage_debug y fuel_needed)
         payload = {
             "connected": True,
             "timestamp": time.time(),
             "session_type": session_type,
+            "session_id": session_id,
+            "session_state": session_state,
             "track_name": track_name,
             "session_timer": display_timer,
             "weather": {
@@ -876,7 +1065,8 @@ def loop(ir, state):
                 "strat": my_car.get("strat", "OK"),
                 "incidents": my_car.get("incidents", 0),
                 "inc_limit": my_car.get("inc_limit", 0),
-                "fuel_needed": fuel_needed
+                "fuel_needed": fuel_needed,
+                "laps": my_curr_lap
             },
             "grid": drivers_data,
             "usage_percent": USAGE_SENT_PERCENT,
@@ -905,13 +1095,21 @@ if __name__ == '__main__':
     load_state(state)
     print("--- BRIDGE V28 (with usage estimator & fuel_needed) ---")
     try:
+        next_loop = 0.0
         while True:
             try:
-                check_iracing(ir, state)
-                loop(ir, state)
+                # timing a TIMING_HZ; conexión, grid y envío cada DT_SLEEP
+                tick = time.monotonic() >= next_loop
+                if tick:
+                    next_loop = time.monotonic() + DT_SLEEP
+                    check_iracing(ir, state)
+                if state.ir_connected:
+                    sample_timing(ir)
+                if tick:
+                    loop(ir, state)
             except Exception as inner_e:
                 print("Loop internal error:", inner_e)
-            time.sleep(DT_SLEEP)
+            time.sleep(1.0 / TIMING_HZ)
     except KeyboardInterrupt:
         print("\nFin.")
     except Exception as outer_e:
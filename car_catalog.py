@@ -0,0 +1,48 @@
+# ==========================================
+# CATÁLOGO DE COCHES EN MEMORIA
+# ==========================================
+# /fuel, /garage, /estrategia y /api/cars leían la tabla car entera en cada
+# request. El catálogo solo cambia cuando un admin añade o borra un coche, así
+# que cada proceso guarda una instantánea inmutable (lista ordenada, dict por
+# categoría y el JSON ya serializado) junto con la versión con la que se cargó.
+# La versión vive en SQLite (cache_version, fila 'cars'): garage()/delete_car()
+# la suben en la misma transacción que el cambio, y el resto de workers lo
+# notan en su siguiente request con una consulta por clave primaria.
+
+import hashlib
+import json
+import threading
+from collections import namedtuple
+
+CarRow = namedtuple("CarRow", "id category name tank_liters")
+
+
+class Snapshot:
+    def __init__(self, version, rows):
+        self.version = version
+        self.cars = tuple(rows)
+        self.by_category = {}
+        for c in self.cars: self.by_category.setdefault(c.category, []).append(c.name)
+        self.by_id = {c.id: c for c in self.cars}
+        self.body = json.dumps([c._asdict() for c in self.cars], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.etag = f"cars-{hashlib.sha1(self.body).hexdigest()[:16]}"
+
+
+class CatalogCache:
+    def __init__(self):
+        self._snap = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, version, load):
+        """Instantánea para esa versión; load() -> CarRow ordenados solo se llama si cambió."""
+        snap = self._snap
+        if snap is not None and snap.version == version: return snap
+        with self._lock:
+            snap = self._snap
+            if snap is None or snap.version != version:
+                snap = self._snap = Snapshot(version, load()); self.loads += 1
+        return snap
+
+    def invalidate(self):
+        self._snap = None
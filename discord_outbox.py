@@ -0,0 +1,133 @@
+# ==========================================
+# OUTBOX DE NOTIFICACIONES DISCORD
+# ==========================================
+# Los handlers solo encolan filas en la tabla notification_outbox (ver modelo
+# Notification en app.py). Un hilo worker las entrega con timeout, backoff
+# exponencial y respeto del rate-limit de Discord (429 + retry_after).
+# Las filas con la misma coalesce_key que llegan dentro de la ventana se
+# agrupan en un único embed "digest": al encolar heredan el next_attempt_at de
+# la ventana abierta (ver queue_discord en app.py) y vencen todas a la vez. Al estar en SQLite sobreviven reinicios.
+
+import json
+import sqlite3
+import threading
+import time
+
+TABLE = "notification_outbox"
+HTTP_TIMEOUT = 5.0          # segundos por POST al webhook
+POLL_INTERVAL = 2.0         # espera máxima del worker sin avisos
+BASE_BACKOFF = 2.0          # 2, 4, 8, 16... segundos
+MAX_BACKOFF = 300.0
+MAX_ATTEMPTS = 8
+LEASE_SECONDS = 30.0        # reclamo de filas (evita doble envío entre workers)
+DIGEST_MAX_LINES = 20
+
+_worker = None
+_wake = threading.Event()
+_lock = threading.Lock()
+
+
+def backoff_delay(attempts):
+    return min(BASE_BACKOFF * (2 ** max(attempts - 1, 0)), MAX_BACKOFF)
+
+
+def build_digest(rows, color=0xFFA500):
+    """Convierte N filas coalescidas en un único payload con un embed resumen."""
+    lines = list(dict.fromkeys(r["digest_line"] or (json.loads(r["payload"]).get("embeds") or [{}])[0].get("title", "") for r in rows))
+    extra = len(lines) - DIGEST_MAX_LINES
+    desc = "\n".join(f"• {l}" for l in lines[:DIGEST_MAX_LINES]) + (f"\n… y {extra} más" if extra > 0 else "")
+    first = (json.loads(rows[0]["payload"]).get("embeds") or [{}])[0]
+    embed = {"title": f"{first.get('title', 'Notificaciones')} ×{len(rows)}", "description": desc, "color": first.get("color", color)}
+    if first.get("footer"): embed["footer"] = first["footer"]
+    return {"embeds": [embed]}
+
+
+class OutboxWorker(threading.Thread):
+    """Hilo daemon que vacía la outbox. Usa su propia conexión sqlite3."""
+
+    def __init__(self, db_path, webhook_url):
+        super().__init__(name="discord-outbox", daemon=True)
+        self.db_path = db_path
+        self.webhook_url = webhook_url
+        self.paused_until = 0.0   # rate-limit global de Discord
+        self.session = None        # requests se importa con el primer envío, no al importar app.py
+
+    def connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def run(self):
+        while True:
+            try:
+                delay = self.run_once()
+            except Exception as e:
+                print(f"⚠️ Outbox Discord: {e}"); delay = POLL_INTERVAL
+            _wake.wait(timeout=max(0.05, min(delay, POLL_INTERVAL)))
+            _wake.clear()
+
+    def run_once(self, now=None):
+        """Entrega una tanda de filas vencidas. Devuelve segundos hasta la siguiente comprobación."""
+        now = now or time.time()
+        if now < self.paused_until: return self.paused_until - now
+        conn = self.connect()
+        try:
+            row = conn.execute(f"SELECT * FROM {TABLE} WHERE status = 'pending' AND next_attempt_at <= ? AND (locked_until IS NULL OR locked_until < ?) ORDER BY next_attempt_at, id LIMIT 1", (now, now)).fetchone()
+            if row is None: return POLL_INTERVAL
+            if row["coalesce_key"]:
+                # solo las vencidas: las que están en backoff o en otra ventana no se adelantan
+                group = conn.execute(f"SELECT * FROM {TABLE} WHERE status = 'pending' AND coalesce_key = ? AND next_attempt_at <= ? AND (locked_until IS NULL OR locked_until < ?) ORDER BY id", (row["coalesce_key"], now, now)).fetchall()
+            else:
+                group = [row]
+            ids = [r["id"] for r in group]
+            marks = ",".join("?" * len(ids))
+            cur = conn.execute(f"UPDATE {TABLE} SET locked_until = ? WHERE id IN ({marks}) AND (locked_until IS NULL OR locked_until < ?)", [now + LEASE_SECONDS, *ids, now])
+            conn.commit()
+            if cur.rowcount != len(ids): return 0  # otro worker se adelantó; reintentar ya
+            body = build_digest(group) if len(group) > 1 else json.loads(row["payload"])
+            status, retry_after, error = self.deliver(body)
+            if status == "sent":
+                conn.execute(f"UPDATE {TABLE} SET status = 'sent', sent_at = ?, locked_until = NULL WHERE id IN ({marks})", [time.time(), *ids])
+            elif status == "rate_limited":
+                self.paused_until = time.time() + retry_after
+                conn.execute(f"UPDATE {TABLE} SET next_attempt_at = ?, locked_until = NULL WHERE id IN ({marks})", [self.paused_until, *ids])
+            else:
+                attempts = max(r["attempts"] for r in group) + 1
+                final = status == "dead" or attempts >= MAX_ATTEMPTS
+                conn.execute(f"UPDATE {TABLE} SET attempts = ?, last_error = ?, status = ?, next_attempt_at = ?, locked_until = NULL WHERE id IN ({marks})",
+                             [attempts, error, "dead" if final else "pending", time.time() + backoff_delay(attempts), *ids])
+            conn.commit()
+            return 0
+        finally:
+            conn.close()
+
+    def deliver(self, body):
+        """POST al webhook. Devuelve (estado, retry_after, error) con estado sent|rate_limited|retry|dead."""
+        import requests
+        if self.session is None: self.session = requests.Session()
+        try:
+            r = self.session.post(self.webhook_url, json=body, timeout=HTTP_TIMEOUT)
+        except requests.RequestException as e:
+            return "retry", 0, str(e)[:500]
+        if r.status_code < 300: return "sent", 0, None
+        if r.status_code == 429:
+            try: retry_after = float(r.json().get("retry_after"))
+            except Exception: retry_after = float(r.headers.get("Retry-After") or BASE_BACKOFF)
+            return "rate_limited", retry_after, None
+        if r.status_code >= 500: return "retry", 0, f"HTTP {r.status_code}"
+        return "dead", 0, f"HTTP {r.status_code}: {r.text[:300]}"
+
+
+def ensure_worker(db_path, webhook_url):
+    """Arranca el worker una sola vez por proceso (idempotente y barato)."""
+    global _worker
+    if _worker is not None and _worker.is_alive(): return _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = OutboxWorker(db_path, webhook_url); _worker.start()
+    return _worker
+
+
+def notify():
+    """Despierta al worker tras encolar para entregar sin esperar al siguiente sondeo."""
+    _wake.set()
@@ -0,0 +1,88 @@
+# ==========================================
+# BARRIDO "WHAT-IF" DE COMBUSTIBLE (NumPy)
+# ==========================================
+# Misma cuenta que compute() de fuel_calc.html, pero sobre una rejilla completa
+# de escenarios en una sola pasada vectorizada:
+#   depósito (coche) × formación × vueltas de seguridad × consumo × tiempo de vuelta
+# El bucle de paradas del JS (salida, llenados a tope, última parada con lo
+# necesario + seguridad) se resuelve en forma cerrada para no iterar por celda.
+
+import numpy as np
+
+from stint_planner import parse_seconds
+
+MAX_CELLS = 250_000
+MAX_STEPS = 201
+FORMATION_LAPS = {"none": 0.0, "short": 0.5, "full": 1.0}
+EPS = 1e-9
+
+
+def axis(base, delta, steps):
+    steps = max(1, min(int(steps or 1), MAX_STEPS))
+    if steps == 1 or not delta: return np.array([float(base)])
+    return np.linspace(base - delta, base + delta, steps)
+
+
+def sweep(data, tanks):
+    """tanks: lista de (etiqueta, litros). Devuelve ejes + matrices [tank, formation, safety, consumption, lap_time]."""
+    mode = data.get("mode", "time")
+    if mode not in ("time", "laps"): raise ValueError("mode debe ser 'time' o 'laps'")
+    duration = float(data.get("duration") or 0)
+    if duration <= 0: raise ValueError("duration debe ser > 0 (minutos o vueltas)")
+    lap = axis(parse_seconds(data.get("lap_time")), parse_seconds(data.get("lap_time_delta")), data.get("lap_time_steps"))
+    cons = axis(float(data.get("consumption") or 0), float(data.get("consumption_delta") or 0), data.get("consumption_steps"))
+    if lap.min() <= 0 or cons.min() <= 0: raise ValueError("lap_time y consumption deben ser > 0 en todo el rango")
+    safety = np.array([float(s) for s in (data.get("safety_laps") or [0])])
+    formations = [f for f in (data.get("formation") or ["none"]) if f in FORMATION_LAPS] or ["none"]
+    tank = np.array([float(t) for _, t in tanks])
+    if not len(tank) or tank.min() <= 0: raise ValueError("se necesita al menos un depósito > 0")
+    cells = len(tank) * len(formations) * len(safety) * len(cons) * len(lap)
+    if cells > MAX_CELLS: raise ValueError(f"demasiadas combinaciones ({cells} > {MAX_CELLS})")
+    formation_fuel = float(data.get("formation_fuel") or 0)
+    start_req = float(data.get("start_fuel") or 0)
+
+    # ejes en forma broadcast: (T, F, S, C, L)
+    T = tank[:, None, None, None, None]
+    F = np.array([FORMATION_LAPS[f] for f in formations])[None, :, None, None, None]
+    S = safety[None, None, :, None, None]
+    C = cons[None, None, None, :, None]
+    LT = lap[None, None, None, None, :]
+
+    laps = np.floor(duration * 60 / LT + EPS) if mode == "time" else np.full(LT.shape, np.floor(duration))
+    safety_fuel = S * C
+    total = laps * C + safety_fuel + F * C + formation_fuel
+    start = np.minimum(start_req, T) if start_req > 0 else T
+    full_laps = np.floor(T / C + EPS)                                         # maxLapsPerFull
+
+    first = np.minimum(np.floor(start / C + EPS), laps)
+    left0 = laps - first
+    residual0 = start - first * C
+    # llenados a tope mientras lo que queda + seguridad no quepa en el depósito
+    fits = np.maximum(np.floor((T - safety_fuel) / C + EPS), 0)
+    fills = np.where(left0 > fits, np.ceil((left0 - fits) / np.maximum(full_laps, 1)), 0)
+    left_f = np.maximum(left0 - fills * full_laps, 0)
+    # combustible que queda en el coche antes de la última parada
+    prev_left = left0 - np.maximum(fills - 1, 0) * full_laps
+    after_fill = T - np.minimum(full_laps, prev_left) * C
+    res_before_last = np.where(fills == 0, residual0, np.where(left_f > 0, after_fill, np.where(fills == 1, residual0, T - full_laps * C)))
+    need = left_f * C + safety_fuel
+    last_add = np.where(left_f > 0, np.maximum(0, np.minimum(T - res_before_last, need - res_before_last)), T - res_before_last)
+    stops = fills + (left_f > 0)
+
+    no_stop = total <= start
+    stops = np.where(no_stop, 0, stops)
+    last_add = np.where(no_stop | (stops == 0), 0.0, last_add)
+    invalid = full_laps <= 0
+    shape = (len(tank), len(formations), len(safety), len(cons), len(lap))
+    out = lambda a, nd: np.where(invalid, np.nan, np.broadcast_to(a, shape)).round(nd)
+    grid = lambda a: [None if np.isnan(v) else v for v in a.ravel().tolist()]
+    return {
+        "axes": {"tank": [label for label, _ in tanks], "tank_liters": tank.tolist(), "formation": formations, "safety_laps": safety.tolist(),
+                 "consumption": cons.round(3).tolist(), "lap_time": lap.round(3).tolist()},
+        "shape": list(shape),
+        # matrices aplanadas en orden C (row-major) con la forma de "shape"
+        "laps": grid(out(laps + F, 1)),
+        "total_fuel": grid(out(total, 1)),
+        "stops": grid(out(stops, 0)),
+        "last_stop_fuel": grid(out(last_add, 1)),
+    }
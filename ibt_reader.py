@@ -0,0 +1,163 @@
+# ==========================================
+# LECTOR DE TELEMETRÍA .IBT (iRacing)
+# ==========================================
+# El archivo se abre con mmap y nunca se lee entero: la cabecera y los
+# descriptores de variables se parsean con struct y cada canal es una vista
+# NumPy (sin copia) sobre los registros de disco. Los resúmenes por vuelta se
+# calculan con reduceat sobre esas vistas, así que la memoria no crece con el
+# tamaño del archivo (el SO pagina lo que haga falta).
+#
+# Formato (irsdk_defines.h):
+#   irsdk_header          112 bytes  ver, status, tickRate, sessionInfo*, numVars, varHeaderOffset, numBuf, bufLen, varBuf[4]
+#   irsdk_diskSubHeader    32 bytes  sessionStartDate, startTime, endTime, lapCount, recordCount
+#   irsdk_varHeader ×N    144 bytes  type, offset, count, countAsTime, name[32], desc[64], unit[32]
+#   registros             bufLen bytes × recordCount desde varBuf[0].bufOffset
+
+import mmap
+import re
+import struct
+
+import numpy as np
+
+HEADER = struct.Struct("<10i2i")            # 12 ints (incluye pad[2]) antes de varBuf
+VARBUF = struct.Struct("<4i")               # tickCount, bufOffset, pad[2]
+DISK_SUBHEADER = struct.Struct("<qddii")
+VAR_HEADER = struct.Struct("<3i?3x32s64s32s")
+HEADER_SIZE = HEADER.size + 4 * VARBUF.size
+VAR_TYPES = {0: "S1", 1: "?", 2: "<i4", 3: "<u4", 4: "<f4", 5: "<f8"}
+TIRE_TEMP = re.compile(r"^(LF|RF|LR|RR)temp(C?[LMR])$")
+WINDOW_RECORDS = 65536                      # ~18 min a 60 Hz por ventana; acota el RSS del recorrido
+
+
+class IbtError(ValueError):
+    pass
+
+
+def _cstr(raw):
+    return raw.split(b"\0", 1)[0].decode("latin-1")
+
+
+class IbtFile:
+    """Uso: with IbtFile(path) as ibt: ibt["Speed"], ibt.lap_summaries()"""
+
+    def __init__(self, path):
+        self._fh = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._fh.close(); raise IbtError("archivo vacío")
+        try: self._parse()
+        except IbtError:
+            self.close(); raise
+        except (struct.error, IndexError, ValueError) as e:         # ValueError: NumPy con dtype/offset imposibles
+            self.close(); raise IbtError(f"cabecera .ibt inválida: {e}")
+
+    def _parse(self):
+        mm = self._mm
+        h = HEADER.unpack_from(mm, 0)
+        self.version, _, self.tick_rate, _, info_len, info_off, num_vars, var_off, _, buf_len = h[:10]
+        self.buf_offset = buf_offset = VARBUF.unpack_from(mm, HEADER.size)[1]
+        self.buf_len = buf_len
+        _, self.start_time, self.end_time, self.lap_count, self.record_count = DISK_SUBHEADER.unpack_from(mm, HEADER_SIZE)
+        if num_vars <= 0 or buf_len <= 0 or var_off < 0 or var_off + num_vars * VAR_HEADER.size > len(mm): raise IbtError("cabecera .ibt inválida")
+        if not 0 <= buf_offset <= len(mm): raise IbtError("cabecera .ibt inválida: registros fuera del archivo")
+        # recordCount puede venir a 0 si la sesión no se cerró bien: se deduce del tamaño
+        max_records = (len(mm) - buf_offset) // buf_len
+        self.record_count = min(self.record_count, max_records) if self.record_count > 0 else max_records
+        self.session_info = bytes(mm[info_off:info_off + info_len]).rstrip(b"\0").decode("latin-1") if info_len > 0 else ""
+        self.vars = {}
+        names, formats, offsets = [], [], []
+        for i in range(num_vars):
+            vtype, offset, count, _, name, desc, unit = VAR_HEADER.unpack_from(mm, var_off + i * VAR_HEADER.size)
+            name = _cstr(name)
+            if vtype not in VAR_TYPES or not name or name in self.vars: continue
+            if count < 1 or offset < 0 or offset + np.dtype(VAR_TYPES[vtype]).itemsize * count > buf_len:
+                raise IbtError(f"cabecera .ibt inválida: {name} fuera del registro")
+            self.vars[name] = {"type": vtype, "count": count, "desc": _cstr(desc), "unit": _cstr(unit)}
+            names.append(name); offsets.append(offset)
+            formats.append(VAR_TYPES[vtype] if count == 1 else (VAR_TYPES[vtype], (count,)))
+        dtype = np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": buf_len})
+        # vista estructurada sobre el mmap: cada campo es un array con stride = bufLen, sin copiar
+        self.records = np.frombuffer(mm, dtype=dtype, count=self.record_count, offset=buf_offset)
+
+    def __getitem__(self, name):
+        return self.records[name]
+
+    def __contains__(self, name):
+        return name in self.vars
+
+    def close(self):
+        self.records = None
+        try: self._mm.close()
+        except (AttributeError, BufferError): pass
+        self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _release(self, first, last):
+        """Devuelve al SO las páginas ya procesadas (limpias, respaldadas por el archivo) para que el RSS no crezca."""
+        if not hasattr(self._mm, "madvise"): return
+        lo = (self.buf_offset + first * self.buf_len) // mmap.PAGESIZE * mmap.PAGESIZE
+        hi = (self.buf_offset + last * self.buf_len) // mmap.PAGESIZE * mmap.PAGESIZE
+        if hi > lo: self._mm.madvise(mmap.MADV_DONTNEED, lo, hi - lo)
+
+    def lap_summaries(self, window=WINDOW_RECORDS):
+        """Una fila por vuelta: tiempo, fuel gastado, vel. mín/máx y temperatura media de gomas si existe.
+
+        Se recorre el archivo por ventanas de registros; en cada una se trocea por vuelta con reduceat y
+        el primer tramo se fusiona con la vuelta que venía de la ventana anterior.
+        """
+        if "Lap" not in self or "SessionTime" not in self or self.record_count == 0: raise IbtError("faltan canales Lap/SessionTime")
+        temps = sorted(n for n in self.vars if TIRE_TEMP.match(n) and self.vars[n]["count"] == 1)
+        has_fuel, has_speed = "FuelLevel" in self, "Speed" in self
+        cols = {k: [] for k in ["lap", "t0", "f0", "f1", "vmin", "vmax", "n"] + temps}
+        carry = None
+        for a in range(0, self.record_count, window):
+            rec = self.records[a:a + window]
+            lap = rec["Lap"]
+            starts = np.concatenate(([0], np.flatnonzero(lap[1:] != lap[:-1]) + 1))
+            ends = np.append(starts[1:], len(rec))
+            seg = {"lap": lap[starts], "t0": rec["SessionTime"][starts], "n": ends - starts}
+            if has_fuel: seg["f0"], seg["f1"] = rec["FuelLevel"][starts], rec["FuelLevel"][ends - 1]
+            if has_speed: seg["vmin"], seg["vmax"] = np.minimum.reduceat(rec["Speed"], starts), np.maximum.reduceat(rec["Speed"], starts)
+            for name in temps: seg[name] = np.add.reduceat(rec[name], starts, dtype=np.float64)
+            if carry is not None and carry["lap"] == seg["lap"][0]:
+                # la vuelta continúa desde la ventana anterior: se acumula sobre el arrastre
+                carry["n"] += seg["n"][0]
+                if has_fuel: carry["f1"] = seg["f1"][0]
+                if has_speed: carry["vmin"] = min(carry["vmin"], seg["vmin"][0]); carry["vmax"] = max(carry["vmax"], seg["vmax"][0])
+                for name in temps: carry[name] += seg[name][0]
+                seg = {k: v[1:] for k, v in seg.items()}
+            if len(seg["lap"]):                                 # si no, la vuelta es más larga que la ventana y sigue abierta
+                if carry is not None:
+                    for k, v in carry.items(): cols[k].append(np.array([v], dtype=np.float64))
+                # el último tramo de la ventana queda abierto como escalares hasta ver la siguiente
+                carry = {k: float(v[-1]) for k, v in seg.items()}
+                for k, v in seg.items(): cols[k].append(np.array(v[:-1], dtype=np.float64))
+            del rec, lap
+            self._release(a, min(a + window, self.record_count))
+        for k, v in carry.items(): cols[k].append(np.array([v], dtype=np.float64))
+        c = {k: np.concatenate(v) if v else np.array([]) for k, v in cols.items()}
+        # la vuelta termina cuando empieza la siguiente; la última del archivo queda incompleta
+        out = {"lap": c["lap"].astype(int).tolist(), "lap_time": np.round(np.append(np.diff(c["t0"]), np.nan), 3).tolist(), "samples": c["n"].astype(int).tolist()}
+        if has_fuel:
+            used = c["f0"] - c["f1"]
+            out["fuel_used"] = np.round(np.where(used >= 0, used, np.nan), 3).tolist()      # negativo = repostaje en la vuelta
+        if has_speed:
+            out["speed_min_kmh"] = np.round(c["vmin"] * 3.6, 1).tolist()
+            out["speed_max_kmh"] = np.round(c["vmax"] * 3.6, 1).tolist()
+        for name in temps: out[f"{name}_avg"] = np.round(c[name] / c["n"], 1).tolist()
+        out = {k: [None if isinstance(v, float) and v != v else v for v in vals] for k, vals in out.items()}
+        return {
+            "tick_rate": self.tick_rate, "records": int(self.record_count), "duration_s": round(float(self.end_time - self.start_time), 1),
+            "channels": len(self.vars), "laps": out,
+        }
+
+
+def summarize(path):
+    with IbtFile(path) as ibt:
+        return ibt.lap_summaries()
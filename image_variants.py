@@ -0,0 +1,170 @@
+# ==========================================
+# VARIANTES RESPONSIVE DE IMÁGENES (Pillow)
+# ==========================================
+# Las subidas (fotos de pilotos y diplomas) se guardan tal cual y un hilo
+# worker genera versiones reducidas, giradas según EXIF y sin metadatos:
+#   avatar  160 px cuadrado (recorte)     card  480 px de ancho     full  1600 px lado mayor
+# cada una en WebP y JPEG, en static/uploads/v/ con el ancho real en el nombre:
+#   <original>.<kind>-<ancho>.<webp|jpg>
+# así srcset se puede montar con un listado del directorio, sin abrir imágenes.
+# Las que faltan (p.ej. tras un git pull) las regenera al arrancar el worker
+# del único proceso que consigue el flock de backfill; los demás solo atienden
+# sus propias subidas y ven las variantes ajenas al re-escanear el directorio.
+
+import os
+import queue
+import re
+import tempfile
+import threading
+
+try: import fcntl
+except ImportError: fcntl = None     # Windows (servidor de desarrollo de un solo proceso): no hay con quién competir
+
+VARIANTS = (("full", (1600, 1600), False), ("card", (480, 4800), False), ("avatar", (160, 160), True))   # de mayor a menor
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
+VARIANT_DIR = "v"
+VARIANT_RE = re.compile(r"^(?P<src>.+)\.(?P<kind>avatar|card|full)-(?P<width>\d+)\.(?P<fmt>webp|jpg)$")
+
+_worker = None
+_lock = threading.Lock()
+_index = None               # nombre original -> {(kind, ancho): {formatos}}
+_index_mtime = None         # mtime del directorio de variantes en el último escaneo
+_index_lock = threading.Lock()
+
+
+def is_image(filename):
+    return "." in filename and filename.rsplit(".", 1)[1].lower() in IMAGE_EXTENSIONS
+
+
+def _flatten(im):
+    from PIL import Image
+    if im.mode in ("RGBA", "LA", "P"):
+        im = im.convert("RGBA")
+        bg = Image.new("RGB", im.size, (0, 0, 0))
+        bg.paste(im, mask=im.getchannel("A"))
+        return bg
+    return im.convert("RGB")
+
+
+def generate(upload_dir, filename):
+    """Crea todas las variantes de un archivo. Devuelve [(kind, ancho, fmt)] escritas."""
+    from PIL import Image, ImageOps         # diferido: importar app.py no paga Pillow si no hay nada que generar
+    src = os.path.join(upload_dir, filename)
+    out_dir = os.path.join(upload_dir, VARIANT_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    written = []
+    with Image.open(src) as im:
+        im.draft("RGB", VARIANTS[0][1])         # JPEG: decodifica ya reducido (mucho más rápido)
+        base = _flatten(ImageOps.exif_transpose(im))
+    for kind, box, crop in VARIANTS:
+        if crop: v = ImageOps.fit(base, (min(box[0], *base.size),) * 2, Image.LANCZOS)
+        else:
+            v = base.copy(); v.thumbnail(box, Image.LANCZOS)
+            base = v                            # el siguiente tamaño se reduce desde este
+        for fmt, opts in (("webp", {"quality": WEBP_QUALITY, "method": 4}), ("jpg", {"quality": JPEG_QUALITY, "optimize": True, "progressive": True})):
+            name = f"{filename}.{kind}-{v.width}.{fmt}"
+            fd, tmp = tempfile.mkstemp(dir=out_dir, prefix=f".{name}.", suffix=".tmp")     # único: otro proceso puede estar con el mismo
+            try:
+                with os.fdopen(fd, "wb") as out: v.save(out, "WEBP" if fmt == "webp" else "JPEG", **opts)
+                os.chmod(tmp, 0o644)                # mkstemp crea 0600; el servidor web tiene que poder leerlo
+                os.replace(tmp, os.path.join(out_dir, name)); tmp = None
+            finally:
+                if tmp: os.remove(tmp)
+            written.append((kind, v.width, fmt))
+    with _index_lock:
+        if _index is not None:
+            for kind, width, fmt in written: _index.setdefault(filename, {}).setdefault((kind, width), set()).add(fmt)
+    return written
+
+
+def _mtime(upload_dir):
+    try: return os.stat(os.path.join(upload_dir, VARIANT_DIR)).st_mtime_ns
+    except FileNotFoundError: return None
+
+
+def _scan(upload_dir):
+    index = {}
+    try: entries = os.listdir(os.path.join(upload_dir, VARIANT_DIR))
+    except FileNotFoundError: entries = []
+    for name in entries:
+        if m := VARIANT_RE.match(name):
+            index.setdefault(m["src"], {}).setdefault((m["kind"], int(m["width"])), set()).add(m["fmt"])
+    return index
+
+
+def variants(upload_dir, filename):
+    """{kind: (ancho, nombre_base)} de las variantes listas en ambos formatos; {} si aún no hay."""
+    global _index, _index_mtime
+    found = _index.get(filename) if _index is not None else None
+    if not found or sum(len(fmts) == 2 for fmts in found.values()) < len(VARIANTS):
+        # fallo de índice: otro worker puede haberlas generado; un stat del directorio dice si hay que re-escanear
+        mtime = _mtime(upload_dir)
+        with _index_lock:
+            if _index is None or mtime != _index_mtime: _index, _index_mtime = _scan(upload_dir), mtime
+            found = _index.get(filename)
+    found = found or {}
+    return {kind: (width, f"{VARIANT_DIR}/{filename}.{kind}-{width}") for (kind, width), fmts in found.items() if len(fmts) == 2}
+
+
+def remove(upload_dir, filename):
+    """Borra las variantes de un original (al recoger un blob huérfano). Devuelve los bytes liberados."""
+    out_dir, prefix, freed = os.path.join(upload_dir, VARIANT_DIR), f"{filename}.", 0
+    try: entries = os.listdir(out_dir)
+    except FileNotFoundError: return 0
+    for name in entries:
+        if name.startswith(prefix) and VARIANT_RE.match(name):
+            path = os.path.join(out_dir, name)
+            freed += os.path.getsize(path); os.remove(path)
+    with _index_lock:
+        if _index is not None: _index.pop(filename, None)
+    return freed
+
+
+class VariantWorker(threading.Thread):
+    def __init__(self, upload_dir):
+        super().__init__(name="image-variants", daemon=True)
+        self.upload_dir = upload_dir
+        self.queue = queue.Queue()
+        self._backfill_fd = None
+
+    def _backfill_owner(self):
+        """Solo un proceso regenera lo que falta: el que se queda el flock (lo mantiene mientras viva)."""
+        if fcntl is None: return True
+        out_dir = os.path.join(self.upload_dir, VARIANT_DIR)
+        os.makedirs(out_dir, exist_ok=True)
+        fd = os.open(os.path.join(out_dir, ".backfill.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try: fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd); return False
+        self._backfill_fd = fd
+        return True
+
+    def backfill(self):
+        if not self._backfill_owner(): return
+        ready = _scan(self.upload_dir)
+        for name in sorted(os.listdir(self.upload_dir)):
+            if is_image(name) and len(ready.get(name, {})) < len(VARIANTS): self.queue.put(name)
+
+    def run(self):
+        while True:
+            filename = self.queue.get()
+            try: generate(self.upload_dir, filename)
+            except FileNotFoundError: pass          # blob recogido por gc_uploads() antes de procesarlo
+            except Exception as e: print(f"⚠️ [Imágenes] {filename}: {e}")
+            finally: self.queue.task_done()
+
+
+def ensure_worker(upload_dir):
+    """Arranca el worker una sola vez por proceso (idempotente y barato)."""
+    global _worker
+    if _worker is not None and _worker.is_alive(): return _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = VariantWorker(upload_dir); _worker.backfill(); _worker.start()
+    return _worker
+
+
+def enqueue(upload_dir, filename):
+    if is_image(filename): ensure_worker(upload_dir).queue.put(filename)
@@ -0,0 +1,271 @@
+# ==========================================
+# PRUEBA DE CARGA DEL PIPELINE DE TELEMETRÍA
+# ==========================================
+# Todo en local, sin servicios externos: N bridges simulados envían a
+# /api/telemetry/ingest payloads con la misma forma que bridge_pro.loop()
+# (parrilla completa, my_car, weather, usage...) y M viewers hacen polling de
+# /api/telemetry/live cada 500 ms como live_timing_custom.js. Al final:
+#   - latencia p50/p95/p99/máx y errores de ingest y de live
+#   - edad del frame en el viewer (timestamp del bridge -> respuesta de /live)
+#   - CPU y RSS del servidor (proceso indicado con --server-pid o lanzado con
+#     --spawn, sumando sus hijos: sirve para gunicorn -w N)
+# El cliente es asyncio con HTTP/1.1 keep-alive propio (solo stdlib) para que
+# 200 viewers no cuesten 200 hilos en la misma máquina que el servidor.
+#
+#   python loadtest.py --spawn "python app.py" --bridges 2 --viewers 200 --duration 30
+#   python loadtest.py --url http://127.0.0.1:5001 --server-pid 1234 --rate 10
+#   python loadtest.py --spawn "python telemetry_service.py --port 5001 --no-shm" --url http://127.0.0.1:5001
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+NAMES = ["Manolo Segovia", "Pepe Lopez", "Pere Tutusaus", "Laura Gil", "Marc Vidal", "Ana Ruiz", "Jordi Puig", "Sara Moreno"]
+LOGOS = ["ferrari", "porsche", "bmw", "mercedes", "audi", "lamborghini", "mclaren", "aston"]
+
+
+# --- payloads tipo bridge_pro.loop() ---
+def fmt_time(seconds):
+    if seconds <= 0: return "-"
+    m, s = divmod(seconds, 60)
+    return f"{int(m)}:{s:06.3f}"
+
+
+class SimBridge:
+    """Una sesión de carrera: coches que avanzan por pista con ritmos distintos."""
+
+    def __init__(self, idx, cars, lap_time=100.0):
+        rnd = random.Random(idx)
+        self.idx, self.cars, self.t0 = idx, cars, time.time()
+        self.pace = [lap_time * rnd.uniform(0.985, 1.03) for _ in range(cars)]
+        self.best = [0.0] * cars
+        self.me = rnd.randrange(cars)
+
+    def payload(self):
+        now = time.time()
+        elapsed = now - self.t0
+        dist = [elapsed / p for p in self.pace]             # vueltas recorridas (con fracción)
+        order = sorted(range(self.cars), key=lambda c: -dist[c])
+        leader = dist[order[0]]
+        grid = []
+        for pos, c in enumerate(order, 1):
+            laps, pct = divmod(dist[c], 1.0)
+            last = self.pace[c] * random.uniform(0.995, 1.01) if laps >= 1 else 0.0
+            if last and (not self.best[c] or last < self.best[c]): self.best[c] = last
+            behind = int(leader) - int(laps)
+            gap = "LDR" if pos == 1 else (f"+{behind} L" if behind > 0 else f"+{(1.0 - pct) * 100.0:.1f}")
+            grid.append({"pos": pos, "name": f"{NAMES[c % len(NAMES)]} {c}", "num": str(c + 1), "is_me": c == self.me,
+                         "c_name": "GT3", "car_logo": LOGOS[c % len(LOGOS)], "flag": "es", "last_lap": fmt_time(last),
+                         "best_lap": fmt_time(self.best[c]), "gap": gap, "sort_val": float(behind * 1000.0 if behind > 0 else (1.0 - pct) * 100.0),
+                         "s1": "-", "s2": "-", "s3": "-", "strat_txt": "-", "strat_cls": "equal", "pct": round(pct, 4),
+                         "int": "-" if pos == 1 else "+0.0"})
+        my_laps = int(dist[self.me])
+        fuel = max(0.0, 100.0 - (dist[self.me] % 30) * 3.2)
+        return {
+            "connected": True, "timestamp": now, "team_id": f"loadtest-{self.idx}", "session_type": "RACE",
+            "track_name": "Spa-Francorchamps (Grand Prix)", "session_timer": time.strftime("%H:%M:%S", time.gmtime(max(0, 6 * 3600 - elapsed))),
+            "weather": {"air": 21.5, "track": 29.75, "rain": 0, "status": "DRY"},
+            "my_car": {"fuel": round(fuel, 1), "strat": "OK", "incidents": 2, "inc_limit": 0, "fuel_needed": 120.5, "laps": my_laps},
+            "grid": grid, "usage_percent": 64, "usage_label": "Medium", "usage_debug": {"delta": 0.5, "ema_usage": 63.9},
+            "fuel_needed": 120.5,
+        }
+
+
+# --- cliente HTTP/1.1 mínimo con keep-alive ---
+class Conn:
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None, timeout=5.0):
+        for attempt in (0, 1):                              # un reintento si el servidor cerró el keep-alive
+            if self.writer is None: self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            if body is not None: head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            self.writer.write(head.encode() + b"\r\n" + (body or b""))
+            try:
+                await self.writer.drain()
+                return await asyncio.wait_for(self._response(), timeout)
+            except asyncio.TimeoutError:
+                self.close(); raise
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                self.close()
+                if attempt: raise e
+
+    async def _response(self):
+        raw = await self.reader.readuntil(b"\r\n\r\n")
+        lines = raw.decode("latin-1").split("\r\n")
+        version, status = lines[0].split(" ", 2)[:2]
+        headers = {k.strip().lower(): v.strip() for k, v in (l.split(":", 1) for l in lines[1:] if ":" in l)}
+        if "content-length" in headers: body = await self.reader.readexactly(int(headers["content-length"]))
+        else: body = await self.reader.read()              # HTTP/1.0 sin longitud: hasta cerrar
+        if version == "HTTP/1.0" or headers.get("connection", "").lower() == "close" or "content-length" not in headers: self.close()
+        return int(status), body
+
+    def close(self):
+        if self.writer: self.writer.close()
+        self.reader = self.writer = None
+
+
+class Stats:
+    def __init__(self):
+        self.lat = {"ingest": [], "live": []}
+        self.errors = {"ingest": 0, "live": 0}
+        self.age = []
+
+    def record(self, kind, t0, ok):
+        if ok: self.lat[kind].append(time.perf_counter() - t0)
+        else: self.errors[kind] += 1
+
+
+async def bridge(i, args, host, port, stats, stop):
+    sim, conn, period = SimBridge(i, args.cars), Conn(host, port), 1.0 / args.rate
+    await asyncio.sleep(random.uniform(0, period))
+    while not stop.is_set():
+        tick = time.perf_counter()
+        body = json.dumps(sim.payload()).encode()
+        try: status, _ = await conn.request("POST", "/api/telemetry/ingest", body); stats.record("ingest", tick, status == 200)
+        except Exception: stats.record("ingest", tick, False)
+        await asyncio.sleep(max(0.0, period - (time.perf_counter() - tick)))
+    conn.close()
+
+
+async def viewer(args, host, port, stats, stop):
+    conn = Conn(host, port)
+    await asyncio.sleep(random.uniform(0, args.poll))
+    while not stop.is_set():
+        tick = time.perf_counter()
+        try:
+            status, body = await conn.request("GET", "/api/telemetry/live")
+            stats.record("live", tick, status == 200)
+            if status == 200:
+                sent = (json.loads(body).get("last_payload") or {}).get("timestamp")
+                if sent: stats.age.append(time.time() - sent)
+        except Exception: stats.record("live", tick, False)
+        await asyncio.sleep(max(0.0, args.poll - (time.perf_counter() - tick)))
+    conn.close()
+
+
+# --- CPU/RSS del servidor desde /proc (Linux) ---
+def _proc_tree(pid):
+    pids, children = [pid], {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit(): continue
+        try:
+            with open(f"/proc/{entry}/stat") as f: ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        except (OSError, ValueError, IndexError): continue
+    for p in pids: pids.extend(children.get(p, []))
+    return pids
+
+
+def _usage(pids):
+    ticks = rss = 0
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/stat") as f: fields = f.read().rsplit(")", 1)[1].split()
+            ticks += int(fields[11]) + int(fields[12])      # utime + stime
+            rss += int(fields[21]) * PAGE
+        except (OSError, ValueError, IndexError): continue
+    return ticks, rss
+
+
+async def sample_server(pid, stop, out):
+    if not pid or not os.path.isdir("/proc"): return
+    t0, (ticks0, _) = time.perf_counter(), _usage(_proc_tree(pid))
+    while not stop.is_set():
+        pids = _proc_tree(pid)
+        _, rss = _usage(pids)
+        out["rss_max"] = max(out.get("rss_max", 0), rss); out["procs"] = len(pids)
+        await asyncio.sleep(0.5)
+    ticks1, _ = _usage(_proc_tree(pid))
+    out["cpu_pct"] = 100.0 * (ticks1 - ticks0) / CLK_TCK / (time.perf_counter() - t0)
+
+
+async def wait_ready(host, port, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            status, _ = await Conn(host, port).request("GET", "/api/telemetry/live", timeout=2.0)
+            if status == 200: return
+        except (OSError, asyncio.TimeoutError): pass
+        await asyncio.sleep(0.3)
+    raise SystemExit(f"el servidor no responde en {host}:{port}")
+
+
+async def run(args):
+    u = urlsplit(args.url)
+    host, port = u.hostname, u.port or 80
+    await wait_ready(host, port)
+    stats, server, stop = Stats(), {}, asyncio.Event()
+    cpu0 = os.times()
+    tasks = [asyncio.create_task(bridge(i, args, host, port, stats, stop)) for i in range(args.bridges)]
+    tasks += [asyncio.create_task(viewer(args, host, port, stats, stop)) for _ in range(args.viewers)]
+    tasks.append(asyncio.create_task(sample_server(args.server_pid, stop, server)))
+    await asyncio.sleep(args.duration)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    cpu1 = os.times()
+    return stats, server, 100.0 * ((cpu1.user - cpu0.user) + (cpu1.system - cpu0.system)) / args.duration
+
+
+def pct(values, ms=True):
+    if not values: return "-"
+    a = np.asarray(values) * (1e3 if ms else 1)
+    return "p50 {:.1f}  p95 {:.1f}  p99 {:.1f}  máx {:.1f}".format(*np.percentile(a, [50, 95, 99]), a.max())
+
+
+def report(args, stats, server, client_cpu):
+    out = {"config": vars(args), "server": server, "client_cpu_pct": round(client_cpu, 1)}
+    print(f"{args.bridges} bridges × {args.rate:g} Hz · {args.viewers} viewers cada {args.poll * 1000:.0f} ms · {args.cars} coches · {args.duration:g} s → {args.url}")
+    for kind in ("ingest", "live"):
+        n, err = len(stats.lat[kind]), stats.errors[kind]
+        rate = 100.0 * err / (n + err) if n + err else 0.0
+        print(f"{kind:<7} {n + err:>7} req ({(n + err) / args.duration:,.0f}/s)  errores {err} ({rate:.2f}%)  latencia ms {pct(stats.lat[kind])}")
+        out[kind] = {"requests": n + err, "errors": err, "latency_ms": np.percentile(np.asarray(stats.lat[kind]) * 1e3, [50, 95, 99]).tolist() if n else None}
+    print(f"edad del frame en el viewer ms  {pct(stats.age)}")
+    out["frame_age_ms"] = np.percentile(np.asarray(stats.age) * 1e3, [50, 95, 99]).tolist() if stats.age else None
+    if server: print(f"servidor  CPU {server.get('cpu_pct', 0):.0f}%  RSS máx {server.get('rss_max', 0) / 2**20:.0f} MB  ({server.get('procs', 1)} procesos)")
+    print(f"cliente   CPU {client_cpu:.0f}% (si se acerca a 100% por núcleo, el límite es el generador de carga)")
+    if args.json:
+        with open(args.json, "w") as f: json.dump(out, f, indent=2)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Prueba de carga local de /api/telemetry/ingest + /api/telemetry/live")
+    ap.add_argument("--url", default="http://127.0.0.1:5000")
+    ap.add_argument("--bridges", type=int, default=1)
+    ap.add_argument("--rate", type=float, default=2.0, help="envíos/s por bridge (bridge_pro.py: DT_SLEEP = 0.5 s)")
+    ap.add_argument("--viewers", type=int, default=50)
+    ap.add_argument("--poll", type=float, default=0.5, help="s entre lecturas de cada viewer (live_timing_custom.js: 0.5)")
+    ap.add_argument("--cars", type=int, default=40)
+    ap.add_argument("--duration", type=float, default=30.0)
+    ap.add_argument("--server-pid", type=int, help="PID del servidor para medir CPU/RSS (incluye sus hijos)")
+    ap.add_argument("--spawn", help='lanza el servidor, p.ej. "python app.py", y lo para al terminar')
+    ap.add_argument("--json", help="guarda el resultado en este archivo")
+    args = ap.parse_args()
+    proc = None
+    if args.spawn:
+        proc = subprocess.Popen(shlex.split(args.spawn), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        args.server_pid = args.server_pid or proc.pid
+    try: report(args, *asyncio.run(run(args)))
+    finally:
+        if proc:
+            proc.terminate()
+            try: proc.wait(10)
+            except subprocess.TimeoutExpired: proc.kill()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+# ==========================================
+# MIGRACIONES VERSIONADAS (schema_version)
+# ==========================================
+# Sustituye al antiguo bucle de ALTER TABLE que se ejecutaba en cada import.
+# Cada paso se registra en schema_version y no vuelve a ejecutarse nunca:
+# arrancar un worker con la BD al día cuesta una sola consulta (MAX(version)).
+#
+# Uso:   flask --app app:create_app migrate        (o python app.py, que migra antes de servir)
+#
+# Los pasos reciben (conn, ctx): conn es una Connection de SQLAlchemy dentro de
+# una transacción y ctx un namespace con lo que el paso necesita de app.py
+# (parse_smart_date, generate_password_hash, upload_folder) para evitar imports circulares.
+# Cada paso lleva su propio DDL: nunca create_all() sobre los modelos actuales, que
+# cambian con el código y harían que un paso antiguo crease cosas distintas según la versión.
+# Lo que toca disco y no se puede deshacer con la transacción se registra con
+# ctx.after_commit(fn) y se ejecuta solo si el paso hace commit.
+
+import os
+from collections import namedtuple
+from datetime import datetime
+
+Migration = namedtuple("Migration", "version name fn")
+MIGRATIONS = []
+
+
+def migration(version, name):
+    def wrap(fn):
+        MIGRATIONS.append(Migration(version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return wrap
+
+
+# --- Helpers idempotentes (la BD puede venir de create_all o de una versión antigua) ---
+
+def column_exists(conn, table, column):
+    return any(r[1] == column for r in conn.exec_driver_sql(f"PRAGMA table_info({table})"))
+
+
+def add_column(conn, table, col_def):
+    if not column_exists(conn, table, col_def.split()[0]):
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {col_def}")
+        return True
+    return False
+
+
+def create_index(conn, name, table, columns, unique=False):
+    conn.exec_driver_sql(f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+
+
+def create_tables(conn, ddl):
+    """CREATE TABLE IF NOT EXISTS para cada (tabla, cuerpo): la BD puede venir de un create_all antiguo."""
+    for table, body in ddl:
+        conn.exec_driver_sql(f"CREATE TABLE IF NOT EXISTS {table} ({body})")
+
+
+def current_version(conn):
+    conn.exec_driver_sql("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL)")
+    return conn.exec_driver_sql("SELECT COALESCE(MAX(version), 0) FROM schema_version").scalar()
+
+
+def run_migrations(engine, ctx, log=print):
+    """Aplica en orden los pasos pendientes. Devuelve la lista de versiones aplicadas."""
+    with engine.begin() as conn:
+        version = current_version(conn)
+    applied = []
+    for m in MIGRATIONS:
+        if m.version <= version: continue
+        pending = []
+        ctx.after_commit = pending.append
+        with engine.begin() as conn:
+            m.fn(conn, ctx)
+            conn.exec_driver_sql("INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)", (m.version, m.name, datetime.utcnow().isoformat()))
+        for fn in pending: fn()
+        applied.append(m.version)
+        log(f"🔧 [Migración] {m.version:03d} {m.name}")
+    return applied
+
+
+# ==========================================
+# PASOS
+# ==========================================
+
+@migration(1, "esquema base")
+def m001_base(conn, ctx):
+    # modelos tal y como estaban al introducir las migraciones; los índices los crea 004
+    create_tables(conn, [
+        ("car", "id INTEGER NOT NULL, category VARCHAR(50) NOT NULL, name VARCHAR(120) NOT NULL, PRIMARY KEY (id)"),
+        ("notification_outbox", "id INTEGER NOT NULL, payload TEXT NOT NULL, coalesce_key VARCHAR(50), digest_line VARCHAR(300), "
+                                "status VARCHAR(10) NOT NULL, attempts INTEGER NOT NULL, next_attempt_at FLOAT NOT NULL, locked_until FLOAT, "
+                                "last_error TEXT, created_at DATETIME, sent_at FLOAT, PRIMARY KEY (id)"),
+        ("team", "id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, PRIMARY KEY (id)"),
+        ("event", "id INTEGER NOT NULL, type VARCHAR(50) NOT NULL, name VARCHAR(100) NOT NULL, track VARCHAR(100) NOT NULL, "
+                  "date_str VARCHAR(50) NOT NULL, time_str VARCHAR(50), car_class VARCHAR(100), week INTEGER, alert_sent BOOLEAN, "
+                  "broadcast VARCHAR(500), team_id INTEGER, driver_id INTEGER, event_date DATE, PRIMARY KEY (id), "
+                  "FOREIGN KEY(team_id) REFERENCES team (id)"),
+        ("user", "id INTEGER NOT NULL, username VARCHAR(100) NOT NULL, email VARCHAR(150) NOT NULL, password_hash VARCHAR(200) NOT NULL, "
+                 "role VARCHAR(20), is_approved BOOLEAN, team_id INTEGER, requested_team VARCHAR(100), PRIMARY KEY (id), "
+                 "UNIQUE (username), UNIQUE (email), FOREIGN KEY(team_id) REFERENCES team (id)"),
+        ("driver", "id INTEGER NOT NULL, name VARCHAR(100) NOT NULL, discord VARCHAR(100), iracing_id VARCHAR(50), simulators VARCHAR(200), "
+                   "hardware VARCHAR(200), number VARCHAR(10), photo VARCHAR(120), biography TEXT, social_twitter VARCHAR(100), "
+                   "social_instagram VARCHAR(100), social_twitch VARCHAR(100), country VARCHAR(50), user_id INTEGER, PRIMARY KEY (id), "
+                   "FOREIGN KEY(user_id) REFERENCES user (id)"),
+        ("strategy", "id INTEGER NOT NULL, name VARCHAR(120) NOT NULL, car_class VARCHAR(50) NOT NULL, car_name VARCHAR(120) NOT NULL, "
+                     "created_at DATETIME, payload TEXT NOT NULL, user_id INTEGER, team_id INTEGER, is_shared BOOLEAN, PRIMARY KEY (id), "
+                     "FOREIGN KEY(user_id) REFERENCES user (id), FOREIGN KEY(team_id) REFERENCES team (id)"),
+        ("achievement", "id INTEGER NOT NULL, year VARCHAR(10), title VARCHAR(200) NOT NULL, driver_id INTEGER NOT NULL, PRIMARY KEY (id), "
+                        "FOREIGN KEY(driver_id) REFERENCES driver (id)"),
+        ("event_drivers", "event_id INTEGER NOT NULL, driver_id INTEGER NOT NULL, PRIMARY KEY (event_id, driver_id), "
+                          "FOREIGN KEY(event_id) REFERENCES event (id), FOREIGN KEY(driver_id) REFERENCES driver (id)"),
+        ("palmares", "id INTEGER NOT NULL, title_name VARCHAR(150) NOT NULL, year VARCHAR(10), image VARCHAR(150) NOT NULL, "
+                     "driver_id INTEGER NOT NULL, PRIMARY KEY (id), FOREIGN KEY(driver_id) REFERENCES driver (id)"),
+    ])
+
+
+@migration(2, "columnas añadidas a mano en versiones antiguas")
+def m002_legacy_columns(conn, ctx):
+    for table, col_def in [
+        ("driver", "biography TEXT"),
+        ("driver", "social_twitter TEXT"),
+        ("driver", "social_instagram TEXT"),
+        ("driver", "social_twitch TEXT"),
+        ("driver", "country TEXT DEFAULT 'España'"),
+        ("driver", "user_id INTEGER"),
+        ("user", "requested_team TEXT"),
+        ("strategy", "user_id INTEGER"),
+        ("strategy", "team_id INTEGER"),
+        ("strategy", "is_shared BOOLEAN DEFAULT 0"),
+        ("event", "team_id INTEGER"),
+        ("event", "alert_sent BOOLEAN DEFAULT 0"),
+        ("event", "broadcast TEXT"),
+        ("event", "event_date DATE"),
+    ]:
+        add_column(conn, table, col_def)
+
+
+@migration(3, "backfill event.event_date desde date_str")
+def m003_backfill_event_date(conn, ctx):
+    rows = conn.exec_driver_sql("SELECT id, date_str FROM event WHERE event_date IS NULL").fetchall()
+    updates = [(d.isoformat(), eid) for eid, d in ((eid, ctx.parse_smart_date(ds)) for eid, ds in rows) if d]
+    if updates: conn.exec_driver_sql("UPDATE event SET event_date = ? WHERE id = ?", updates)
+
+
+@migration(4, "índices de claves foráneas y calendario")
+def m004_indexes(conn, ctx):
+    create_index(conn, "ix_event_type_date", "event", ["type", "event_date"])
+    create_index(conn, "ix_event_team_id", "event", ["team_id"])
+    create_index(conn, "ix_event_drivers_driver_id", "event_drivers", ["driver_id"])
+    create_index(conn, "ix_user_team_id", "user", ["team_id"])
+    create_index(conn, "ix_driver_user_id", "driver", ["user_id"])
+    create_index(conn, "ix_palmares_driver_id", "palmares", ["driver_id"])
+    create_index(conn, "ix_achievement_driver_id", "achievement", ["driver_id"])
+    create_index(conn, "ix_outbox_status_next", "notification_outbox", ["status", "next_attempt_at"])
+
+
+@migration(5, "equipo Legacy eSports y usuario admin")
+def m005_seed(conn, ctx):
+    team = conn.exec_driver_sql("SELECT id FROM team WHERE name = 'Legacy eSports'").scalar()
+    if team is None:
+        team = conn.exec_driver_sql("INSERT INTO team (name) VALUES ('Legacy eSports')").lastrowid
+    if conn.exec_driver_sql("SELECT 1 FROM user WHERE username = 'admin'").scalar() is None:
+        conn.exec_driver_sql("INSERT INTO user (username, email, password_hash, role, is_approved, team_id) VALUES (?, ?, ?, 'admin', 1, ?)",
+                             ("admin", "admin@legacy.es", ctx.generate_password_hash("LEGACY2026"), team))
+
+
+@migration(6, "índices compuestos del listado de estrategias")
+def m006_strategy_indexes(conn, ctx):
+    create_index(conn, "ix_strategy_user_created", "strategy", ["user_id", "created_at"])
+    create_index(conn, "ix_strategy_team_shared_created", "strategy", ["team_id", "is_shared", "created_at"])
+
+
+@migration(7, "strategy.version para caché de payload y ETag")
+def m007_strategy_version(conn, ctx):
+    add_column(conn, "strategy", "version INTEGER NOT NULL DEFAULT 1")
+
+
+@migration(8, "tabla strategy_revision (historial con parches)")
+def m008_strategy_revisions(conn, ctx):
+    create_tables(conn, [
+        ("strategy_revision", "id INTEGER NOT NULL, strategy_id INTEGER NOT NULL, rev INTEGER NOT NULL, kind VARCHAR(10) NOT NULL, "
+                              "data TEXT NOT NULL, size INTEGER NOT NULL, name VARCHAR(120), car_class VARCHAR(50), car_name VARCHAR(120), "
+                              "author_id INTEGER, created_at DATETIME, PRIMARY KEY (id), CONSTRAINT uq_strategy_revision UNIQUE (strategy_id, rev), "
+                              "FOREIGN KEY(strategy_id) REFERENCES strategy (id) ON DELETE CASCADE, FOREIGN KEY(author_id) REFERENCES user (id)"),
+    ])
+
+
+# --- Búsqueda FTS5: tablas propias (rowid = id de origen) mantenidas por triggers ---
+STRATEGY_RELAYS_TEXT = ("CASE WHEN json_valid({p}.payload) THEN (SELECT group_concat(coalesce(json_extract(value, '$.driver'), '') || ' ' || "
+                        "coalesce(json_extract(value, '$.notes'), ''), ' ') FROM json_each({p}.payload, '$.relays') WHERE type = 'object') ELSE '' END")
+
+FTS_SOURCES = {
+    # fts: (tabla origen, columnas fts, expresiones sobre {p} = new/old/tabla)
+    "strategy_fts": ("strategy", ["name", "car_name", "car_class", "relays"], ["{p}.name", "{p}.car_name", "{p}.car_class", STRATEGY_RELAYS_TEXT]),
+    "driver_fts": ("driver", ["name", "discord", "iracing_id", "biography"], ["{p}.name", "{p}.discord", "{p}.iracing_id", "{p}.biography"]),
+    "event_fts": ("event", ["name", "track", "car_class"], ["{p}.name", "{p}.track", "{p}.car_class"]),
+}
+
+
+def create_fts(conn, fts, source, columns, exprs):
+    conn.exec_driver_sql(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({', '.join(columns)}, tokenize = 'unicode61 remove_diacritics 2')")
+    values = lambda p: ", ".join(e.format(p=p) for e in exprs)
+    insert = f"INSERT INTO {fts} (rowid, {', '.join(columns)}) VALUES (new.id, {values('new')});"
+    delete = f"DELETE FROM {fts} WHERE rowid = old.id;"
+    conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN {insert} END")
+    conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN {delete} END")
+    conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {source} BEGIN {delete} {insert} END")
+    conn.exec_driver_sql(f"DELETE FROM {fts}")
+    conn.exec_driver_sql(f"INSERT INTO {fts} (rowid, {', '.join(columns)}) SELECT {source}.id, {values(source)} FROM {source}")
+
+
+@migration(9, "búsqueda FTS5 de estrategias, pilotos y eventos")
+def m009_fts(conn, ctx):
+    for fts, (source, columns, exprs) in FTS_SOURCES.items():
+        create_fts(conn, fts, source, columns, exprs)
+
+
+@migration(10, "car.tank_liters para el barrido de combustible")
+def m010_car_tank(conn, ctx):
+    add_column(conn, "car", "tank_liters REAL")
+
+
+@migration(11, "tabla ibt_summary (caché de telemetría .ibt por hash)")
+def m011_ibt_summary(conn, ctx):
+    create_tables(conn, [
+        ("ibt_summary", "sha256 VARCHAR(64) NOT NULL, filename VARCHAR(200), size BIGINT NOT NULL, data TEXT NOT NULL, created_at DATETIME, "
+                        "PRIMARY KEY (sha256)"),
+    ])
+
+
+@migration(12, "subidas direccionadas por contenido (upload_blob)")
+def m012_content_addressed_uploads(conn, ctx):
+    import upload_store
+    create_tables(conn, [
+        ("upload_blob", "name VARCHAR(80) NOT NULL, original_name VARCHAR(200), size INTEGER NOT NULL, created_at DATETIME, touched_at DATETIME, "
+                        "PRIMARY KEY (name)"),
+    ])
+    create_index(conn, "ix_upload_blob_touched_at", "upload_blob", ["touched_at"])
+    folder, now = ctx.upload_folder, datetime.utcnow().isoformat(" ")
+    if not os.path.isdir(folder): return
+    # los duplicados heredados (mismo contenido con distinto timestamp) acaban en un único blob.
+    # Se copian y los originales se borran tras el commit: si el paso falla, las filas siguen
+    # apuntando a archivos que existen y al reintentar se reutilizan los blobs ya copiados.
+    for name in sorted(os.listdir(folder)):
+        if name.startswith(".") or upload_store.is_blob(name) or not os.path.isfile(os.path.join(folder, name)): continue
+        blob, size, _ = upload_store.adopt(folder, name)
+        ctx.after_commit(lambda name=name: upload_store.remove_legacy(folder, name))
+        conn.exec_driver_sql("UPDATE driver SET photo = ? WHERE photo = ?", (blob, name))
+        conn.exec_driver_sql("UPDATE palmares SET image = ? WHERE image = ?", (blob, name))
+        conn.exec_driver_sql("INSERT OR IGNORE INTO upload_blob (name, original_name, size, created_at, touched_at) VALUES (?, ?, ?, ?, ?)", (blob, name, size, now, now))
+
+
+@migration(13, "tabla cache_version (sello del catálogo de coches entre workers)")
+def m013_cache_version(conn, ctx):
+    create_tables(conn, [("cache_version", "name VARCHAR(40) NOT NULL, version INTEGER NOT NULL, PRIMARY KEY (name)")])
+    conn.exec_driver_sql("INSERT OR IGNORE INTO cache_version (name, version) VALUES ('cars', 1)")
+
+
+@migration(14, "índice (is_approved, id DESC) para el panel de admin paginado")
+def m014_user_approved_index(conn, ctx):
+    conn.exec_driver_sql("UPDATE user SET is_approved = 0 WHERE is_approved IS NULL")
+    create_index(conn, "ix_user_approved_id", "user", ["is_approved", "id DESC"])
+
+
+@migration(15, "archivo de carreras (race_session, vueltas, stints, pits) y estadísticas por piloto")
+def m015_race_archive(conn, ctx):
+    create_tables(conn, [
+        ("race_session", "id INTEGER NOT NULL, session_key VARCHAR(100) NOT NULL, event_id INTEGER, event_name VARCHAR(100), track VARCHAR(150), "
+                         "session_type VARCHAR(30), started_at DATETIME, ended_at DATETIME, cars INTEGER, laps INTEGER, PRIMARY KEY (id), "
+                         "UNIQUE (session_key), FOREIGN KEY(event_id) REFERENCES event (id)"),
+        ("driver_race_stats", "driver_id INTEGER NOT NULL, races INTEGER NOT NULL, laps INTEGER NOT NULL, seconds FLOAT NOT NULL, "
+                              "incidents INTEGER NOT NULL, pace_delta_sum FLOAT NOT NULL, pace_delta_n INTEGER NOT NULL, "
+                              "stint_stdev_sum FLOAT NOT NULL, stint_n INTEGER NOT NULL, PRIMARY KEY (driver_id), "
+                              "FOREIGN KEY(driver_id) REFERENCES driver (id)"),
+        ("race_lap", "session_id INTEGER NOT NULL, car_idx INTEGER NOT NULL, lap INTEGER NOT NULL, lap_time FLOAT, position INTEGER, pit BOOLEAN, "
+                     "PRIMARY KEY (session_id, car_idx, lap), FOREIGN KEY(session_id) REFERENCES race_session (id)"),
+        ("race_pit_stop", "session_id INTEGER NOT NULL, car_idx INTEGER NOT NULL, stop INTEGER NOT NULL, lap INTEGER, pit_in_at FLOAT, "
+                          "duration FLOAT, PRIMARY KEY (session_id, car_idx, stop), FOREIGN KEY(session_id) REFERENCES race_session (id)"),
+        ("race_result", "session_id INTEGER NOT NULL, car_idx INTEGER NOT NULL, driver_id INTEGER, iracing_name VARCHAR(100), cust_id INTEGER, "
+                        "car_number VARCHAR(10), position INTEGER, laps INTEGER, best_lap FLOAT, median_lap FLOAT, pace_delta FLOAT, "
+                        "consistency FLOAT, incidents INTEGER, seconds FLOAT, PRIMARY KEY (session_id, car_idx), "
+                        "FOREIGN KEY(session_id) REFERENCES race_session (id), FOREIGN KEY(driver_id) REFERENCES driver (id)"),
+        ("race_stint", "session_id INTEGER NOT NULL, car_idx INTEGER NOT NULL, stint INTEGER NOT NULL, start_lap INTEGER, end_lap INTEGER, "
+                       "laps INTEGER, avg_lap FLOAT, stdev FLOAT, PRIMARY KEY (session_id, car_idx, stint), "
+                       "FOREIGN KEY(session_id) REFERENCES race_session (id)"),
+    ])
+    create_index(conn, "ix_race_session_event_id", "race_session", ["event_id"])
+    create_index(conn, "ix_race_result_driver_id", "race_result", ["driver_id"])
+
+
+@migration(16, "strategy.cache_token: clave de caché/ETag única aunque SQLite reutilice el id")
+def m016_strategy_cache_token(conn, ctx):
+    add_column(conn, "strategy", "cache_token VARCHAR(16) NOT NULL DEFAULT ''")
+    conn.exec_driver_sql("UPDATE strategy SET cache_token = lower(hex(randomblob(8))) WHERE cache_token = ''")
+
+
+@migration(17, "archivo de carreras por piloto: race_driver_result y seat en vueltas y stints")
+def m017_race_driver_result(conn, ctx):
+    create_tables(conn, [
+        ("race_driver_result", "session_id INTEGER NOT NULL, car_idx INTEGER NOT NULL, seat INTEGER NOT NULL, driver_id INTEGER, "
+                               "iracing_name VARCHAR(100), cust_id INTEGER, laps INTEGER, best_lap FLOAT, median_lap FLOAT, pace_delta FLOAT, "
+                               "consistency FLOAT, incidents INTEGER, seconds FLOAT, PRIMARY KEY (session_id, car_idx, seat), "
+                               "FOREIGN KEY(session_id) REFERENCES race_session (id), FOREIGN KEY(driver_id) REFERENCES driver (id)"),
+    ])
+    create_index(conn, "ix_race_driver_result_driver_id", "race_driver_result", ["driver_id"])
+    add_column(conn, "race_lap", "seat INTEGER")
+    add_column(conn, "race_stint", "seat INTEGER")
+    # lo ya archivado era de un piloto por coche: seat 1 con los datos del resultado del coche
+    conn.exec_driver_sql("UPDATE race_lap SET seat = 1 WHERE seat IS NULL")
+    conn.exec_driver_sql("UPDATE race_stint SET seat = 1 WHERE seat IS NULL")
+    conn.exec_driver_sql("INSERT OR IGNORE INTO race_driver_result (session_id, car_idx, seat, driver_id, iracing_name, cust_id, laps, best_lap, "
+                         "median_lap, pace_delta, consistency, incidents, seconds) SELECT session_id, car_idx, 1, driver_id, iracing_name, cust_id, "
+                         "laps, best_lap, median_lap, pace_delta, consistency, incidents, seconds FROM race_result")
@@ -0,0 +1,148 @@
+# ==========================================
+# INSTRUMENTACIÓN DE RENDIMIENTO POR RUTA
+# ==========================================
+# Por cada request: tiempo total, nº y tiempo de SQL (eventos de SQLAlchemy),
+# tiempo de render de plantillas (señales de Flask) y tamaño de respuesta.
+# Se acumulan en histogramas de buckets logarítmicos fijos (registro O(1),
+# memoria constante por endpoint) de los que salen p50/p95/p99.
+# Además se guarda un top de las peores peticiones con su SQL.
+
+import heapq
+import math
+import threading
+import time
+
+from flask import g, has_app_context, request, template_rendered, before_render_template
+from sqlalchemy import event as sa_event
+from sqlalchemy.engine import Engine
+
+SLOW_REQUEST_MS = 500.0      # umbral para el log de peticiones lentas
+SLOW_LOG_SIZE = 20           # peores peticiones que se conservan
+MAX_SQL_PER_REQUEST = 50     # sentencias guardadas por request (para el slow log)
+SQL_TEXT_LIMIT = 400
+
+
+class Histogram:
+    """Histograma de buckets geométricos (factor 1.2) desde `lo`. Percentiles = límite superior del bucket."""
+
+    FACTOR = 1.2
+
+    def __init__(self, lo=0.01, n_buckets=90):
+        self.lo = lo
+        self.counts = [0] * (n_buckets + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._log_f = math.log(self.FACTOR)
+
+    def add(self, v):
+        i = 0 if v <= self.lo else min(int(math.log(v / self.lo) / self._log_f) + 1, len(self.counts) - 1)
+        self.counts[i] += 1
+        self.n += 1
+        self.total += v
+        if v > self.max: self.max = v
+
+    def percentile(self, p):
+        if not self.n: return 0.0
+        rank = math.ceil(self.n * p / 100.0)
+        acc = 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank: return min(self.lo * self.FACTOR ** i, self.max)
+        return self.max
+
+    def summary(self):
+        return {"count": self.n, "avg": round(self.total / self.n, 3) if self.n else 0.0, "p50": round(self.percentile(50), 3),
+                "p95": round(self.percentile(95), 3), "p99": round(self.percentile(99), 3), "max": round(self.max, 3)}
+
+
+class EndpointStats:
+    __slots__ = ("wall_ms", "sql_count", "sql_ms", "template_ms", "bytes", "errors")
+
+    def __init__(self):
+        self.wall_ms = Histogram()
+        self.sql_count = Histogram(lo=1)
+        self.sql_ms = Histogram()
+        self.template_ms = Histogram()
+        self.bytes = Histogram(lo=64)
+        self.errors = 0
+
+
+class PerfMonitor:
+    """Extensión Flask: perf = PerfMonitor(); perf.init_app(app)."""
+
+    def __init__(self, app=None):
+        self.stats = {}
+        self.slow = []            # heap (wall_ms, seq, entry) con las peores peticiones
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.enabled = False
+        if app is not None: self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.setdefault("PERF_MONITOR", True)
+        if not self.enabled: return
+        app.before_request(self._before)
+        app.after_request(self._after)
+        template_rendered.connect(self._template_end, app)
+        before_render_template.connect(self._template_start, app)
+        sa_event.listen(Engine, "before_cursor_execute", self._sql_start)
+        sa_event.listen(Engine, "after_cursor_execute", self._sql_end)
+
+    # --- hooks (lo mínimo posible en el camino caliente) ---
+    def _before(self):
+        g._perf = {"t0": time.perf_counter(), "sql_n": 0, "sql_ms": 0.0, "tpl_ms": 0.0, "sql": []}
+
+    def _sql_start(self, conn, cursor, statement, parameters, context, executemany):
+        if has_app_context() and "_perf" in g: conn.info["_perf_t0"] = time.perf_counter()
+
+    def _sql_end(self, conn, cursor, statement, parameters, context, executemany):
+        t0 = conn.info.pop("_perf_t0", None)
+        if t0 is None or not has_app_context() or "_perf" not in g: return
+        ms = (time.perf_counter() - t0) * 1000.0
+        p = g._perf
+        p["sql_n"] += 1; p["sql_ms"] += ms
+        if len(p["sql"]) < MAX_SQL_PER_REQUEST: p["sql"].append((round(ms, 3), statement[:SQL_TEXT_LIMIT]))
+
+    def _template_start(self, sender, template, context, **extra):
+        if "_perf" in g: g._perf["tpl_t0"] = time.perf_counter()
+
+    def _template_end(self, sender, template, context, **extra):
+        p = g.get("_perf")
+        if p and "tpl_t0" in p: p["tpl_ms"] += (time.perf_counter() - p.pop("tpl_t0")) * 1000.0
+
+    def _after(self, response):
+        p = g.pop("_perf", None)
+        if p is None: return response
+        wall = (time.perf_counter() - p["t0"]) * 1000.0
+        size = response.calculate_content_length() or 0
+        key = request.endpoint or "<404>"
+        with self._lock:
+            st = self.stats.get(key)
+            if st is None: st = self.stats[key] = EndpointStats()
+            st.wall_ms.add(wall); st.sql_count.add(p["sql_n"]); st.sql_ms.add(p["sql_ms"])
+            st.template_ms.add(p["tpl_ms"]); st.bytes.add(size)
+            if response.status_code >= 500: st.errors += 1
+            if len(self.slow) < SLOW_LOG_SIZE or wall > self.slow[0][0]:
+                self._seq += 1
+                entry = {"endpoint": key, "path": request.path, "method": request.method, "status": response.status_code, "wall_ms": round(wall, 2),
+                         "sql_count": p["sql_n"], "sql_ms": round(p["sql_ms"], 2), "template_ms": round(p["tpl_ms"], 2), "bytes": size,
+                         "at": time.time(), "sql": p["sql"]}
+                (heapq.heappush if len(self.slow) < SLOW_LOG_SIZE else heapq.heapreplace)(self.slow, (wall, self._seq, entry))
+        if wall >= SLOW_REQUEST_MS:
+            print(f"🐢 [Perf] {request.method} {request.path} {wall:.0f} ms · {p['sql_n']} SQL ({p['sql_ms']:.0f} ms) · tpl {p['tpl_ms']:.0f} ms")
+        return response
+
+    # --- lectura ---
+    def snapshot(self):
+        with self._lock:
+            endpoints = {k: {"wall_ms": s.wall_ms.summary(), "sql_count": s.sql_count.summary(), "sql_ms": s.sql_ms.summary(),
+                             "template_ms": s.template_ms.summary(), "bytes": s.bytes.summary(), "errors": s.errors}
+                         for k, s in self.stats.items()}
+            slow = [e for _, _, e in sorted(self.slow, key=lambda x: -x[0])]
+        return {"since": self.started_at, "endpoints": endpoints, "slow": slow}
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear(); self.slow = []; self.started_at = time.time()
@@ -0,0 +1,187 @@
+# ==========================================
+# PLAN VS REALIDAD (reconciliación en vivo)
+# ==========================================
+# Guarda la estrategia activa de cada sesión (una por equipo/bridge) y, en cada
+# cruce de meta que llega por /api/telemetry/ingest, recalcula solo los stints
+# pendientes (del actual en adelante):
+#   - combustible proyectado en cada parada planificada (con el consumo real)
+#   - deriva de la hora de fin de cada stint (con el ritmo real)
+# Entre cruces de meta un frame cuesta una comparación; la proyección queda
+# cacheada y /api/telemetry/live la sirve a los viewers en su polling.
+#
+# Los planes viven en el frame compartido (telemetry_store, clave "plans"), no en
+# el proceso: con gunicorn -w N el POST que activa el plan, el ingest que lo
+# recalcula y el viewer que lo lee pueden caer en workers distintos. Todas las
+# funciones reciben ese dict de estado (dentro de TelemetryStore.update() si lo
+# modifican) y lo tratan como inmutable: sustituyen state["plans"] por una copia.
+#
+# Las horas del plan (start/end de cada relevo) salen de raceStartLocal, es
+# decir, del reloj del navegador del equipo, así que "ahora" se pasa a esa zona
+# con el tz_offset que manda el navegador al activar (minutos, como
+# Date.getTimezoneOffset()); sin él se usa la zona del servidor.
+
+import time
+
+import numpy as np
+
+from stint_planner import parse_seconds, clock_seconds, hhmm
+
+DEFAULT_SESSION = "default"
+PLANS_KEY = "plans"
+EMA_ALPHA = 0.3
+PACE_WINDOW = (0.5, 1.6)     # vueltas fuera de este rango respecto al plan no cuentan (pit, SC, reset)
+
+
+def session_key(data):
+    return str((data or {}).get("team_id") or DEFAULT_SESSION)
+
+
+def wrap_day(sec):
+    """Diferencia horaria en [-12h, 12h) para comparar horas de reloj que cruzan medianoche."""
+    return (sec + 43200) % 86400 - 43200
+
+
+def server_tz_offset(now=None):
+    """Minutos UTC - local del servidor (mismo signo que Date.getTimezoneOffset())."""
+    return -time.localtime(now).tm_gmtoff // 60
+
+
+class ActivePlan:
+    # estado que se guarda en el frame compartido (arrays como listas)
+    ARRAYS = ("laps", "fuel", "end", "pace", "stop", "cum_end")
+    FIELDS = ("strategy_id", "name", "drivers", "cons_plan", "tz_offset", "cur", "last_laps", "last_fuel", "last_cross", "pace_obs", "cons_obs", "projection")
+
+    def __init__(self, strategy_id, name, payload, tz_offset=None):
+        relays = [r for r in (payload or {}).get("relays") or [] if isinstance(r, dict)]
+        params = (payload or {}).get("params") or {}
+        if not relays: raise ValueError("la estrategia no tiene relevos")
+        self.strategy_id, self.name = strategy_id, name
+        self.drivers = [r.get("driver") or "" for r in relays]
+        self.laps = np.array([float(r.get("laps") or 0) for r in relays])
+        tank = float(params.get("tankSize") or 0)
+        self.fuel = np.array([float(r.get("fuel") or tank or 0) for r in relays])
+        start = np.array([clock_seconds(r.get("start")) for r in relays], dtype=float)
+        self.end = np.array([clock_seconds(r.get("end")) for r in relays], dtype=float)
+        span = (self.end - start) % 86400
+        default_pace = parse_seconds(params.get("lapTimeGlobal"))
+        self.pace = np.where(self.laps > 0, span / np.maximum(self.laps, 1), default_pace)
+        self.pace = np.where(self.pace > 0, self.pace, default_pace or 1.0)
+        # parada tras cada stint: campo pit (HH:MM:SS) o el hueco entre fin y siguiente inicio
+        gap = np.append((start[1:] - self.end[:-1]) % 86400, 0.0)
+        pit = [parse_seconds(r.get("pit")) if isinstance(r.get("pit"), str) else 0.0 for r in relays]
+        self.stop = np.where(np.array(pit) > 0, pit, gap)
+        self.stop[-1] = 0.0
+        self.cum_end = np.cumsum(self.laps)
+        cons = float(params.get("consLap") or 0)
+        self.cons_plan = cons if cons > 0 else float(self.fuel[0] / max(self.laps[0], 1))
+        self.tz_offset = server_tz_offset() if tz_offset is None else int(tz_offset)
+
+        self.cur = 0
+        self.last_laps = None
+        self.last_fuel = None
+        self.last_cross = None
+        self.pace_obs = None
+        self.cons_obs = None
+        self.projection = self.snapshot(None, None, None, time.time())
+
+    def to_state(self):
+        return {**{k: getattr(self, k) for k in self.FIELDS}, **{k: getattr(self, k).tolist() for k in self.ARRAYS}}
+
+    @classmethod
+    def from_state(cls, data):
+        plan = cls.__new__(cls)
+        for k in cls.FIELDS: setattr(plan, k, data[k])
+        for k in cls.ARRAYS: setattr(plan, k, np.array(data[k], dtype=float))
+        return plan
+
+    def on_lap(self, laps, fuel, fuel_needed, on_pit, now):
+        """Cruce de meta: actualiza ritmo/consumo observados y recalcula desde el stint actual."""
+        dlaps = laps - self.last_laps if self.last_laps is not None else 0
+        while self.cur < len(self.laps) - 1 and self.cum_end[self.cur] <= laps: self.cur += 1
+        if dlaps > 0 and self.last_cross is not None:
+            lap_t = (now - self.last_cross) / dlaps
+            plan = self.pace[self.cur]
+            if not on_pit and PACE_WINDOW[0] * plan <= lap_t <= PACE_WINDOW[1] * plan:
+                self.pace_obs = lap_t if self.pace_obs is None else self.pace_obs + EMA_ALPHA * (lap_t - self.pace_obs)
+            if fuel is not None and self.last_fuel is not None and fuel < self.last_fuel:
+                used = (self.last_fuel - fuel) / dlaps
+                if used < 3 * self.cons_plan:
+                    self.cons_obs = used if self.cons_obs is None else self.cons_obs + EMA_ALPHA * (used - self.cons_obs)
+        self.last_laps, self.last_fuel, self.last_cross = laps, fuel, now
+        self.projection = self.snapshot(laps, fuel, fuel_needed, now)
+        return self.projection
+
+    def snapshot(self, laps, fuel, fuel_needed, now):
+        c = self.cur
+        cons = self.cons_obs or self.cons_plan
+        factor = (self.pace_obs / self.pace[c]) if self.pace_obs else 1.0
+        pace = self.pace[c:] * factor
+        laps_left = self.laps[c:].copy()
+        if laps is not None: laps_left[0] = max(0.0, self.cum_end[c] - laps)
+        # combustible al llegar a cada parada: el actual para este stint, lo cargado para los siguientes
+        fuel_start = self.fuel[c:].copy()
+        if fuel is not None: fuel_start[0] = fuel
+        at_stop = fuel_start - laps_left * cons
+        # fin proyectado de cada stint en hora de reloj del equipo (ahora + vueltas + paradas intermedias)
+        now_sod = (now - self.tz_offset * 60) % 86400
+        stint_time = laps_left * pace
+        end = now_sod + np.cumsum(stint_time + np.append(0.0, self.stop[c:-1]))
+        drift = wrap_day(end - self.end[c:])
+        future_loads = float(self.fuel[c + 1:].sum())
+        return {
+            "strategy_id": self.strategy_id, "name": self.name, "stint": c, "laps": laps,
+            "pace": round(float(self.pace_obs), 3) if self.pace_obs else None,
+            "cons": round(float(cons), 3), "fuel": fuel, "fuel_needed": fuel_needed,
+            # lo que el plan aún va a cargar frente a lo que el bridge dice que falta para meta
+            "fuel_plan_remaining": round(future_loads, 1),
+            "fuel_plan_margin": round(future_loads - float(fuel_needed), 1) if fuel_needed is not None else None,
+            "stints": [{"index": c + i, "driver": self.drivers[c + i], "laps_left": int(laps_left[i]),
+                        "fuel_at_stop": round(float(at_stop[i]), 1), "short_laps": round(float(max(0.0, -at_stop[i]) / cons), 1),
+                        "end_projected": hhmm(end[i]), "drift_s": int(round(drift[i]))} for i in range(len(laps_left))],
+            "updated_at": now,
+        }
+
+
+def _with_plans(state, plans):
+    state[PLANS_KEY] = plans
+    return state
+
+
+def activate(state, key, strategy_id, name, payload, tz_offset=None):
+    """Activa (o sustituye) el plan de la sesión key. Devuelve su proyección inicial."""
+    plan = ActivePlan(strategy_id, name, payload, tz_offset)
+    _with_plans(state, {**(state.get(PLANS_KEY) or {}), key: plan.to_state()})
+    return plan.projection
+
+
+def deactivate(state, key):
+    plans = dict(state.get(PLANS_KEY) or {})
+    found = plans.pop(key, None) is not None
+    _with_plans(state, plans)
+    return found
+
+
+def projection(state, key):
+    plan = (state.get(PLANS_KEY) or {}).get(key)
+    return plan["projection"] if plan else None
+
+
+def on_frame(state, data, now=None):
+    """Frame de ingest (state ya fusionado): solo recalcula si ha cambiado el número de vueltas."""
+    key = session_key(data)
+    stored = (state.get(PLANS_KEY) or {}).get(key)
+    if stored is None: return None
+    car = data.get("my_car") or {}
+    laps = data.get("laps", car.get("laps"))
+    if laps is None: return None
+    laps = int(laps)
+    last = stored["last_laps"]
+    if last is not None and laps <= last:
+        if laps < last: _with_plans(state, {**state[PLANS_KEY], key: {**stored, "last_laps": laps}})   # reset de sesión
+        return None
+    plan = ActivePlan.from_state(stored)
+    fuel = data.get("fuel", car.get("fuel"))
+    fuel_needed = data.get("fuel_needed", car.get("fuel_needed"))
+    result = plan.on_lap(laps, float(fuel) if fuel is not None else None, fuel_needed, bool(data.get("on_pit_road")), now or time.time())
+    _with_plans(state, {**state[PLANS_KEY], key: plan.to_state()})
+    return result
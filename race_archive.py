@@ -0,0 +1,216 @@
+# ==========================================
+# ARCHIVO DE CARRERAS (vueltas, stints, pits y resultado final)
+# ==========================================
+# ingest_telemetry() solo conserva el último frame. SessionRecorder compara
+# cada frame con el anterior dentro del read-modify-write de telemetry_store
+# (bajo su flock: con N workers cada frame se procesa una sola vez y en orden)
+# y apunta lo que cambia en un diario por sesión, instance/race_journal/<sesión>.jsonl:
+#   {"e": "meta", ...}                              al empezar la sesión
+#   {"e": "lap", "car", "lap", "pos", "ts"}         vuelta completada
+#   {"e": "time", "car", "lap", "time"}             iRacing publica el tiempo un par de ticks después
+#   {"e": "pit_in" | "pit_out", "car", "lap", "ts"}
+#   {"e": "driver", "car", "lap", "name", "cust_id", "inc_out", "ts"}
+#                                                   piloto al volante: al empezar y en cada relevo
+#                                                   (inc_out = incidentes del que se baja)
+#   {"e": "final", "ts", "grid": [...]}             clasificación al cerrar
+# La sesión se cierra con SessionState = cool down (todos han cruzado la meta;
+# ese frame se compara antes de cerrar) o cuando llega otro session_id. El diario pasa a <sesión>.ended.jsonl y
+# build_archive() lo convierte en filas normalizadas que app.py inserta con
+# executemany en una transacción (ver archive_race()); si eso falla, el diario
+# sigue ahí para `flask archive-races`.
+# En resistencia un coche tiene varios pilotos: cada uno es un "seat" del coche
+# (1, 2... por orden de aparición) y vueltas, stints, incidentes y agregados se
+# atribuyen al seat que conducía; race_result queda como resultado del coche.
+# Necesita bridge_pro con session_id/session_state y car_idx/lap/on_pit en grid.
+
+import json
+import os
+import re
+import statistics
+from collections import namedtuple
+
+SESSION_COOLDOWN = 6        # irsdk SessionState: 4 racing, 5 checkered, 6 cool down
+ENDED_SUFFIX = ".ended.jsonl"
+MIN_STINT_LAPS = 3          # laps limpias para calcular la dispersión de un stint
+
+Archive = namedtuple("Archive", "meta results drivers laps stints pits")
+
+
+def _safe(session_id):
+    return re.sub(r"[^0-9A-Za-z_.-]", "_", str(session_id))[:100]
+
+
+def _by_car(grid):
+    return {c["car_idx"]: c for c in grid or () if isinstance(c, dict) and isinstance(c.get("car_idx"), int)}
+
+
+def _who(car):
+    return str(car.get("name") or ""), car.get("cust_id") or None
+
+
+def _driver(idx, car, now, inc_out=None):
+    name, cust_id = _who(car)
+    return {"e": "driver", "car": idx, "lap": int(car.get("lap") or 0), "name": name, "cust_id": cust_id, "inc_out": inc_out, "ts": now}
+
+
+class SessionRecorder:
+    def __init__(self, journal_dir):
+        self.dir = journal_dir
+
+    def path(self, session_id, ended=False):
+        return os.path.join(self.dir, _safe(session_id) + (ENDED_SUFFIX if ended else ".jsonl"))
+
+    def on_frame(self, prev, data, now):
+        """
+        prev: estado fusionado hasta el frame anterior; data: payload nuevo.
+        Devuelve las rutas de diarios que se acaban de cerrar (para archivar fuera del lock).
+        """
+        sid, prev_sid = data.get("session_id"), prev.get("session_id")
+        closed = []
+        if prev_sid and prev_sid != sid: closed += self._close(prev_sid, prev.get("grid"), now)
+        if not sid or not isinstance(data.get("grid"), list): return closed
+        path, cooldown = self.path(sid), int(data.get("session_state") or 0) >= SESSION_COOLDOWN
+        if not os.path.exists(path):
+            # ya cerrada (cool down tardío) o vista por primera vez ya en cool down: nada que archivar
+            if cooldown or os.path.exists(self.path(sid, ended=True)): return closed
+            meta = {"e": "meta", "session_id": sid, "track": data.get("track_name") or "", "session_type": data.get("session_type") or "", "started_at": now}
+            self._append(path, [meta] + [_driver(idx, car, now) for idx, car in _by_car(data["grid"]).items()])     # primer frame: solo referencia
+        elif prev_sid == sid:
+            if events := self._diff(_by_car(prev.get("grid")), _by_car(data["grid"]), now): self._append(path, events)
+        # el frame de cool down se compara antes de cerrar: la vuelta que termina en él también cuenta
+        if cooldown: closed += self._close(sid, data["grid"], now)
+        return closed
+
+    def _diff(self, before, after, now):
+        events = []
+        for idx, car in after.items():
+            old = before.get(idx)
+            if old is None:
+                events.append(_driver(idx, car, now)); continue
+            if _who(car) != _who(old): events.append(_driver(idx, car, now, inc_out=int(old.get("incidents") or 0)))   # relevo
+            lap, old_lap = int(car.get("lap") or 0), int(old.get("lap") or 0)
+            if lap > old_lap: events.append({"e": "lap", "car": idx, "lap": lap, "pos": car.get("pos"), "ts": now})
+            t = float(car.get("last_lap_s") or 0)
+            if t > 0 and t != float(old.get("last_lap_s") or 0): events.append({"e": "time", "car": idx, "lap": lap, "time": t})
+            if bool(car.get("on_pit")) != bool(old.get("on_pit")):
+                events.append({"e": "pit_in" if car.get("on_pit") else "pit_out", "car": idx, "lap": lap, "ts": now})
+        return events
+
+    def _close(self, sid, grid, now):
+        path = self.path(sid)
+        if not os.path.exists(path): return []
+        self._append(path, [{"e": "final", "ts": now, "grid": list(_by_car(grid).values())}])
+        ended = self.path(sid, ended=True)
+        os.replace(path, ended)
+        return [ended]
+
+    def _append(self, path, events):
+        os.makedirs(self.dir, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(e, separators=(",", ":")) + "\n" for e in events))
+
+    def pending(self):
+        """Diarios cerrados que aún no se han archivado."""
+        if not os.path.isdir(self.dir): return []
+        return sorted(os.path.join(self.dir, n) for n in os.listdir(self.dir) if n.endswith(ENDED_SUFFIX))
+
+
+def read_journal(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _seat(seats, car, name, cust_id):
+    """Nº de seat (1, 2...) del piloto en el coche; el que vuelve a subirse conserva el suyo."""
+    car_seats = seats.setdefault(car, [])
+    for n, (seat_name, seat_id) in enumerate(car_seats, 1):
+        if (cust_id and seat_id == cust_id) or (not cust_id and not seat_id and seat_name == name): return n
+    car_seats.append((name, cust_id))
+    return len(car_seats)
+
+
+def build_archive(events):
+    """Eventos del diario -> Archive con filas (dicts) listas para executemany, sin session_id."""
+    meta = next((e for e in events if e["e"] == "meta"), {})
+    final = next((e for e in reversed(events) if e["e"] == "final"), {"ts": None, "grid": []})
+    laps, pit_in = {}, {}                  # (car, lap) -> fila;  car -> (lap, ts) de la entrada abierta
+    pits, pit_laps = [], set()
+    seats, seat_of, incidents = {}, {}, {}     # car -> [(nombre, cust_id)];  car -> seat al volante;  (car, seat) -> incidentes
+    for e in events:
+        kind, car = e["e"], e.get("car")
+        if kind == "driver":
+            if e.get("inc_out") is not None and car in seat_of:
+                key = (car, seat_of[car]); incidents[key] = max(incidents.get(key, 0), e["inc_out"])
+            seat_of[car] = _seat(seats, car, e.get("name") or "", e.get("cust_id"))
+        elif kind == "lap":
+            laps[(car, e["lap"])] = {"car_idx": car, "lap": e["lap"], "lap_time": None, "position": e.get("pos"), "pit": False, "seat": seat_of.get(car)}
+        elif kind == "time" and (car, e["lap"]) in laps and laps[(car, e["lap"])]["lap_time"] is None:
+            laps[(car, e["lap"])]["lap_time"] = e["time"]
+        elif kind == "pit_in":
+            pit_in[car] = (e["lap"], e["ts"]); pit_laps.add((car, e["lap"] + 1))        # vuelta de entrada
+        elif kind == "pit_out" and car in pit_in:
+            lap, ts = pit_in.pop(car)
+            pits.append({"car_idx": car, "stop": sum(p["car_idx"] == car for p in pits) + 1, "lap": lap + 1, "pit_in_at": ts, "duration": round(e["ts"] - ts, 3)})
+            pit_laps.add((car, e["lap"] + 1))                                           # vuelta de salida
+    for key in pit_laps & laps.keys(): laps[key]["pit"] = True
+
+    grid = {c["car_idx"]: c for c in final["grid"]}
+    for car, c in grid.items():
+        # el que está al volante al final (o el único, en diarios sin eventos de piloto)
+        n = seat_of[car] = seat_of.get(car) or _seat(seats, car, *_who(c))
+        incidents[(car, n)] = max(incidents.get((car, n), 0), int(c.get("incidents") or 0))
+    for row in laps.values():
+        if row["seat"] is None: row["seat"] = seat_of.get(row["car_idx"]) or _seat(seats, row["car_idx"], "", None)
+
+    per_car = {}
+    for row in sorted(laps.values(), key=lambda r: (r["car_idx"], r["lap"])): per_car.setdefault(row["car_idx"], []).append(row)
+    stints, clean, in_laps = [], {}, {(p["car_idx"], p["lap"]) for p in pits}
+    for car, rows in per_car.items():
+        clean[car] = _clean(rows)
+        stint, current = 1, []
+        for r in rows:
+            swap = bool(current) and r["seat"] != current[-1]["seat"]
+            if swap:                                                    # cambio de piloto: el stint nuevo es suyo
+                stints.append(_stint(car, stint, current)); stint, current = stint + 1, []
+            current.append(r)
+            if (car, r["lap"]) in in_laps and r is not rows[-1] and not swap:     # el stint acaba con la vuelta de entrada
+                stints.append(_stint(car, stint, current)); stint, current = stint + 1, []
+        if current: stints.append(_stint(car, stint, current))
+
+    leader = next((c["car_idx"] for c in grid.values() if c.get("pos") == 1), None)
+    leader_pace = statistics.median(clean[leader]) if clean.get(leader) else None
+    delta = lambda pace: round(pace - leader_pace, 3) if pace is not None and leader_pace is not None else None
+    results = []
+    for car in sorted(set(grid) | set(per_car)):
+        c, times = grid.get(car, {}), clean.get(car) or []
+        pace = statistics.median(times) if times else None
+        devs = [s["stdev"] for s in stints if s["car_idx"] == car and s["stdev"] is not None]
+        results.append({"car_idx": car, "iracing_name": str(c.get("name") or ""), "cust_id": c.get("cust_id"), "car_number": str(c.get("num") or ""),
+                        "position": c.get("pos"), "laps": int(c.get("lap") or len(per_car.get(car, ()))), "best_lap": c.get("best_lap_s") or (min(times) if times else None),
+                        "median_lap": pace, "pace_delta": delta(pace),
+                        "consistency": round(statistics.mean(devs), 3) if devs else None, "stints_measured": len(devs),
+                        "incidents": sum(v for (i, _), v in incidents.items() if i == car), "seconds": round(sum(r["lap_time"] or 0 for r in per_car.get(car, ())), 3)})
+    drivers = []
+    for car, car_seats in sorted(seats.items()):
+        for n, (name, cust_id) in enumerate(car_seats, 1):
+            rows = [r for r in per_car.get(car, ()) if r["seat"] == n]
+            if not rows and n > 1: continue                              # apareció en el coche pero no llegó a cerrar una vuelta
+            times = _clean(rows)
+            pace = statistics.median(times) if times else None
+            devs = [s["stdev"] for s in stints if s["car_idx"] == car and s["seat"] == n and s["stdev"] is not None]
+            drivers.append({"car_idx": car, "seat": n, "iracing_name": name, "cust_id": cust_id, "laps": len(rows), "best_lap": min(times) if times else None,
+                            "median_lap": pace, "pace_delta": delta(pace), "consistency": round(statistics.mean(devs), 3) if devs else None,
+                            "stints_measured": len(devs), "incidents": incidents.get((car, n), 0), "seconds": round(sum(r["lap_time"] or 0 for r in rows), 3)})
+    meta = {**meta, "ended_at": final["ts"], "cars": len(results), "laps": max((r["laps"] for r in results), default=0)}
+    return Archive(meta, results, drivers, sorted(laps.values(), key=lambda r: (r["car_idx"], r["lap"])), stints, pits)
+
+
+def _clean(rows):
+    return [r["lap_time"] for r in rows if r["lap_time"] and not r["pit"] and r["lap"] > 1]
+
+
+def _stint(car, n, rows):
+    times = _clean(rows)
+    return {"car_idx": car, "stint": n, "seat": rows[0]["seat"], "start_lap": rows[0]["lap"], "end_lap": rows[-1]["lap"], "laps": len(rows),
+            "avg_lap": round(statistics.mean(times), 3) if times else None,
+            "stdev": round(statistics.stdev(times), 3) if len(times) >= MIN_STINT_LAPS else None}
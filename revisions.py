@@ -0,0 +1,81 @@
+# ==========================================
+# HISTORIAL DE REVISIONES (JSON PATCH)
+# ==========================================
+# Diff/patch mínimos con el formato de JSON Patch (RFC 6902: add/remove/replace
+# sobre rutas JSON Pointer). Las revisiones guardan un snapshot completo cada
+# SNAPSHOT_EVERY versiones (o cuando los parches acumulados pesan más que el
+# propio plan) y entre medias solo el parche contra la revisión anterior.
+# Reconstruir cualquier revisión = snapshot más cercano + como mucho K-1 parches.
+
+import copy
+import json
+
+SNAPSHOT_EVERY = 10
+
+
+def _escape(key):
+    return str(key).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token):
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def json_diff(a, b, path=""):
+    """Lista de operaciones que transforman a en b."""
+    if type(a) is not type(b):
+        return [{"op": "replace", "path": path, "value": b}]
+    if isinstance(a, dict):
+        ops = []
+        for k in a:
+            if k not in b: ops.append({"op": "remove", "path": f"{path}/{_escape(k)}"})
+        for k, v in b.items():
+            if k not in a: ops.append({"op": "add", "path": f"{path}/{_escape(k)}", "value": v})
+            else: ops.extend(json_diff(a[k], v, f"{path}/{_escape(k)}"))
+        return ops
+    if isinstance(a, list):
+        ops = []
+        common = min(len(a), len(b))
+        for i in range(common): ops.extend(json_diff(a[i], b[i], f"{path}/{i}"))
+        for i in range(common, len(b)): ops.append({"op": "add", "path": f"{path}/{i}", "value": b[i]})
+        for i in range(len(a) - 1, common - 1, -1): ops.append({"op": "remove", "path": f"{path}/{i}"})
+        return ops
+    return [] if a == b else [{"op": "replace", "path": path, "value": b}]
+
+
+def json_patch(doc, ops, in_place=False):
+    """Aplica ops (salida de json_diff) sobre una copia de doc (o sobre doc si in_place)."""
+    cp = (lambda v: v) if in_place else copy.deepcopy
+    doc = cp(doc)
+    for op in ops:
+        if op["path"] == "":
+            doc = cp(op["value"]); continue
+        *parents, last = [_unescape(t) for t in op["path"].split("/")[1:]]
+        target = doc
+        for t in parents: target = target[int(t)] if isinstance(target, list) else target[t]
+        if isinstance(target, list):
+            i = int(last)
+            if op["op"] == "add": target.insert(i, cp(op["value"]))
+            elif op["op"] == "remove": del target[i]
+            else: target[i] = cp(op["value"])
+        else:
+            if op["op"] == "remove": del target[last]
+            else: target[last] = cp(op["value"])
+    return doc
+
+
+def encode(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def needs_snapshot(rev, last_snapshot_rev, patch_bytes_since_snapshot, plan_bytes):
+    """Snapshot si se alcanza K parches o si los parches acumulados ya pesan más que un plan completo."""
+    return last_snapshot_rev is None or rev - last_snapshot_rev >= SNAPSHOT_EVERY or patch_bytes_since_snapshot > plan_bytes
+
+
+def rebuild(rows):
+    """rows: revisiones ordenadas por rev empezando en un snapshot -> payload de la última."""
+    doc = None
+    for kind, data in rows:
+        doc = json.loads(data) if kind == "snapshot" else json_patch(doc, json.loads(data), in_place=True)
+    return doc
@@ -0,0 +1,41 @@
+# ==========================================
+# COOKIE DE SESIÓN DE FLASK FUERA DE FLASK
+# ==========================================
+# app.py firma la sesión con esta clave; telemetry_service.py (asyncio, sin
+# Flask) la valida con la misma configuración que
+# flask.sessions.SecureCookieSessionInterface para saber si el viewer ha
+# iniciado sesión en la web (Flask-Login guarda el id en "_user_id").
+
+import hashlib
+import os
+from http.cookies import CookieError, SimpleCookie
+
+from flask.json.tag import TaggedJSONSerializer
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+SECRET_KEY = os.environ.get("LEGACY_SECRET_KEY", "LEGACY_2026_KEY")
+COOKIE_NAME = "session"
+MAX_AGE = 31 * 86400          # PERMANENT_SESSION_LIFETIME por defecto de Flask
+
+_serializers = {}
+
+
+def serializer(secret_key=SECRET_KEY):
+    if secret_key not in _serializers:
+        _serializers[secret_key] = URLSafeTimedSerializer(secret_key, salt="cookie-session", serializer=TaggedJSONSerializer(),
+                                                          signer_kwargs={"key_derivation": "hmac", "digest_method": hashlib.sha1})
+    return _serializers[secret_key]
+
+
+def load(cookie_header, secret_key=SECRET_KEY, max_age=MAX_AGE):
+    """Contenido de la sesión a partir de la cabecera Cookie, o None si falta o la firma no vale."""
+    try: morsel = SimpleCookie(cookie_header or "").get(COOKIE_NAME)
+    except CookieError: return None
+    if morsel is None: return None
+    try: return serializer(secret_key).loads(morsel.value, max_age=max_age)
+    except BadSignature: return None
+
+
+def user_id(cookie_header, secret_key=SECRET_KEY):
+    session = load(cookie_header, secret_key)
+    return session.get("_user_id") if session else None
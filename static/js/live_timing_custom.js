@@ -38,6 +38,9 @@
   } catch(e){ console.error('Install fetch blocker failed', e); }
 
   // Config / small app state
+  // Base de la API de telemetría (meta telemetry-url): vacía = Flask; si no, telemetry_service.py (otro origen, con cookie)
+  const TELEMETRY_BASE = ((document.querySelector('meta[name="telemetry-url"]') || {}).content || '').replace(/\/$/, '');
+  const TELEMETRY_CREDENTIALS = TELEMETRY_BASE ? 'include' : 'same-origin';
   const SIM_DRIVER_ID = 668063;
   let connectedPilots = ["Manolo Segovia", "Pepe Lopez"];
   let lastUserScroll = 0;
@@ -336,6 +339,22 @@ function renderStrategyTable() {
     }
   }
 
+  // Anota cada fila pendiente del plan con la deriva de hora de fin y el fuel proyectado en la parada
+  function renderPlanProjection(plan) {
+    const rows = document.querySelectorAll('#strategyBody tr');
+    if (!plan || !Array.isArray(plan.stints) || !rows.length) return;
+    rows.forEach(function(tr, i){ tr.style.opacity = (i < plan.stint) ? '0.45' : ''; });
+    plan.stints.forEach(function(st){
+      const tr = rows[st.index]; if (!tr) return;
+      const tds = tr.querySelectorAll('td');
+      const drift = st.drift_s || 0;
+      const sign = drift >= 0 ? '+' : '-';
+      const abs = Math.abs(drift);
+      if (tds[3]) { tds[3].title = 'Proyectado ' + st.end_projected + ' (' + sign + Math.floor(abs / 60) + 'm' + String(abs % 60).padStart(2, '0') + 's)'; tds[3].style.color = abs >= 60 ? (drift > 0 ? '#ff4444' : 'var(--neon-green)') : ''; }
+      if (tds[5]) { tds[5].title = 'Fuel en la parada: ' + st.fuel_at_stop + ' L' + (st.short_laps > 0 ? ' (faltan ' + st.short_laps + ' vueltas)' : ''); tds[5].style.color = st.fuel_at_stop < 0 ? '#ff4444' : ''; }
+    });
+  }
+
   // Expose renderers globally
   window.renderGrid = renderGrid;
   window.renderMap = renderMap;
@@ -344,7 +363,7 @@ function renderStrategyTable() {
   // --- Robust updater/poller (uses payload = data.last_payload || data) ---
   async function update() {
     try {
-      const res = await fetch('/api/telemetry/live', { cache: 'no-store', credentials: 'same-origin' });
+      const res = await fetch(TELEMETRY_BASE + '/api/telemetry/live', { cache: 'no-store', credentials: TELEMETRY_CREDENTIALS });
       if (!res.ok) {
         console.error('Live endpoint error', res.status, res.statusText);
         // Update status immediately as "no data" source seen by this request:
@@ -413,6 +432,9 @@ function renderStrategyTable() {
         hudInc.innerText = incVal;
       }
 
+      // Plan vs realidad (proyección calculada en el servidor en cada cruce de meta)
+      try { renderPlanProjection(data.plan); } catch(e) { console.error('renderPlanProjection error', e); }
+
       // Track / session badges and weather
       const trackBadge = document.getElementById('trackNameBadge'); if (trackBadge) trackBadge.innerText = payload.track_name || payload.track || (payload.last_payload && payload.last_payload.track_name) || trackBadge.innerText || '-';
       const sessionBadge = document.getElementById('sessionTypeBadge'); if (sessionBadge) sessionBadge.innerText = payload.session_type || payload.session || (payload.last_payload && payload.last_payload.session_type) || sessionBadge.innerText || '-';
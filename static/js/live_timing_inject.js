@@ -0,0 +1,256 @@
+// live_timing_inject.js
+// Badges de estrategia, botones "Cargar Estrategia" y botón volver del pit wall.
+// Antes se inyectaba inline en cada respuesta de /live-timing; ahora es un asset con huella (caché immutable)
+// cargado desde live_timing.html con el nonce de la CSP.
+(function(){
+  try {
+    console && console.log && console.log('live_timing_inject: cargado');
+
+    // back button safe attach
+    try {
+      var backEl = document.querySelector('a.btn-nav, .btn-nav');
+      if (backEl && !backEl.dataset._legacy_back_injected) {
+        backEl.addEventListener('click', function(e){ e.preventDefault(); window.location.href = '/'; }, {passive:true});
+        backEl.dataset._legacy_back_injected = '1';
+      }
+    } catch(e){}
+
+    // place badges
+    function placeBadges() {
+      try {
+        var sessionBar = document.querySelector('.session-bar');
+        if (!sessionBar) return;
+        var airSpan = document.getElementById('weatherAir');
+        var insertBeforeNode = airSpan && airSpan.parentElement && sessionBar.contains(airSpan.parentElement) ? airSpan.parentElement : sessionBar.firstElementChild;
+
+        function ensureWrappedSpan(id, initialText) {
+          var existing = document.getElementById(id);
+          var span;
+          if (existing) {
+            span = existing.tagName && existing.tagName.toLowerCase() === 'span' ? existing : (existing.querySelector && existing.querySelector('span#' + id) || existing);
+          } else {
+            span = document.createElement('span');
+            span.id = id;
+            span.className = 'session-val';
+            span.textContent = initialText;
+          }
+          var wrapper = span.parentElement;
+          if (!wrapper || wrapper.classList.contains('session-bar') || (wrapper.tagName && wrapper.tagName.toLowerCase() === 'span')) {
+            wrapper = document.createElement('div');
+            if (span.parentElement) { span.parentElement.replaceChild(wrapper, span); wrapper.appendChild(span); } else { wrapper.appendChild(span); }
+          }
+          if (!span.classList.contains('session-val')) span.classList.add('session-val');
+          if (!sessionBar.contains(wrapper)) {
+            if (insertBeforeNode) sessionBar.insertBefore(wrapper, insertBeforeNode);
+            else sessionBar.appendChild(wrapper);
+          } else {
+            if (insertBeforeNode && wrapper.nextSibling !== insertBeforeNode && wrapper !== insertBeforeNode.previousSibling) {
+              sessionBar.insertBefore(wrapper, insertBeforeNode);
+            }
+          }
+          return span;
+        }
+
+        ensureWrappedSpan('trackNameBadge', 'TRACK: -');
+        ensureWrappedSpan('sessionTypeBadge', 'SESSION: -');
+      } catch(e) { console && console.warn && console.warn('placeBadges error', e); }
+    }
+
+    // strategies logic (abstracción minimal, expone attachLoadButtons)
+    (function(){
+      var API_LIST = '/api/estrategias';
+      var API_DETAIL = function(id){ return '/api/estrategia/' + id; };
+      var TELEMETRY_BASE = ((document.querySelector('meta[name="telemetry-url"]') || {}).content || '').replace(/\/$/, '');
+      var TELEMETRY = TELEMETRY_BASE + '/api/telemetry/live';
+
+      function el(tag, attrs, children) {
+        attrs = attrs || {}; children = children || [];
+        var d = document.createElement(tag);
+        for (var k in attrs) {
+          if (!attrs.hasOwnProperty(k)) continue;
+          if (k === 'class') d.className = attrs[k];
+          else if (k === 'html') d.innerHTML = attrs[k];
+          else d.setAttribute(k, attrs[k]);
+        }
+        (Array.isArray(children) ? children : [children]).forEach(function(c){
+          if (!c) return;
+          if (typeof c === 'string') d.appendChild(document.createTextNode(c));
+          else d.appendChild(c);
+        });
+        return d;
+      }
+
+      function createModal() {
+        var overlay = el('div', { class: 'lt-overlay', id: 'lt-strat-overlay', style: 'position:fixed; inset:0; display:flex; align-items:center; justify-content:center; z-index:9999;' });
+        var modal = el('div', { class: 'lt-modal', style: 'background:#0f0f10; color:#fff; border-radius:8px; width:86%; max-width:900px; max-height:80vh; overflow:auto; box-shadow:0 8px 30px rgba(0,0,0,0.6); padding:14px; font-family: inherit;' });
+        var header = el('div', { class: 'lt-modal-header', style: 'display:flex; justify-content:space-between; align-items:center; margin-bottom:8px;' }, [
+          el('div', { style: 'font-weight:700; font-size:1.05rem;' }, ['Cargar Estrategia']),
+          el('button', { class: 'lt-close-btn', style: 'background:transparent; border:1px solid #444; color:#fff; padding:6px 10px; border-radius:6px; cursor:pointer;' }, ['Cerrar'])
+        ]);
+        var content = el('div', { class: 'lt-modal-body', id: 'lt-modal-content', style: 'padding-top:6px;' });
+        modal.appendChild(header); modal.appendChild(content); overlay.appendChild(modal); document.body.appendChild(overlay);
+        overlay.addEventListener('click', function(e){ if (e.target === overlay) overlay.remove(); });
+        var closeBtn = modal.querySelector('.lt-close-btn'); if (closeBtn) closeBtn.addEventListener('click', function(){ overlay.remove(); });
+        return { overlay: overlay, content: content };
+      }
+
+      // la API pagina (keyset): se siguen los cursores 'next' hasta tener la lista completa
+      async function fetchStrategies() {
+        var all = [], cursor = null;
+        do {
+          var url = API_LIST + '?limit=500' + (cursor ? '&before=' + encodeURIComponent(cursor) : '');
+          var res = await fetch(url, { credentials: 'same-origin' });
+          if (!res.ok) throw new Error('HTTP ' + res.status);
+          var page = await res.json();
+          if (!page || !page.ok) return page;
+          all = all.concat(page.strategies || []);
+          cursor = page.next;
+        } while (cursor);
+        return { ok: true, strategies: all };
+      }
+
+      async function fetchStrategy(id) {
+        var res = await fetch(API_DETAIL(id), { credentials: 'same-origin' });
+        if (!res.ok) throw new Error('HTTP ' + res.status);
+        return await res.json();
+      }
+
+      function renderStrategyPreview(container, strat) {
+        container.innerHTML = '';
+        var meta = el('div', { style: 'margin-bottom:8px; display:flex; gap:10px; align-items:center;' }, [
+          el('div', { style: 'font-weight:700; font-size:1rem;' }, [strat.name || 'Sin nombre']),
+          el('div', { style: 'color:#aaa; font-size:0.9rem;' }, [ (strat.car_name || '') + ' ' + (strat.car_class || '') ])
+        ]);
+        container.appendChild(meta);
+        var stints = (strat.payload && strat.payload.stints) || [];
+        var table = el('table', { style: 'width:100%; border-collapse:collapse; margin-top:6px;' });
+        var thead = el('thead', {}, [
+          el('tr', {}, [
+            el('th', { style:'text-align:left; padding:6px; color:#bbb;'} , ['#']),
+            el('th', { style:'text-align:left; padding:6px; color:#bbb;' } , ['PILOTO']),
+            el('th', { style:'padding:6px; color:#bbb;' } , ['INICIO']),
+            el('th', { style:'padding:6px; color:#bbb;' } , ['FIN']),
+            el('th', { style:'padding:6px; color:#bbb;' } , ['LAPS']),
+            el('th', { style:'padding:6px; color:#bbb;' } , ['FUEL']),
+            el('th', { style:'padding:6px; color:#bbb;' } , ['WX']),
+            el('th', { style:'padding:6px; color:#bbb;' } , ['PIT']),
+            el('th', { style:'padding:6px; color:#bbb;' } , ['NOTAS'])
+          ])
+        ]);
+        var tbody = el('tbody', {});
+        stints.forEach(function(s,i){
+          var tr = el('tr', {}, [
+            el('td', { style:'padding:6px; color:#fff;' }, [String(i+1)]),
+            el('td', { style:'padding:6px; color:#fff;' }, [s.driver || s.name || 'N/A']),
+            el('td', { style:'padding:6px; color:#fff;' }, [s.start || s.inicio || '--:--']),
+            el('td', { style:'padding:6px; color:#fff;' }, [s.end || s.fin || '--:--']),
+            el('td', { style:'padding:6px; color:#fff;' }, [String(s.laps || '')]),
+            el('td', { style:'padding:6px; color:#fff;' }, [String(s.fuel || '')]),
+            el('td', { style:'padding:6px; color:#fff;' }, [s.wx || '-']),
+            el('td', { style:'padding:6px; color:#fff;' }, [s.pit ? 'YES' : '']),
+            el('td', { style:'padding:6px; color:#fff;' }, [s.notes || ''])
+          ]);
+          tbody.appendChild(tr);
+        });
+        table.appendChild(thead); table.appendChild(tbody); container.appendChild(table);
+      }
+
+      async function applyStrategyToPlan(strat) {
+        try {
+          if (!strat || !strat.ok) { alert('Estrategia inválida o no accesible.'); return; }
+          var payload = strat.payload || {};
+          // backward-compatible: prefer payload.stints, fallback to payload.relays (server uses "relays")
+          var stints = Array.isArray(payload.stints) ? payload.stints : (Array.isArray(payload.relays) ? payload.relays.map(function(r){ return { driver: r.driver || r.name, start: r.start, end: r.end, laps: (r.laps ? Number(r.laps) : ''), fuel: r.fuel, wx: '', pit: !!r.pit, notes: r.notes || '' }; }) : []);
+          var tbody = document.getElementById('strategyBody');
+          if (!tbody) { alert('No se encontró plan de carrera en la página.'); return; }
+          tbody.innerHTML = '';
+          var tele = {};
+          try { var r = await fetch(TELEMETRY, { credentials: TELEMETRY_BASE ? 'include' : 'same-origin' }); if (r.ok) tele = await r.json(); } catch(e){ tele = {}; }
+          stints.forEach(function(s, idx){
+            var tr = document.createElement('tr');
+            var names = (tele && tele.grid) ? tele.grid.map(function(g){ return (g.name||'').toLowerCase(); }) : [];
+            var driverName = (s.driver || s.name || '').toLowerCase();
+            var isConn = names.indexOf(driverName) !== -1;
+            var tdIndex = document.createElement('td'); tdIndex.textContent = String(idx+1);
+            var tdPilot = document.createElement('td'); tdPilot.textContent = s.driver || s.name || '---'; tdPilot.className = (isConn ? 'pilot-on' : 'pilot-off'); tdPilot.style.textAlign = 'left';
+            var tdStart = document.createElement('td'); tdStart.textContent = s.start || s.inicio || '--:--';
+            var tdEnd = document.createElement('td'); tdEnd.textContent = s.end || s.fin || '--:--';
+            var tdLaps = document.createElement('td'); tdLaps.textContent = String(s.laps || s.laps_est || '');
+            var tdFuel = document.createElement('td'); tdFuel.textContent = String(s.fuel || '');
+            var tdWx = document.createElement('td'); tdWx.textContent = s.wx || '-';
+            var tdPit = document.createElement('td'); tdPit.textContent = s.pit ? 'YES' : '';
+            var tdNotes = document.createElement('td'); tdNotes.textContent = s.notes || s.notas || '';
+
+            tr.appendChild(tdIndex); tr.appendChild(tdPilot); tr.appendChild(tdStart); tr.appendChild(tdEnd);
+            tr.appendChild(tdLaps); tr.appendChild(tdFuel); tr.appendChild(tdWx); tr.appendChild(tdPit); tr.appendChild(tdNotes);
+            tbody.appendChild(tr);
+          });
+          console && console.log && console.log('Strategy applied, rows:', stints.length);
+          // activa la reconciliación plan vs realidad en el servidor (sesión del bridge actual)
+          try { await fetch('/api/telemetry/plan', { method: 'POST', credentials: 'same-origin', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ strategy_id: strat.id, team_id: tele && tele.team_id, tz_offset: new Date().getTimezoneOffset() }) }); } catch(e){}
+        } catch(e) { console && console.error && console.error('applyStrategyToPlan error', e); alert('Error al aplicar estrategia'); }
+      }
+
+      function attachLoadButtons() {
+        var buttons = document.querySelectorAll('.btn-load, #btnLoadStrategy');
+        Array.prototype.forEach.call(buttons, function(btn){
+          try {
+            if (btn.dataset.ltAttached) return;
+            btn.addEventListener('click', async function(ev){
+              try {
+                ev.preventDefault();
+                var modalObj = createModal();
+                var content = modalObj.content;
+                content.innerHTML = '<div style="padding:8px">Cargando estrategias…</div>';
+                var listRes;
+                try { listRes = await fetchStrategies(); } catch(err) { content.innerHTML = '<div style="padding:8px; color:#f88;">No se pudo listar estrategias (comprueba login)</div>'; return; }
+                if (!listRes || !listRes.ok) { content.innerHTML = '<div style="padding:8px; color:#f88;">Error al listar estrategias</div>'; return; }
+                var strategies = listRes.strategies || [];
+                content.innerHTML = '';
+                if (!strategies.length) { content.innerHTML = '<div style="padding:8px; color:#ccc;">No hay estrategias disponibles</div>'; return; }
+                var listWrap = el('div', { style: 'display:flex; gap:10px; flex-direction:column;' });
+                strategies.forEach(function(s){
+                  var item = el('div', { style:'display:flex; justify-content:space-between; align-items:center; gap:8px; padding:8px; border-bottom:1px solid rgba(255,255,255,0.04);' });
+                  var left = el('div', {}, [ el('div', { style:'font-weight:700; color:#fff;' }, [s.name]), el('div', { style:'color:#aaa; font-size:0.85rem;' }, [ (s.car_name||'') + ' · ' + (s.car_class||'') ]) ]);
+                  var actions = el('div', {}, [ el('button', { style:'background:#222; border:1px solid #444; color:#fff; padding:6px 8px; border-radius:6px; cursor:pointer;', 'data-id': s.id }, ['Previsualizar']), el('button', { style:'background:#0a84ff; border:none; color:#fff; padding:6px 8px; border-radius:6px; margin-left:6px; cursor:pointer;', 'data-id': s.id }, ['Cargar']) ]);
+                  item.appendChild(left); item.appendChild(actions); listWrap.appendChild(item);
+                  Array.prototype.forEach.call(actions.querySelectorAll('button'), function(b){
+                    b.addEventListener('click', async function(ev2){
+                      ev2.stopPropagation();
+                      var id = b.getAttribute('data-id');
+                      try {
+                        var detail = await fetchStrategy(id);
+                        if (!detail || !detail.ok) { alert('No se pudo cargar la estrategia (no autorizada o inválida). Comprueba permisos.'); return; }
+                        if (b.textContent && b.textContent.trim() === 'Previsualizar') {
+                          var prev = content.querySelector('#lt-preview'); if (prev) prev.remove();
+                          var preview = el('div', { id:'lt-preview', style:'margin-top:10px;' });
+                          renderStrategyPreview(preview, detail);
+                          content.appendChild(preview);
+                          preview.scrollIntoView({ behavior: 'smooth' });
+                        } else {
+                          await applyStrategyToPlan(detail);
+                          modalObj.overlay.remove();
+                        }
+                      } catch(err) { console && console.error && console.error('action click error', err); alert('Error al obtener la estrategia. Mira la consola.'); }
+                    });
+                  });
+                });
+                content.appendChild(listWrap);
+              } catch(e) { console && console.error && console.error('btn click error', e); }
+            });
+            btn.dataset.ltAttached = '1';
+          } catch(e) { console && console.warn && console.warn('attach btn fail', e); }
+        });
+      }
+
+      window.attachLoadButtons = attachLoadButtons;
+      window.applyStrategyToPlan = applyStrategyToPlan;
+      window.initLiveTimingStrategies = function(){ try { placeBadges(); } catch(e){} try { attachLoadButtons(); } catch(e){} };
+
+      function safeInitRetries(){ var attempts=[0,120,300,800,1500]; attempts.forEach(function(t){ setTimeout(function(){ try{ window.initLiveTimingStrategies(); }catch(e){} }, t); }); }
+      if (document.readyState === 'complete' || document.readyState === 'interactive') safeInitRetries(); else { window.addEventListener('DOMContentLoaded', safeInitRetries); setTimeout(safeInitRetries, 500); }
+
+    })();
+
+  } catch(e) { console && console.error && console.error('live_timing_inject error', e); }
+})();
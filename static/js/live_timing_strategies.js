@@ -55,10 +55,20 @@
   }
 
   // fetch helpers
+  // la API pagina (keyset): se siguen los cursores 'next' hasta tener la lista completa
   async function fetchStrategies() {
-    const r = await fetch(API_LIST, { credentials: 'same-origin' });
-    if (!r.ok) throw new Error('API /api/estrategias error ' + r.status);
-    const json = await r.json();
+    let all = [], cursor = null;
+    do {
+      const url = API_LIST + '?limit=500' + (cursor ? '&before=' + encodeURIComponent(cursor) : '');
+      const r = await fetch(url, { credentials: 'same-origin' });
+      if (!r.ok) throw new Error('API /api/estrategias error ' + r.status);
+      const json = await r.json();
+      all = all.concat(strategyList(json));
+      cursor = json && !Array.isArray(json) ? json.next : null;
+    } while (cursor);
+    return all;
+  }
+  function strategyList(json) {
     if (Array.isArray(json)) return json;
     if (Array.isArray(json.strategies)) return json.strategies;
     if (Array.isArray(json.data)) return json.data;
@@ -1,9 +1,22 @@
 // Service Worker para Legacy Hub
+// /sw.js antepone ASSET_VERSION y PRECACHE: las URLs con huella de static_assets.py.
+// Son immutable, así que se sirven desde caché sin ir a red; al cambiar cualquier
+// asset cambia ASSET_VERSION, se instala una caché nueva y se borra la anterior.
+const CACHE = 'legacy-assets-' + ASSET_VERSION;
+const PRECACHED = new Set(PRECACHE.map((u) => new URL(u, self.location).href));
+
 self.addEventListener('install', (e) => {
-  console.log('[Service Worker] Install');
+  e.waitUntil(caches.open(CACHE).then((c) => c.addAll(PRECACHE)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', (e) => {
+  e.waitUntil(caches.keys()
+    .then((keys) => Promise.all(keys.filter((k) => k.startsWith('legacy-assets-') && k !== CACHE).map((k) => caches.delete(k))))
+    .then(() => self.clients.claim()));
 });
 
 self.addEventListener('fetch', (e) => {
-  // Básico: solo permite que la app funcione online
-  e.respondWith(fetch(e.request));
-});
\ No newline at end of file
+  // Solo los assets precacheados; el resto (páginas, API, telemetría) va a red como siempre
+  if (e.request.method !== 'GET' || !PRECACHED.has(e.request.url)) return;
+  e.respondWith(caches.open(CACHE).then((c) => c.match(e.request)).then((hit) => hit || fetch(e.request)));
+});
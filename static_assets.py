@@ -0,0 +1,109 @@
+# ==========================================
+# ASSETS CON HUELLA + PRECOMPRIMIDOS
+# ==========================================
+# Sin paso de build: al arrancar se recorren static/js, static/css y static/img,
+# se calcula el SHA-256 de cada archivo y se publica una copia con la huella en
+# el nombre en static/dist/ (js/live_timing_custom.js -> js/live_timing_custom.<hash>.js)
+# junto a sus hermanos .br y .gz ya comprimidos. Como el nombre cambia con el
+# contenido, /assets/ sirve con Cache-Control immutable y sw.js precachea
+# exactamente estas URLs. En plantillas: {{ asset_url('js/live_timing_custom.js') }}.
+# Los .br/.gz se reutilizan entre arranques (solo se comprime lo que ha cambiado).
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import secrets
+
+import brotli
+
+ASSET_DIRS = ("js", "css", "img")
+DIST_DIR = "dist"
+SKIP_SUFFIXES = (".bak", ".txt", ".map", "~")
+COMPRESSIBLE = {".js", ".css", ".json", ".svg", ".html", ".txt"}
+MIN_COMPRESS_BYTES = 512
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))     # orden de preferencia
+
+
+def _tmp(path):
+    # nombre único por escritor: con N workers arrancando a la vez todos publican los mismos archivos
+    return f"{path}.{os.getpid()}-{secrets.token_hex(4)}.tmp"
+
+
+def _write(path, data):
+    tmp = _tmp(path)
+    with open(tmp, "wb") as f: f.write(data)
+    os.replace(tmp, path)
+
+
+class AssetManifest:
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.dist = os.path.join(static_folder, DIST_DIR)
+        self.entries = {}       # ruta lógica -> ruta con huella
+        self.files = {}         # ruta con huella -> {"mimetype", "encodings": {enc: sufijo}}
+        self.version = None
+
+    def _sources(self):
+        for d in ASSET_DIRS:
+            for root, dirs, names in os.walk(os.path.join(self.static_folder, d)):
+                dirs[:] = sorted(n for n in dirs if not n.startswith("."))
+                for name in sorted(names):
+                    if name.startswith(".") or "." not in name or name.endswith(SKIP_SUFFIXES): continue
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, self.static_folder).replace(os.sep, "/"), path
+
+    def build(self):
+        entries, files, keep = {}, {}, set()
+        for rel, path in self._sources():
+            with open(path, "rb") as f: data = f.read()
+            stem, ext = os.path.splitext(rel)
+            hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            out = os.path.join(self.dist, hashed)
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            # siempre copia con los bytes ya hasheados: un enlace duro al fuente cambiaría una URL immutable
+            # al editarlo en sitio (y los .br/.gz seguirían con lo viejo). Los enlaces de versiones anteriores se rehacen.
+            if not os.path.exists(out) or os.path.samefile(out, path): _write(out, data)
+            keep.add(out)
+            encodings = {}
+            if ext.lower() in COMPRESSIBLE and len(data) >= MIN_COMPRESS_BYTES:
+                for enc, suffix in ENCODINGS:
+                    if not os.path.exists(out + suffix):
+                        packed = brotli.compress(data, quality=11) if enc == "br" else gzip.compress(data, 9, mtime=0)
+                        if len(packed) >= len(data): continue
+                        _write(out + suffix, packed)
+                    encodings[enc] = suffix; keep.add(out + suffix)
+            entries[rel] = hashed
+            files[hashed] = {"mimetype": mimetypes.guess_type(rel)[0] or "application/octet-stream", "encodings": encodings}
+        self._prune(keep)
+        self.entries, self.files = entries, files
+        self.version = hashlib.sha256(json.dumps(entries, sort_keys=True).encode()).hexdigest()[:12]
+        return self
+
+    def _prune(self, keep):
+        """Borra de dist/ las huellas viejas (archivos editados o eliminados desde el último arranque).
+
+        Los *.tmp no se tocan: son escrituras en curso de otro worker que arranca a la vez.
+        """
+        for root, _, names in os.walk(self.dist):
+            for name in names:
+                path = os.path.join(root, name)
+                if path in keep or name.endswith(".tmp"): continue
+                try: os.remove(path)
+                except FileNotFoundError: pass      # otro worker ya la ha borrado
+
+    def hashed(self, filename):
+        return self.entries.get(filename)
+
+    def resolve(self, hashed, accept_encodings):
+        """(ruta en disco, mimetype, Content-Encoding o None) de un asset con huella, o None si no existe."""
+        info = self.files.get(hashed)
+        if info is None: return None
+        path = os.path.join(self.dist, hashed)
+        for enc, _ in ENCODINGS:
+            if enc in info["encodings"] and accept_encodings[enc]: return path + info["encodings"][enc], info["mimetype"], enc
+        return path, info["mimetype"], None
+
+    def precache(self, url_for_asset):
+        return [url_for_asset(h) for h in self.entries.values()]
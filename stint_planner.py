@@ -0,0 +1,203 @@
+# ==========================================
+# PLANIFICADOR DE STINTS (servidor, NumPy)
+# ==========================================
+# Equivalente en servidor de generateRelays()/calcLapsPerStint()/cascadeTimes()
+# de race_strategy.html, pero buscando el mejor plan en vez de aplicar una
+# rotación fija. Espacio de búsqueda:
+#   orden de pilotos (permutaciones) × stints seguidos por piloto × vueltas por stint
+# Todos los candidatos se evalúan a la vez con arrays (candidatos × stints).
+# La salida usa el mismo esquema de relays que loadStrategyById():
+#   {driver, start, end, laps, fuel, pit, notes}
+
+import itertools
+import math
+import time
+
+import numpy as np
+
+MAX_PERMUTATION_PILOTS = 6      # hasta 6 pilotos se prueban todas las permutaciones (720)
+SAMPLED_ORDERS = 400            # por encima, rotaciones + muestra aleatoria determinista
+MAX_CELLS = 6_000_000           # tope de celdas (candidatos × stints) por evaluación
+MAX_PILOTS = 16
+MAX_CONSECUTIVE_STINTS = 8
+MAX_DURATION_S = 48 * 3600
+MAX_LAPS = 5000
+MAX_STINTS = 1000
+
+
+def parse_seconds(value, default=0.0):
+    """'1:45.500', '00:01:12', '24:00:00', 105.5 -> segundos."""
+    if value is None or value == "": return float(default)
+    if isinstance(value, (int, float)): return float(value)
+    parts = str(value).strip().replace(",", ".").split(":")
+    secs = 0.0
+    for p in parts: secs = secs * 60 + float(p or 0)
+    return secs
+
+
+def clock_seconds(value):
+    """Hora de salida 'HH:MM' (como raceStartLocal) -> segundos desde medianoche."""
+    if not value: return 0.0
+    if isinstance(value, (int, float)): return float(value)
+    h, _, m = str(value).partition(":")
+    return int(h) * 3600 + int(m or 0) * 60
+
+
+def hhmm(sec):
+    sec = int(round(sec)) % 86400
+    return f"{sec // 3600:02d}:{sec % 3600 // 60:02d}"
+
+
+def hhmmss(sec):
+    sec = int(round(sec))
+    return f"{sec // 3600:02d}:{sec % 3600 // 60:02d}:{sec % 60:02d}"
+
+
+def laptime_str(sec):
+    m, s = divmod(sec, 60)
+    return f"{int(m)}:{s:06.3f}"
+
+
+class PlanRequest:
+    """Parámetros validados del plan (lanza ValueError con mensaje legible)."""
+
+    def __init__(self, data):
+        if not isinstance(data, dict): raise ValueError("se esperaba un objeto JSON")
+        self.mode = data.get("mode", "time")
+        if self.mode not in ("time", "laps"): raise ValueError("mode debe ser 'time' o 'laps'")
+        self.duration = parse_seconds(data.get("duration"))
+        self.total_laps = int(data.get("laps") or 0)
+        if self.mode == "time" and self.duration <= 0: raise ValueError("duration requerida en modo time")
+        if self.mode == "laps" and self.total_laps <= 0: raise ValueError("laps requerido en modo laps")
+        if self.duration > MAX_DURATION_S or self.total_laps > MAX_LAPS: raise ValueError(f"carrera demasiado larga (máx. {MAX_DURATION_S // 3600} h o {MAX_LAPS} vueltas)")
+        self.start = clock_seconds(data.get("start"))
+        default_lap = parse_seconds(data.get("lap_time"))
+        self.pilots = []
+        pilots = data.get("pilots") or []
+        if not isinstance(pilots, list) or not all(isinstance(p, dict) for p in pilots):
+            raise ValueError("pilots debe ser una lista de objetos {name, lap_s}")
+        if len(pilots) > MAX_PILOTS: raise ValueError(f"máximo {MAX_PILOTS} pilotos")
+        for p in pilots:
+            lap = parse_seconds(p.get("lap_s", p.get("laptime")), default_lap)
+            if lap <= 0: raise ValueError(f"tiempo de vuelta inválido para {p.get('name')}")
+            self.pilots.append({"name": p.get("name") or f"Piloto {len(self.pilots) + 1}", "lap_s": lap, "id": p.get("id", "")})
+        if not self.pilots:
+            if default_lap <= 0: raise ValueError("se necesita al menos un piloto o lap_time")
+            self.pilots = [{"name": "", "lap_s": default_lap, "id": ""}]
+        self.fuel_per_lap = float(data.get("fuel_per_lap") or 0)
+        self.tank = float(data.get("tank") or 0)
+        if self.fuel_per_lap <= 0 or self.tank <= 0: raise ValueError("fuel_per_lap y tank deben ser > 0")
+        self.pit_service = parse_seconds(data.get("pit_service"))
+        self.pit_loss = parse_seconds(data.get("pit_loss"))
+        tank_laps = int(self.tank // self.fuel_per_lap)
+        self.max_stint_laps = min(tank_laps, int(data.get("max_stint_laps") or tank_laps))
+        self.min_stint_laps = max(1, min(int(data.get("min_stint_laps") or max(1, self.max_stint_laps // 2)), self.max_stint_laps))
+        if self.max_stint_laps <= 0: raise ValueError("el depósito no da para una vuelta")
+        self.max_consecutive = max(1, min(int(data.get("max_consecutive_stints") or 2), MAX_CONSECUTIVE_STINTS))
+        self.max_driver_time = parse_seconds(data.get("max_driver_time"))
+        self.top = max(1, min(int(data.get("top") or 5), 20))
+
+
+def driver_orders(n):
+    if n <= MAX_PERMUTATION_PILOTS: return np.array(list(itertools.permutations(range(n))), dtype=np.int16)
+    rng = np.random.default_rng(n)
+    base = np.arange(n, dtype=np.int16)
+    orders = [np.roll(base, -i) for i in range(n)] + [rng.permutation(n).astype(np.int16) for _ in range(SAMPLED_ORDERS)]
+    return np.unique(np.array(orders), axis=0)
+
+
+def plan(data):
+    """Devuelve {'plans': [...], 'evaluated': n, 'elapsed_ms': t} con los mejores planes."""
+    t0 = time.perf_counter()
+    req = data if isinstance(data, PlanRequest) else PlanRequest(data)
+    laps_opts = np.arange(req.min_stint_laps, req.max_stint_laps + 1, dtype=np.float64)
+    pace = np.array([p["lap_s"] for p in req.pilots])
+    stop = req.pit_loss + req.pit_service
+
+    if req.mode == "time": n_stints = int(math.ceil(req.duration / (req.min_stint_laps * pace.min()))) + 1
+    else: n_stints = int(math.ceil(req.total_laps / req.min_stint_laps))
+    if n_stints > MAX_STINTS: raise ValueError(f"demasiados stints posibles ({n_stints}); sube min_stint_laps")
+
+    orders = driver_orders(len(req.pilots))
+    ks = np.arange(1, min(req.max_consecutive, n_stints) + 1)
+    # el tope se comprueba antes de construir nada: con un solo tamaño de stint ya no cabría
+    if len(orders) * len(ks) * n_stints > MAX_CELLS:
+        raise ValueError("espacio de búsqueda demasiado grande: menos pilotos, stints seguidos o stints más largos")
+    # secuencia de pilotos por (orden, k): stint j -> order[(j // k) % n_pilots]
+    j = np.arange(n_stints)
+    slot = (j[None, :] // ks[:, None]) % len(req.pilots)                       # (K, M)
+    seq = orders[:, slot].reshape(-1, n_stints)                               # (O·K, M)
+    combos = [(o, k) for o in range(len(orders)) for k in ks]
+
+    # recorta laps_opts si el espacio no cabe en MAX_CELLS (prioriza stints largos: menos paradas)
+    max_l = max(1, MAX_CELLS // max(1, seq.shape[0] * n_stints))
+    if len(laps_opts) > max_l: laps_opts = laps_opts[-max_l:]
+
+    P = pace[seq][:, None, :]                                                 # (Q, 1, M)
+    L = laps_opts[None, :, None]                                              # (1, NL, 1)
+    if req.mode == "time":
+        dur = L * P
+        step = dur + stop
+        start = np.cumsum(step, axis=-1) - step
+        driven = start < req.duration
+        full = start + dur <= req.duration
+        partial = np.minimum(L, np.ceil((req.duration - start) / P))
+        laps = np.where(full, L, np.where(driven, partial, 0.0))
+    else:
+        done_before = j[None, None, :] * L
+        laps = np.clip(req.total_laps - done_before, 0, L)
+        driven = laps > 0
+        dur = laps * P
+        step = dur + stop
+        start = np.cumsum(step, axis=-1) - step
+        laps, driven = np.broadcast_to(laps, start.shape), np.broadcast_to(driven, start.shape)
+    total_laps = laps.sum(-1)
+    n_driven = driven.sum(-1)
+    last = np.maximum(n_driven - 1, 0)[..., None]
+    finish = (np.take_along_axis(start, last, -1) + np.take_along_axis(laps * P, last, -1))[..., 0]
+
+    feasible = n_driven > 0
+    if req.max_driver_time > 0:
+        drive = laps * P
+        for d in range(len(req.pilots)):
+            feasible &= np.where(seq[:, None, :] == d, drive, 0.0).sum(-1) <= req.max_driver_time
+    # orden: más vueltas, luego antes en meta, luego menos paradas
+    score = np.where(feasible, total_laps * (finish.max() + 1.0) - finish - n_driven * 1e-3, -np.inf)
+    flat = score.ravel()
+    pool = min(flat.size, req.top * 40)
+    best = np.argpartition(-flat, pool - 1)[:pool]
+    best = best[np.argsort(-flat[best])]
+
+    plans, seen = [], set()
+    for idx in best:
+        if not np.isfinite(flat[idx]): break
+        q, li = divmod(int(idx), len(laps_opts))
+        n = int(n_driven[q, li])
+        stint_laps = laps[q, li, :n].astype(int)
+        drivers = seq[q, :n]
+        sig = (tuple(drivers.tolist()), tuple(stint_laps.tolist()))
+        if sig in seen: continue
+        seen.add(sig)
+        plans.append(build_plan(req, drivers, stint_laps, start[q, li, :n], combos[q][1]))
+        if len(plans) >= req.top: break
+    return {"plans": plans, "evaluated": int(flat.size), "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+
+def build_plan(req, drivers, stint_laps, starts, k):
+    stop = req.pit_loss + req.pit_service
+    relays, per_driver = [], {}
+    for i, (d, laps, s) in enumerate(zip(drivers, stint_laps, starts)):
+        p = req.pilots[int(d)]
+        drive = float(laps * p["lap_s"])
+        fuel = float(min(req.tank, math.ceil((laps + 1) * req.fuel_per_lap)))
+        relays.append({"driver": p["name"], "start": hhmm(req.start + s), "end": hhmm(req.start + s + drive), "laps": int(laps),
+                       "fuel": fuel, "pit": hhmmss(stop if i < len(drivers) - 1 else 0), "notes": f"Stint {i + 1}"})
+        per_driver[p["name"]] = per_driver.get(p["name"], 0.0) + drive
+    finish = float(starts[-1] + stint_laps[-1] * req.pilots[int(drivers[-1])]["lap_s"])
+    return {
+        "total_laps": int(stint_laps.sum()), "stops": len(relays) - 1, "finish_s": round(finish, 1),
+        "stint_laps": int(stint_laps.max()), "consecutive_stints": int(k),
+        "driver_time_s": {n: round(t, 1) for n, t in per_driver.items()},
+        "pilots": [{"name": p["name"], "laptime": laptime_str(p["lap_s"]), "stints": int(k), "id": p["id"]} for p in req.pilots],
+        "relays": relays,
+    }
@@ -0,0 +1,50 @@
+# ==========================================
+# CACHÉ DE PAYLOADS DE ESTRATEGIA
+# ==========================================
+# LRU acotada por memoria con las respuestas JSON ya serializadas.
+# La clave incluye Strategy.version (la sube estrategia_actualizar) y
+# Strategy.cache_token (aleatorio por fila: SQLite reutiliza el id más alto tras
+# un borrado), así que ni una edición ni una estrategia nueva con el id de otra
+# sirven bytes viejos, y no hace falta invalidar entre workers: las entradas
+# antiguas simplemente dejan de pedirse y salen por LRU.
+
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+
+class PayloadCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._data.get(key)
+            if body is None: self.misses += 1; return None
+            self._data.move_to_end(key); self.hits += 1
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes: return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None: self.bytes -= len(old)
+            self._data[key] = body; self.bytes += len(body)
+            while self.bytes > self.max_bytes:
+                _, evicted = self._data.popitem(last=False); self.bytes -= len(evicted)
+
+    def discard(self, sid):
+        """Elimina todas las versiones/formatos de una estrategia (p.ej. al borrarla)."""
+        with self._lock:
+            for key in [k for k in self._data if k[1] == sid]:
+                self.bytes -= len(self._data.pop(key))
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._data), "bytes": self.bytes, "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,239 @@
+# ==========================================
+# SERVICIO DE TELEMETRÍA ASYNCIO (opcional)
+# ==========================================
+# Para retransmisiones públicas con cientos/miles de viewers: un solo proceso
+# asyncio (solo stdlib) se encarga de la telemetría y Flask sigue sirviendo las
+# páginas. Rutas (mismo contrato que app.py):
+#   POST /api/telemetry/ingest    payload del bridge (igual que en Flask)
+#   GET  /api/telemetry/live      último estado + connected/edad
+#   GET  /api/telemetry/stream    Server-Sent Events: un evento por frame
+#   GET  /api/telemetry/history   ?since=<seq>&limit=<n> últimos payloads
+#   GET  /healthz                 conexiones, streams y seq
+# stream/history exigen la cookie de sesión de la web (session_cookie.py)
+# salvo con --public. Cada frame se serializa una sola vez; /live y los streams
+# solo añaden los campos que dependen de la hora. Los streams lentos se saltan
+# frames (siempre reciben el último) en vez de acumular cola.
+# Por defecto cada frame se copia también a instance/telemetry.shm, así que el
+# /api/telemetry/live de Flask sigue viendo lo mismo. Los planes activos ("plans"
+# en el frame) los activa Flask (/api/telemetry/plan) en ese mismo archivo: se
+# conservan en cada escritura y se recalculan aquí en los cruces de meta
+# (plan_tracker, y con él NumPy, solo se importa si hay alguno activo).
+#
+#   python telemetry_service.py --port 5001 [--public] [--cors-origin https://...]
+# Para usarlo desde live_timing.html: LEGACY_TELEMETRY_URL=https://live.ejemplo.com
+# en el entorno de app.py (o un proxy que mande /api/telemetry/* a este puerto).
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from urllib.parse import parse_qs
+
+import session_cookie
+import telemetry_store
+
+STALE_AFTER = 8.0               # = TELEMETRY_STALE_THRESHOLD de app.py
+KEEPALIVE = 15.0
+MAX_HEADER = 64 * 1024
+MAX_BODY = telemetry_store.DEFAULT_CAPACITY
+HISTORY_FRAMES = 600
+HISTORY_LIMIT = 600
+REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+class TelemetryService:
+    def __init__(self, public=False, cors_origin=None, history=HISTORY_FRAMES, shm_path=None, secret_key=session_cookie.SECRET_KEY):
+        self.public, self.cors_origin, self.secret_key = public, cors_origin, secret_key
+        self.state = {}
+        self.seq = 0
+        self.history = deque(maxlen=history)        # (seq, t, payload JSON)
+        self.connections = 0
+        self.streams = 0
+        self.store = telemetry_store.TelemetryStore(shm_path) if shm_path else None
+        if self.store: self.state = dict(self.store.state())
+        self._prefix = None                         # (seq, JSON del estado sin la "}" final)
+        self._wake = None
+
+    # --- estado ---
+    def ingest(self, data):
+        now = time.time()
+        telemetry_store.merge_frame(self.state, data, now)
+        self.seq += 1
+        self.history.append((self.seq, now, _dumps(self.state["last_payload"])))
+        if self.store:
+            try: self.store.update(lambda shared: self._with_plans(shared, data, now))
+            except telemetry_store.FrameTooLarge as e: print(f"⚠️ [Telemetría] {e}")
+        self._notify()
+
+    def _with_plans(self, shared, data, now):
+        # bajo el lock del store: los planes del archivo mandan (Flask los activa/desactiva)
+        self.state["plans"] = shared.get("plans") or {}
+        if self.state["plans"]:
+            import plan_tracker
+            plan_tracker.on_frame(self.state, data, now)
+        return self.state
+
+    def live_body(self, now=None):
+        # el estado se serializa una vez por frame; aquí solo se pegan los campos que cambian con la hora
+        if self._prefix is None or self._prefix[0] != self.seq:
+            base = {k: v for k, v in self.state.items() if k not in ("connected", "telemetry_age_seconds", "plans")}
+            plan = (self.state.get("plans") or {}).get(str(self.state.get("team_id") or "default"))   # = plan_tracker.session_key()
+            base["plan"] = plan["projection"] if plan else None
+            self._prefix = (self.seq, _dumps(base)[:-1])
+        fresh = telemetry_store.freshness(self.state, now or time.time(), STALE_AFTER)
+        tail = _dumps({"connected": fresh["connected"], "telemetry_age_seconds": fresh["telemetry_age_seconds"]})
+        prefix = self._prefix[1]
+        return prefix + (b"," if len(prefix) > 1 else b"") + tail[1:]
+
+    def history_body(self, query):
+        q = parse_qs(query)
+        since = int((q.get("since") or ["0"])[0] or 0)
+        limit = max(1, min(int((q.get("limit") or [str(HISTORY_LIMIT)])[0] or HISTORY_LIMIT), HISTORY_LIMIT))
+        frames = [f for f in self.history if f[0] > since][-limit:]
+        items = b",".join(b'{"seq":%d,"t":%.3f,"payload":%s}' % f for f in frames)
+        return b'{"seq":%d,"frames":[%s]}' % (self.seq, items)
+
+    # --- despertar a los streams (un único future compartido, sin una tarea por viewer) ---
+    def _notify(self):
+        if self._wake is not None and not self._wake.done(): self._wake.set_result(None)
+        self._wake = None
+
+    def _next_wake(self):
+        if self._wake is None: self._wake = asyncio.get_running_loop().create_future()
+        return self._wake
+
+    async def _keepalive(self):
+        while True:
+            await asyncio.sleep(KEEPALIVE)
+            self._notify()
+
+    # --- HTTP ---
+    def _authorized(self, headers):
+        return self.public or session_cookie.user_id(headers.get("cookie"), self.secret_key) is not None
+
+    def _head(self, status, ctype, length=None, keep=True, extra=b""):
+        h = b"HTTP/1.1 %d %s\r\nContent-Type: %s\r\nCache-Control: no-store\r\n" % (status, REASONS[status].encode(), ctype)
+        if length is not None: h += b"Content-Length: %d\r\n" % length
+        if self.cors_origin: h += b"Access-Control-Allow-Origin: %s\r\nAccess-Control-Allow-Credentials: true\r\nVary: Origin\r\n" % self.cors_origin.encode()
+        return h + (b"Connection: keep-alive\r\n" if keep else b"Connection: close\r\n") + extra + b"\r\n"
+
+    def _json(self, status, body, keep=True):
+        return self._head(status, b"application/json", len(body), keep) + body
+
+    def route(self, method, path, query, headers, body):
+        if path == "/api/telemetry/live":
+            if method != "GET": return 405, _dumps({"error": "method"})
+            return 200, self.live_body()
+        if path == "/api/telemetry/ingest":
+            if method != "POST": return 405, _dumps({"error": "method"})
+            try: data = json.loads(body or b"{}")
+            except ValueError: data = {}            # como get_json(silent=True) en Flask
+            self.ingest(data if isinstance(data, dict) else {})
+            return 200, b'{"status":"ok"}'
+        if path == "/api/telemetry/history":
+            if not self._authorized(headers): return 401, _dumps({"error": "login requerido"})
+            try: return 200, self.history_body(query)
+            except ValueError: return 400, _dumps({"error": "since/limit inválidos"})
+        if path == "/healthz":
+            return 200, _dumps({"ok": True, "seq": self.seq, "connections": self.connections, "streams": self.streams, "history": len(self.history)})
+        return 404, _dumps({"error": "not found"})
+
+    async def stream(self, writer, headers):
+        if not self._authorized(headers):
+            writer.write(self._json(401, _dumps({"error": "login requerido"}), keep=False)); await writer.drain(); return
+        writer.write(self._head(200, b"text/event-stream", extra=b"X-Accel-Buffering: no\r\n") + b"retry: 2000\n\n")
+        self.streams += 1
+        sent = None
+        try:
+            while True:
+                if self.seq != sent:
+                    sent = self.seq
+                    writer.write(b"id: %d\ndata: %s\n\n" % (sent, self.live_body()))
+                else:
+                    writer.write(b": keepalive\n\n")
+                await writer.drain()
+                await self._next_wake()
+        finally:
+            self.streams -= 1
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                try: head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError): return
+                request_line, *lines = head.decode("latin-1").split("\r\n")
+                try: method, target, version = request_line.split(" ", 2)
+                except ValueError: return
+                headers = {}
+                for line in lines:
+                    if ":" in line:
+                        k, v = line.split(":", 1); headers[k.strip().lower()] = v.strip()
+                keep = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                try: length = int(headers.get("content-length") or 0)
+                except ValueError: length = -1
+                if length < 0:
+                    # sin una longitud válida no se sabe dónde acaba el cuerpo: se responde y se cierra
+                    writer.write(self._json(400, _dumps({"error": "Content-Length inválido"}), keep=False)); await writer.drain(); return
+                if length > MAX_BODY:
+                    writer.write(self._json(413, _dumps({"error": "payload demasiado grande"}), keep=False)); await writer.drain(); return
+                body = await reader.readexactly(length) if length else b""
+                path, _, query = target.partition("?")
+                if method == "OPTIONS":
+                    writer.write(self._head(204, b"text/plain", 0, keep, b"Access-Control-Allow-Methods: GET, POST\r\nAccess-Control-Allow-Headers: Content-Type\r\n"))
+                elif path == "/api/telemetry/stream" and method == "GET":
+                    await self.stream(writer, headers); return
+                else:
+                    status, payload = self.route(method, path, query, headers, body)
+                    writer.write(self._json(status, payload, keep))
+                await writer.drain()
+                if not keep: return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER, backlog=4096)
+        keepalive = asyncio.create_task(self._keepalive())
+        print(f"📡 Telemetría en http://{host}:{port} ({'pública' if self.public else 'con sesión'} para stream/history)")
+        try:
+            async with server: await server.serve_forever()
+        finally:
+            keepalive.cancel()
+
+
+def raise_fd_limit():
+    """Miles de conexiones necesitan más que los 1024 descriptores por defecto."""
+    try: import resource
+    except ImportError: return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard: resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Servicio asyncio de telemetría (ingest/live/stream/history)")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=5001)
+    ap.add_argument("--public", action="store_true", help="stream/history sin cookie de sesión")
+    ap.add_argument("--cors-origin", help="origen de la web si live_timing.html apunta aquí desde otro dominio")
+    ap.add_argument("--history", type=int, default=HISTORY_FRAMES, help="frames que guarda /history")
+    ap.add_argument("--shm", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "telemetry.shm"),
+                    help="copia de cada frame para app.py (ver telemetry_store.py)")
+    ap.add_argument("--no-shm", action="store_true")
+    args = ap.parse_args()
+    raise_fd_limit()
+    service = TelemetryService(args.public, args.cors_origin, args.history, None if args.no_shm else args.shm)
+    try: asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt: pass
+
+
+if __name__ == "__main__":
+    main()
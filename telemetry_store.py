@@ -0,0 +1,159 @@
+# ==========================================
+# TELEMETRÍA COMPARTIDA ENTRE WORKERS (mmap + seqlock)
+# ==========================================
+# El último frame del bridge vive en un archivo mapeado en memoria
+# (instance/telemetry.shm) en vez de en un dict del proceso, así que con
+# gunicorn -w N el ingest puede caer en un worker y los viewers leer desde
+# cualquier otro. Disposición:
+#   0   magic "LTEL" + versión de formato       8 bytes
+#   8   seq (uint64): impar = escritura en curso 8 bytes
+#   16  longitud del frame (uint32) + pad       8 bytes
+#   24  hora de escritura (float64)             8 bytes
+#   64  frame JSON codificado                   hasta capacity bytes
+# Escritores: se serializan con flock (entre procesos) + un Lock (entre hilos).
+# Lectores: sin locks; leen seq, copian el frame y vuelven a leer seq; si ha
+# cambiado o era impar, reintentan. Cada proceso guarda el frame decodificado
+# de la última seq, así que cientos de viewers sobre el mismo frame no copian
+# ni decodifican nada: solo leen 8 bytes.
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try: import fcntl
+except ImportError: fcntl = None     # Windows (servidor de desarrollo de un solo proceso): basta con el Lock
+
+MAGIC = b"LTEL"
+FORMAT_VERSION = 1
+MAGIC_FMT = struct.Struct("<4sI")
+SEQ = struct.Struct("<Q")
+LENGTH = struct.Struct("<I4x")
+STAMP = struct.Struct("<d")
+SEQ_OFF, LENGTH_OFF, STAMP_OFF, DATA_OFF = 8, 16, 24, 64
+DEFAULT_CAPACITY = 1024 * 1024
+READ_RETRIES = 1000
+
+
+class FrameTooLarge(ValueError):
+    pass
+
+
+def merge_frame(state, data, now):
+    """Fusiona un payload del bridge en el estado (lo comparten app.py y telemetry_service.py)."""
+    # merge básico (mantiene claves previas si payload no las incluye)
+    state.update(data or {})
+
+    # Marca recibido y guarda payload (shallow copy)
+    state["last_ingest"] = now
+    state["timestamp"] = now  # compatibilidad con código existente
+    state["last_payload"] = dict(data) if isinstance(data, dict) else data
+    state["connected"] = True
+
+    # Normalizar campos que podrían venir con nombres distintos desde distintos bridges
+    state["track_name"] = data.get("track_name") or data.get("track") or data.get("Track") or state.get("track_name") or ""
+    state["session_type"] = data.get("session_type") or data.get("session") or data.get("Session") or state.get("session_type") or ""
+    return state
+
+
+def freshness(state, now, stale_after):
+    """Campos de /api/telemetry/live que dependen de la hora: connected según frescura (server-side) y edad."""
+    last = state.get("last_ingest") or state.get("timestamp") or 0
+    try: iso = datetime.utcfromtimestamp(last).isoformat() + "Z" if last else ""
+    except Exception: iso = ""
+    age = now - last if last else None
+    return {"last_ingest": last, "last_ingest_iso": iso, "connected": age is not None and age <= stale_after, "telemetry_age_seconds": age}
+
+
+class TelemetryStore:
+    def __init__(self, path, defaults=None, capacity=DEFAULT_CAPACITY):
+        self.path = path
+        self.capacity = capacity
+        self.defaults = dict(defaults or {})
+        self.retries = 0                # lecturas repetidas por coincidir con una escritura (diagnóstico)
+        self._wlock = threading.Lock()
+        self._cache = (None, None)      # (seq, dict decodificado) de este proceso
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._fd = self._lock_fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._pid = os.getpid()
+        with self._exclusive():
+            if os.fstat(self._fd).st_size < DATA_OFF + capacity: os.ftruncate(self._fd, DATA_OFF + capacity)
+            self._mm = mmap.mmap(self._fd, DATA_OFF + capacity)
+            if MAGIC_FMT.unpack_from(self._mm, 0) != (MAGIC, FORMAT_VERSION):
+                self._write(json.dumps(self.defaults, separators=(",", ":")).encode("utf-8"))
+                MAGIC_FMT.pack_into(self._mm, 0, MAGIC, FORMAT_VERSION)
+
+    @contextmanager
+    def _exclusive(self):
+        if self._pid != os.getpid():
+            # worker creado con fork (gunicorn --preload): flock es por descripción de archivo abierta,
+            # así que cada proceso necesita la suya para excluirse de los demás
+            self._pid, self._wlock = os.getpid(), threading.Lock()
+            self._lock_fd = os.open(self.path, os.O_RDWR)
+        with self._wlock:
+            if fcntl: fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try: yield
+            finally:
+                if fcntl: fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def seq(self):
+        return SEQ.unpack_from(self._mm, SEQ_OFF)[0]
+
+    def _write(self, body):
+        if len(body) > self.capacity: raise FrameTooLarge(f"frame de {len(body)} bytes (máx. {self.capacity})")
+        mm, seq = self._mm, self.seq()
+        seq += seq & 1                                  # un escritor que murió a mitad deja seq impar
+        SEQ.pack_into(mm, SEQ_OFF, seq + 1)             # impar: los lectores esperan/reintentan
+        LENGTH.pack_into(mm, LENGTH_OFF, len(body))
+        STAMP.pack_into(mm, STAMP_OFF, time.time())
+        mm[DATA_OFF:DATA_OFF + len(body)] = body
+        SEQ.pack_into(mm, SEQ_OFF, seq + 2)
+        return seq + 2
+
+    def read_frame(self):
+        """(seq, bytes) del último frame consistente."""
+        mm = self._mm
+        for _ in range(READ_RETRIES):
+            s1 = SEQ.unpack_from(mm, SEQ_OFF)[0]
+            if not s1 & 1:
+                n = min(LENGTH.unpack_from(mm, LENGTH_OFF)[0], self.capacity)
+                body = mm[DATA_OFF:DATA_OFF + n]
+                if SEQ.unpack_from(mm, SEQ_OFF)[0] == s1: return s1, body
+            self.retries += 1
+            time.sleep(0)
+        raise RuntimeError("telemetry_store: escritor bloqueado a mitad de frame")
+
+    def _decode(self, body):
+        try: return json.loads(body) if body else dict(self.defaults)
+        except ValueError: return dict(self.defaults)
+
+    def state(self):
+        """Frame decodificado (compartido dentro del proceso: no mutarlo, copiar con dict())."""
+        seq, cached = self._cache
+        if seq is not None and seq == self.seq(): return cached
+        seq, body = self.read_frame()
+        cached = self._decode(body)
+        self._cache = (seq, cached)
+        return cached
+
+    def update(self, merge):
+        """Read-modify-write atómico entre procesos: merge(dict) -> dict con el nuevo estado."""
+        with self._exclusive():
+            if self.seq() & 1:
+                # con el flock nadie más escribe: seq impar = escritor muerto a mitad; se parte de lo que dejó
+                state = self._decode(self._mm[DATA_OFF:DATA_OFF + min(LENGTH.unpack_from(self._mm, LENGTH_OFF)[0], self.capacity)])
+            else: state = dict(self.state())
+            state = merge(state)
+            body = json.dumps(state, separators=(",", ":")).encode("utf-8")
+            seq = self._write(body)
+            self._cache = (seq, state)
+            return state
+
+    def close(self):
+        self._mm.close()
+        if self._lock_fd != self._fd: os.close(self._lock_fd)
+        os.close(self._fd)
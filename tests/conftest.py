@@ -0,0 +1,53 @@
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """Una sola app por proceso (create_app() no admite otra config después): toda la sesión usa esta, con BD y subidas en tmp."""
+    import app as appmod
+    base = tmp_path_factory.mktemp("app")
+    appmod.create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + str(base / "test.db"),
+        "UPLOAD_FOLDER": str(base / "uploads"),
+        "TELEMETRY_SHM_PATH": str(base / "telemetry.shm"),
+    })
+    appmod.run_migrations()
+    return appmod.app
+
+
+@pytest.fixture
+def admin_client(app):
+    client = app.test_client()
+    client.post("/login", data={"username": "admin", "password": "LEGACY2026"})
+    return client
+
+
+@pytest.fixture
+def seed(app):
+    """seed(n, prefix): n usuarios con piloto, palmarés y logros, n // 5 eventos futuros con 3 pilotos."""
+    from app import db, Team, User, Driver, Palmares, Achievement, Event
+
+    def run(n, prefix):
+        with app.app_context():
+            team = Team.query.filter_by(name="Legacy eSports").one()
+            drivers = []
+            for i in range(n):
+                u = User(username=f"{prefix}{i}", email=f"{prefix}{i}@test", password_hash="x", team_id=team.id, is_approved=i % 2 == 0)
+                d = Driver(name=f"{prefix}-driver{i}", user=u)
+                d.palmares = [Palmares(title_name="t", image="x.jpg") for _ in range(3)]
+                d.achievements = [Achievement(title="a") for _ in range(3)]
+                db.session.add(d); drivers.append(d)
+            for i in range(n // 5):
+                day = date.today() + timedelta(days=i + 1)
+                db.session.add(Event(type=("Special", "Endurance", "Series", "Private")[i % 4], name=f"{prefix}-e{i}", track="x",
+                                     date_str=day.strftime("%d %b"), week=1, event_date=day, team_id=team.id, drivers=drivers[i:i + 3]))
+            db.session.add_all(Team(name=f"{prefix}-team{i}") for i in range(max(1, n // 10)))
+            db.session.commit()
+    return run
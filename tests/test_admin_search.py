@@ -0,0 +1,27 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def users(app):
+    from app import db, User
+    with app.app_context():
+        db.session.add_all(User(username=name, email=f"{name}@search.test", password_hash="x", requested_team=team)
+                           for name, team in [("pepe_lopez", None), ("pepeXlopez", None), ("Marta", "50% Racing"), ("luis", "500 Racing")])
+        db.session.commit()
+
+
+def search(app, q):
+    from app import admin_user_filters, admin_user_page
+    with app.test_request_context():
+        rows, _ = admin_user_page(admin_user_filters({"q": q}))
+        return sorted(r.username for r in rows)
+
+
+@pytest.mark.parametrize("q, expected", [
+    ("pepe_lopez", ["pepe_lopez"]),         # _ literal: ni se borra ni actúa como comodín
+    ("PEPE_", ["pepe_lopez"]),              # sigue sin distinguir mayúsculas
+    ("50%", ["Marta"]),
+    ("lopez@search", ["pepeXlopez", "pepe_lopez"]),
+])
+def test_search_treats_wildcards_literally(app, users, q, expected):
+    assert search(app, q) == expected
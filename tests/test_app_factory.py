@@ -0,0 +1,27 @@
+import pytest
+
+
+def test_second_call_with_same_config_returns_the_app(app):
+    import app as appmod
+    assert appmod.create_app() is app
+    assert appmod.create_app({"SQLALCHEMY_DATABASE_URI": app.config["SQLALCHEMY_DATABASE_URI"]}) is app
+
+
+@pytest.mark.parametrize("key", ["SQLALCHEMY_DATABASE_URI", "TELEMETRY_SHM_PATH"])
+def test_second_call_with_other_config_is_an_error(app, key):
+    import app as appmod
+    with pytest.raises(RuntimeError, match=key):
+        appmod.create_app({key: "/tmp/otra"})
+    assert app.config[key] != "/tmp/otra"
+
+
+def test_import_is_side_effect_free_and_lazy(tmp_path):
+    import json
+    import os
+    import subprocess
+    import sys
+    from bench_startup import HERE, LAZY_MODULES
+    probe = f"import json, sys; import app; print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    out = subprocess.run([sys.executable, "-c", probe], cwd=tmp_path, env={**os.environ, "PYTHONPATH": HERE}, capture_output=True, text=True, check=True)
+    assert json.loads(out.stdout.strip().splitlines()[-1]) == []                # NumPy, requests y Pillow se cargan bajo demanda
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+
+
+def test_post_materializes_event_date(app, admin_client):
+    from app import Event
+    day = date.today() + timedelta(days=3)
+    admin_client.post("/calendar", data={"type": "Series", "name": "t026-post", "track": "Monza", "date_str": day.strftime("%d %b") + ", Sábado",
+                                         "time_str": "20:00", "car_class": "GT3", "week": "1"})
+    with app.app_context():
+        assert Event.query.filter_by(name="t026-post").one().event_date == day
+
+
+def test_calendar_sorts_in_sql_and_drops_past_events(app, admin_client):
+    from app import db, Event, Team, Driver, event_drivers
+    today = date.today()
+    with app.app_context():
+        team = Team.query.filter_by(name="Legacy eSports").one()
+        driver = Driver(name="t026-driver"); db.session.add(driver)
+        for name, day, date_str in [("t026-late", today + timedelta(days=5), None), ("t026-nodate", None, "TBD"), ("t026-soon", today + timedelta(days=1), None),
+                                    ("t026-today", today, None), ("t026-past", today - timedelta(days=2), None)]:
+            ev = Event(type="Endurance", name=name, track="Spa", date_str=date_str or day.strftime("%d %b"), week=1, event_date=day, team_id=team.id)
+            if name == "t026-past": ev.drivers.append(driver)
+            db.session.add(ev)
+        db.session.commit()
+        past_id = Event.query.filter_by(name="t026-past").one().id
+
+    html = admin_client.get("/calendar").get_data(as_text=True)
+    order = [html.index(n) for n in ("t026-today", "t026-soon", "t026-late", "t026-nodate")]
+    assert order == sorted(order)                               # por fecha y sin fecha al final
+    assert "t026-past" not in html
+    with app.app_context():
+        assert Event.query.filter_by(name="t026-past").first() is None
+        assert db.session.execute(event_drivers.select().where(event_drivers.c.event_id == past_id)).first() is None
+        assert Event.query.filter_by(name="t026-today").one() is not None
+
+
+def test_parse_smart_date():
+    from app import parse_smart_date
+    year = max(date.today().year, 2026)
+    assert parse_smart_date("5 Dic, Domingo") == date(year, 12, 5)
+    assert parse_smart_date("12 ago") == date(year, 8, 12)
+    assert parse_smart_date("TBD") is None
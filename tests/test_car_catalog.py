@@ -0,0 +1,50 @@
+import sqlite3
+
+import app as appmod
+from car_catalog import CatalogCache, CarRow
+
+
+def test_cache_loads_once_per_version():
+    cache, calls = CatalogCache(), []
+    load = lambda: calls.append(1) or [CarRow(2, "GT3", "BMW", 120.0), CarRow(1, "GT3", "Audi", None), CarRow(3, "LMP2", "Oreca", 75.0)]
+    first = cache.get(1, load)
+    assert cache.get(1, load) is first and cache.loads == 1
+    assert first.by_category == {"GT3": ["BMW", "Audi"], "LMP2": ["Oreca"]} and first.by_id[3].tank_liters == 75.0
+    second = cache.get(2, lambda: [CarRow(1, "GT3", "Audi", None)])
+    assert cache.loads == 2 and second.etag != first.etag
+    cache.invalidate()
+    assert cache.get(2, load).etag == first.etag and cache.loads == 3       # mismo contenido, misma ETag
+
+
+def _other_worker(app, *sql):
+    """Cambia la tabla car como lo haría otro proceso: conexión propia, sin pasar por este CatalogCache."""
+    con = sqlite3.connect(app.config["SQLALCHEMY_DATABASE_URI"].removeprefix("sqlite:///"))
+    with con:
+        for stmt, args in sql: con.execute(stmt, args)
+    con.close()
+
+
+def test_version_stamp_reaches_other_workers(app, admin_client):
+    etag = admin_client.get("/api/cars").headers["ETag"]
+    loads = appmod.car_catalog.loads
+    r = admin_client.get("/api/cars", headers={"If-None-Match": etag})
+    assert r.status_code == 304 and appmod.car_catalog.loads == loads
+
+    _other_worker(app, ("INSERT INTO car (category, name, tank_liters) VALUES (?, ?, ?)", ("GT4", "Stamp Test", 110.0)))
+    assert admin_client.get("/api/cars", headers={"If-None-Match": etag}).status_code == 304   # sin sello: sigue la instantánea
+    _other_worker(app, ("INSERT INTO cache_version (name, version) VALUES ('cars', 1) ON CONFLICT(name) DO UPDATE SET version = version + 1", ()))
+    r = admin_client.get("/api/cars", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["ETag"] != etag and appmod.car_catalog.loads == loads + 1
+    assert [(c["category"], c["tank_liters"]) for c in r.get_json() if c["name"] == "Stamp Test"] == [("GT4", 110.0)]
+
+
+def test_garage_changes_bump_the_stamp(app, admin_client):
+    admin_client.post("/garage", data={"category": "TCR", "name": "Garage Test", "tank_liters": "50"})
+    with app.app_context():
+        version = appmod.db.session.get(appmod.CacheVersion, "cars").version
+        car = appmod.Car.query.filter_by(name="Garage Test").one()
+    cars = admin_client.get("/api/cars").get_json()
+    assert any(c["id"] == car.id for c in cars)
+    admin_client.post(f"/garage/delete/{car.id}")
+    with app.app_context(): assert appmod.db.session.get(appmod.CacheVersion, "cars").version == version + 1
+    assert not any(c["id"] == car.id for c in admin_client.get("/api/cars").get_json())
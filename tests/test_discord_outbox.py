@@ -0,0 +1,137 @@
+import json
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from sqlalchemy import create_engine
+
+import discord_outbox
+
+
+class StandIn(BaseHTTPRequestHandler):
+    """Webhook local: responde con la cola de respuestas del servidor y guarda lo recibido."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.received.append(body)
+        status, payload, delay = self.server.replies.pop(0) if self.server.replies else (204, None, 0)
+        if delay: time.sleep(delay)
+        data = json.dumps(payload).encode() if payload is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(data)))
+        self.end_headers(); self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def webhook():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    server.received, server.replies = [], []
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+    yield server
+    server.shutdown(); server.server_close()
+
+
+@pytest.fixture
+def outbox(tmp_path, webhook):
+    from app import Notification
+    path = str(tmp_path / "outbox.db")
+    Notification.__table__.create(create_engine("sqlite:///" + path))
+    worker = discord_outbox.OutboxWorker(path, f"http://127.0.0.1:{webhook.server_address[1]}/hook")
+
+    def add(title, key=None, due=0.0, attempts=0):
+        with sqlite3.connect(path) as conn:
+            conn.execute("INSERT INTO notification_outbox (payload, coalesce_key, digest_line, status, attempts, next_attempt_at) VALUES (?, ?, ?, 'pending', ?, ?)",
+                         (json.dumps({"embeds": [{"title": title}]}), key, title, attempts, due))
+
+    def rows():
+        with sqlite3.connect(path) as conn:
+            conn.row_factory = sqlite3.Row
+            return {r["digest_line"]: dict(r) for r in conn.execute("SELECT * FROM notification_outbox")}
+
+    worker.add, worker.rows = add, rows
+    return worker
+
+
+def test_delivered(outbox, webhook):
+    outbox.add("hola")
+    assert outbox.run_once() == 0
+    assert webhook.received == [{"embeds": [{"title": "hola"}]}]
+    assert outbox.rows()["hola"]["status"] == "sent"
+
+
+def test_server_error_backs_off(outbox, webhook):
+    webhook.replies.append((500, {"message": "boom"}, 0))
+    outbox.add("hola")
+    before = time.time()
+    outbox.run_once()
+    row = outbox.rows()["hola"]
+    assert (row["status"], row["attempts"], row["last_error"]) == ("pending", 1, "HTTP 500")
+    assert row["next_attempt_at"] >= before + discord_outbox.backoff_delay(1)
+    assert outbox.run_once() == discord_outbox.POLL_INTERVAL and len(webhook.received) == 1     # aún no vence
+    outbox.run_once(now=row["next_attempt_at"] + 0.1)
+    assert outbox.rows()["hola"]["status"] == "sent" and len(webhook.received) == 2
+
+
+def test_rate_limit_honours_retry_after(outbox, webhook):
+    webhook.replies.append((429, {"retry_after": 1.5, "global": False}, 0))
+    outbox.add("hola")
+    outbox.run_once()
+    row = outbox.rows()["hola"]
+    assert row["status"] == "pending" and row["attempts"] == 0
+    assert row["next_attempt_at"] == pytest.approx(outbox.paused_until) and outbox.paused_until > time.time() + 1
+    assert 1 < outbox.run_once() <= 1.5 and len(webhook.received) == 1                        # pausado sin tocar la red
+
+
+def test_client_error_is_dead(outbox, webhook):
+    webhook.replies.append((400, {"message": "Invalid Form Body"}, 0))
+    outbox.add("hola")
+    outbox.run_once()
+    row = outbox.rows()["hola"]
+    assert row["status"] == "dead" and "Invalid Form Body" in row["last_error"]
+
+
+def test_timeout_is_retried(outbox, webhook, monkeypatch):
+    monkeypatch.setattr(discord_outbox, "HTTP_TIMEOUT", 0.2)
+    webhook.replies.append((204, None, 0.5))
+    outbox.add("hola")
+    outbox.run_once()
+    row = outbox.rows()["hola"]
+    assert row["status"] == "pending" and row["attempts"] == 1 and "timed out" in row["last_error"].lower()
+
+
+def test_due_rows_with_same_key_go_out_as_one_digest(outbox, webhook):
+    for name in ("ana", "bea", "carlos"): outbox.add(name, key="register")
+    outbox.add("otra clave", key="other")
+    outbox.run_once()
+    [digest] = webhook.received
+    assert digest["embeds"][0]["title"] == "ana ×3" and digest["embeds"][0]["description"] == "• ana\n• bea\n• carlos"
+    assert [r["status"] for r in outbox.rows().values()] == ["sent", "sent", "sent", "pending"]
+
+
+def test_coalescing_does_not_pull_rows_forward(outbox, webhook):
+    now = time.time()
+    outbox.add("vencida", key="register", due=now - 1)
+    outbox.add("en backoff", key="register", due=now + 60, attempts=2)
+    outbox.add("otra ventana", key="register", due=now + 30)
+    outbox.run_once(now=now)
+    assert webhook.received == [{"embeds": [{"title": "vencida"}]}]
+    rows = outbox.rows()
+    assert rows["en backoff"]["status"] == rows["otra ventana"]["status"] == "pending"
+
+
+def test_queue_joins_the_open_coalescing_window(app, monkeypatch):
+    import app as appmod
+    monkeypatch.setattr(appmod, "DISCORD_WEBHOOK_URL", "http://127.0.0.1:9/hook")
+    monkeypatch.setattr(discord_outbox, "ensure_worker", lambda *a: None)
+    with app.app_context():
+        appmod.queue_discord({"embeds": [{"title": "a"}]}, coalesce_key="window-test", digest_line="a")
+        time.sleep(0.01)
+        appmod.queue_discord({"embeds": [{"title": "b"}]}, coalesce_key="window-test", digest_line="b")
+        due = {n.digest_line: n.next_attempt_at for n in appmod.Notification.query.filter_by(coalesce_key="window-test")}
+        appmod.Notification.query.filter_by(coalesce_key="window-test").delete(); appmod.db.session.commit()
+    assert due["a"] == due["b"]
@@ -0,0 +1,15 @@
+import pytest
+
+BASE = {"mode": "time", "duration": 60, "lap_time": "1:45", "consumption": 3.0, "tank": 100}
+
+
+@pytest.mark.parametrize("body", [{**BASE, "car_ids": ["gt3"]}, {**BASE, "car_ids": 5}, {**BASE, "tanks": ["x"]}, {**BASE, "tanks": [{}]}, [BASE]])
+def test_bad_tank_input_is_a_400(admin_client, body):
+    resp = admin_client.post("/api/fuel/sweep", json=body)
+    assert resp.status_code == 400
+    assert resp.get_json()["ok"] is False
+
+
+def test_valid_sweep(admin_client):
+    resp = admin_client.post("/api/fuel/sweep", json={**BASE, "tanks": [100, "110"]})
+    assert resp.status_code == 200 and resp.get_json()["ok"]
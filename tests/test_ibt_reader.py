@@ -0,0 +1,69 @@
+import struct
+
+import numpy as np
+import pytest
+
+import ibt_reader
+
+CHANNELS = [("Lap", 2, "<i4"), ("SessionTime", 5, "<f8"), ("FuelLevel", 4, "<f4"), ("Speed", 4, "<f4")]
+
+
+def write_ibt(path, laps, hz=10, var_offset=None, buf_off=None):
+    """Sesión sintética: laps = nº de muestras de cada vuelta. var_offset/buf_off falsean la cabecera."""
+    offsets, buf_len = [], 0
+    for _, _, fmt in CHANNELS: offsets.append(buf_len); buf_len += np.dtype(fmt).itemsize
+    var_off = ibt_reader.HEADER_SIZE + ibt_reader.DISK_SUBHEADER.size
+    buf_off_real = var_off + len(CHANNELS) * ibt_reader.VAR_HEADER.size
+    n = sum(laps)
+    rec_off = buf_off if buf_off is not None else buf_off_real
+    rec = np.zeros(n, dtype=np.dtype({"names": [c[0] for c in CHANNELS], "formats": [c[2] for c in CHANNELS], "offsets": offsets, "itemsize": buf_len}))
+    rec["Lap"] = np.repeat(np.arange(1, len(laps) + 1), laps)
+    rec["SessionTime"] = np.arange(n) / hz
+    rec["FuelLevel"] = 50 - np.arange(n) * 0.01
+    rec["Speed"] = 40 + (np.arange(n) % 7)
+    with open(path, "wb") as f:
+        f.write(ibt_reader.HEADER.pack(2, 1, hz, 0, 0, 0, len(CHANNELS), var_off, 1, buf_len, 0, 0))
+        f.write(ibt_reader.VARBUF.pack(n, rec_off, 0, 0) + b"\0" * ibt_reader.VARBUF.size * 3)
+        f.write(ibt_reader.DISK_SUBHEADER.pack(0, 0.0, n / hz, len(laps), n))
+        for (name, vtype, _), off in zip(CHANNELS, offsets):
+            off = var_offset if var_offset is not None and name == "Speed" else off
+            f.write(ibt_reader.VAR_HEADER.pack(vtype, off, 1, False, name.encode(), b"", b""))
+        f.write(rec.tobytes())
+
+
+@pytest.mark.parametrize("window", [7, 25, 64, 4096])
+def test_lap_summaries_independent_of_window(tmp_path, window):
+    # la vuelta 2 ocupa varias ventanas enteras con window=7/25: antes dejaba un tramo vacío y petaba con IndexError
+    path = tmp_path / "s.ibt"
+    write_ibt(path, [30, 100, 12, 5])
+    with ibt_reader.IbtFile(path) as ibt:
+        laps = ibt.lap_summaries(window=window)["laps"]
+    assert laps["lap"] == [1, 2, 3, 4]
+    assert laps["samples"] == [30, 100, 12, 5]
+    assert laps["lap_time"] == [3.0, 10.0, 1.2, None]
+    assert laps["fuel_used"] == pytest.approx([0.29, 0.99, 0.11, 0.04], abs=1e-3)
+    assert laps["speed_min_kmh"] == [144.0, 144.0, 144.0, 151.2] and laps["speed_max_kmh"][1] == 165.6
+
+
+def test_single_lap_longer_than_every_window(tmp_path):
+    path = tmp_path / "s.ibt"
+    write_ibt(path, [50])
+    with ibt_reader.IbtFile(path) as ibt:
+        laps = ibt.lap_summaries(window=8)["laps"]
+    assert laps["lap"] == [1] and laps["samples"] == [50]
+
+
+@pytest.mark.parametrize("bad", [{"var_offset": 100}, {"var_offset": -4}, {"buf_off": 10 ** 6}])
+def test_malformed_header_is_ibt_error(tmp_path, bad):
+    # antes: ValueError de NumPy ("dtype descriptor requires…", "offset must be non-negative…") -> 500 en setup_doctor_ibt
+    path = tmp_path / "bad.ibt"
+    write_ibt(path, [30, 20], **bad)
+    with pytest.raises(ibt_reader.IbtError, match="inválida"):
+        ibt_reader.IbtFile(path)
+
+
+def test_malformed_upload_is_a_400(admin_client, tmp_path):
+    path = tmp_path / "bad.ibt"
+    write_ibt(path, [30, 20], var_offset=100)
+    resp = admin_client.post("/api/setup-doctor/ibt", data=path.read_bytes(), headers={"Content-Type": "application/octet-stream", "X-Filename": "bad.ibt"})
+    assert resp.status_code == 400 and "inválida" in resp.get_json()["error"]
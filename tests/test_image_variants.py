@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+import image_variants
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_variants, "_index", None)
+    monkeypatch.setattr(image_variants, "_index_mtime", None)
+    Image.new("RGB", (900, 600), (200, 40, 40)).save(tmp_path / "a.jpg")
+    Image.new("RGB", (300, 300), (40, 200, 40)).save(tmp_path / "b.png")
+    return str(tmp_path)
+
+
+def test_variants_generated_by_another_process_are_seen(upload_dir):
+    assert image_variants.variants(upload_dir, "a.jpg") == {}          # índice ya escaneado, vacío
+    image_variants.generate(upload_dir, "a.jpg")
+    image_variants._index.clear()                                        # como si lo hubiera generado otro worker
+    found = image_variants.variants(upload_dir, "a.jpg")
+    assert found["card"] == (480, "v/a.jpg.card-480") and set(found) == {"full", "card", "avatar"}
+
+
+def test_generate_leaves_no_temp_files(upload_dir):
+    image_variants.generate(upload_dir, "b.png")
+    names = os.listdir(os.path.join(upload_dir, image_variants.VARIANT_DIR))
+    assert len(names) == 6 and not [n for n in names if n.endswith(".tmp")]
+
+
+@pytest.mark.skipif(image_variants.fcntl is None, reason="sin flock")
+def test_backfill_runs_in_a_single_process(upload_dir):
+    first, second = image_variants.VariantWorker(upload_dir), image_variants.VariantWorker(upload_dir)
+    first.backfill(); second.backfill()                                  # flock por descripción: se comportan como dos workers
+    assert first.queue.qsize() == 2 and second.queue.qsize() == 0
+    os.close(first._backfill_fd)
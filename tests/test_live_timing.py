@@ -0,0 +1,36 @@
+import re
+
+import app as appmod
+
+NONCE_RE = re.compile(r'nonce="([^"]+)"')
+
+
+def test_page_is_rendered_once_and_nonce_is_fresh(admin_client, monkeypatch):
+    monkeypatch.setattr(appmod, "_live_timing_parts", None)
+    renders = []
+    real = appmod.render_template
+    monkeypatch.setattr(appmod, "render_template", lambda *a, **kw: renders.append(a[0]) or real(*a, **kw))
+    first, second = admin_client.get("/live-timing"), admin_client.get("/live-timing")
+    assert first.status_code == second.status_code == 200 and renders == ["live_timing.html"]
+
+    bodies, nonces = [], []
+    for r in (first, second):
+        body = r.get_data(as_text=True)
+        nonce = re.search(r"'nonce-([^']+)'", r.headers["Content-Security-Policy"]).group(1)
+        assert appmod.LIVE_TIMING_NONCE not in body
+        assert set(NONCE_RE.findall(body)) == {nonce}                     # todos los <script> llevan el nonce de la cabecera
+        bodies.append(body.replace(nonce, "N")); nonces.append(nonce)
+    assert nonces[0] != nonces[1] and bodies[0] == bodies[1]
+
+
+def test_inject_script_is_a_fingerprinted_asset(admin_client):
+    body = admin_client.get("/live-timing").get_data(as_text=True)
+    src = re.search(r'src="([^"]*live_timing_inject[^"]*)"', body).group(1)
+    assert src.startswith("/assets/") and "function fetchStrategies" not in body  # el JS ya no va inline
+    r = admin_client.get(src)
+    assert r.status_code == 200 and "immutable" in r.headers["Cache-Control"]
+
+
+def test_csp_only_on_live_timing(admin_client):
+    r = admin_client.get("/drivers")
+    assert r.status_code == 200 and "Content-Security-Policy" not in r.headers
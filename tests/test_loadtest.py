@@ -0,0 +1,52 @@
+import argparse
+import asyncio
+import json
+import os
+
+import pytest
+
+import loadtest
+import telemetry_service
+from telemetry_store import merge_frame
+
+
+def test_sim_bridge_payload_has_bridge_shape():
+    sim = loadtest.SimBridge(3, cars=12)
+    sim.t0 -= 250                                            # dos vueltas y pico de carrera
+    p = sim.payload()
+    grid = p["grid"]
+    assert [c["pos"] for c in grid] == list(range(1, 13)) and grid[0]["gap"] == "LDR"
+    assert sum(c["is_me"] for c in grid) == 1 and p["my_car"]["laps"] >= 2
+    assert all(c["last_lap"] != "-" for c in grid) and loadtest.fmt_time(83.4567) == "1:23.457"
+    state = merge_frame({}, p, 1.0)
+    assert state["track_name"] == p["track_name"] and state["session_type"] == "RACE" and state["connected"]
+
+
+def test_proc_usage_counts_this_process():
+    if not os.path.isdir("/proc"): pytest.skip("sin /proc")
+    pids = loadtest._proc_tree(os.getpid())
+    ticks, rss = loadtest._usage(pids)
+    assert pids[0] == os.getpid() and rss > 0 and ticks >= 0
+
+
+async def _against_service(args):
+    svc = telemetry_service.TelemetryService()
+    server = await asyncio.start_server(svc.handle, "127.0.0.1", 0)
+    args.url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+    async with server: result = await loadtest.run(args)
+    return result, svc
+
+
+def test_run_against_telemetry_service(tmp_path, capsys):
+    args = argparse.Namespace(bridges=2, rate=10.0, viewers=8, poll=0.1, cars=10, duration=1.0, server_pid=os.getpid(), json=str(tmp_path / "out.json"), url=None)
+    (stats, server, client_cpu), svc = asyncio.run(_against_service(args))
+    assert stats.errors == {"ingest": 0, "live": 0}
+    assert 10 <= len(stats.lat["ingest"]) <= 22 and len(stats.lat["live"]) >= 30          # ~10 Hz × 2 bridges, ~8 viewers × 10 Hz
+    assert svc.seq == len(stats.lat["ingest"])
+    assert stats.age and min(stats.age) >= 0 and max(stats.age) < 1.0                      # los viewers ven frames recientes
+    assert server["rss_max"] > 0 and "cpu_pct" in server
+
+    loadtest.report(args, stats, server, client_cpu)
+    assert "errores 0 (0.00%)" in capsys.readouterr().out
+    out = json.loads((tmp_path / "out.json").read_text())
+    assert out["ingest"]["errors"] == 0 and len(out["live"]["latency_ms"]) == 3 and out["config"]["viewers"] == 8
@@ -0,0 +1,84 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from werkzeug.security import generate_password_hash
+
+import migrations
+
+BASELINE_DB = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "instance", "legacy_strategy.db")
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    """Copia de la BD heredada (esquema sin migrar) y una carpeta de subidas con nombres por timestamp."""
+    from app import parse_smart_date
+    db_path, uploads = tmp_path / "legacy.db", tmp_path / "uploads"
+    shutil.copy(BASELINE_DB, db_path)
+    uploads.mkdir()
+    conn = sqlite3.connect(db_path)
+    photos = [r[0] for r in conn.execute("SELECT photo FROM driver WHERE photo != 'default_driver.png' ORDER BY id")]
+    images = [r[0] for r in conn.execute("SELECT image FROM palmares ORDER BY id")]
+    conn.close()
+    for i, name in enumerate(photos + images):
+        # las dos primeras fotos son el mismo archivo subido dos veces
+        (uploads / name).write_bytes(b"foto-repetida" if i < 2 else f"contenido-{i}".encode())
+    ctx = SimpleNamespace(parse_smart_date=parse_smart_date, generate_password_hash=generate_password_hash, upload_folder=str(uploads))
+    return SimpleNamespace(engine=create_engine(f"sqlite:///{db_path}"), path=db_path, uploads=uploads, ctx=ctx, photos=photos, images=images)
+
+
+def test_baseline_db_migrates_to_current_models(legacy):
+    from app import db
+    applied = migrations.run_migrations(legacy.engine, legacy.ctx, log=lambda *_: None)
+    assert applied == [m.version for m in migrations.MIGRATIONS]
+    assert migrations.run_migrations(legacy.engine, legacy.ctx, log=lambda *_: None) == []          # idempotente
+    conn = sqlite3.connect(legacy.path)
+    for table in db.metadata.sorted_tables:
+        cols = {r[1] for r in conn.execute(f"PRAGMA table_info('{table.name}')")}
+        assert cols >= {c.name for c in table.columns}, table.name
+    assert conn.execute("SELECT COUNT(*) FROM driver").fetchone()[0] == 10 and conn.execute("SELECT COUNT(*) FROM event").fetchone()[0] == 50
+    events = conn.execute("SELECT date_str, event_date FROM event").fetchall()
+    parsed = [(legacy.ctx.parse_smart_date(s), d) for s, d in events]
+    assert all((p.isoformat() if p else None) == d for p, d in parsed) and sum(d is not None for _, d in parsed) > 40
+    assert conn.execute("SELECT role, is_approved FROM user WHERE username = 'admin'").fetchone() == ("admin", 1)
+
+
+def test_legacy_uploads_become_deduplicated_blobs(legacy):
+    migrations.run_migrations(legacy.engine, legacy.ctx, log=lambda *_: None)
+    conn = sqlite3.connect(legacy.path)
+    photos = [r[0] for r in conn.execute("SELECT photo FROM driver WHERE photo != 'default_driver.png' ORDER BY id")]
+    images = [r[0] for r in conn.execute("SELECT image FROM palmares ORDER BY id")]
+    sha = hashlib.sha256(b"foto-repetida").hexdigest()
+    assert photos[0] == photos[1] and photos[0].startswith(sha)
+    assert len(set(photos + images)) == len(photos + images) - 1
+    for name in photos + images:
+        assert (legacy.uploads / name).is_file()
+    assert sorted(os.listdir(legacy.uploads)) == sorted(set(photos + images))                 # originales borrados tras el commit
+    blobs = {r[0] for r in conn.execute("SELECT name FROM upload_blob")}
+    assert blobs == set(photos + images)
+
+
+def test_failed_upload_step_keeps_legacy_files(legacy, monkeypatch):
+    import upload_store
+    real_adopt, calls = upload_store.adopt, []
+
+    def flaky(folder, name):
+        calls.append(name)
+        if len(calls) == 3: raise OSError("disco lleno")
+        return real_adopt(folder, name)
+    monkeypatch.setattr(upload_store, "adopt", flaky)
+    with pytest.raises(OSError):
+        migrations.run_migrations(legacy.engine, legacy.ctx, log=lambda *_: None)
+    conn = sqlite3.connect(legacy.path)
+    assert conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] == 11
+    assert [r[0] for r in conn.execute("SELECT photo FROM driver WHERE photo != 'default_driver.png' ORDER BY id")] == legacy.photos
+    for name in legacy.photos + legacy.images:
+        assert (legacy.uploads / name).is_file()                                                   # nada borrado: el paso no hizo commit
+    conn.close()
+    monkeypatch.setattr(upload_store, "adopt", real_adopt)
+    assert 12 in migrations.run_migrations(legacy.engine, legacy.ctx, log=lambda *_: None)       # reintento: reutiliza los blobs copiados
+    assert not [n for n in os.listdir(legacy.uploads) if not upload_store.is_blob(n)]
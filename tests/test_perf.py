@@ -0,0 +1,43 @@
+import pytest
+
+from perf import Histogram
+
+
+def test_histogram_percentiles_within_one_bucket():
+    h = Histogram()
+    for v in range(1, 1001): h.add(float(v))
+    s = h.summary()
+    assert s["count"] == 1000 and s["avg"] == 500.5 and s["max"] == 1000.0
+    for p in (50, 95, 99):
+        exact = p * 10
+        assert exact <= h.percentile(p) <= exact * Histogram.FACTOR        # límite superior del bucket: como mucho un 20% por encima
+
+
+def test_histogram_small_values_and_empty():
+    h = Histogram(lo=1)
+    assert h.percentile(99) == 0.0
+    for _ in range(10): h.add(0)
+    assert h.percentile(50) == 0 and h.summary()["max"] == 0
+
+
+def test_requests_are_recorded_per_endpoint(admin_client):
+    admin_client.post("/admin/perf")                                     # reinicia
+    for _ in range(3): admin_client.get("/drivers")
+    snap = admin_client.get("/admin/perf.json").get_json()
+    drivers = snap["endpoints"]["drivers"]
+    assert drivers["wall_ms"]["count"] == 3 and drivers["errors"] == 0
+    assert drivers["sql_count"]["max"] >= 1 and drivers["template_ms"]["max"] > 0 and drivers["bytes"]["max"] > 1000
+    slow = [e for e in snap["slow"] if e["endpoint"] == "drivers"]
+    assert len(slow) == 3 and all(e["sql"] and e["sql"][0][1].startswith("SELECT") for e in slow)
+
+
+def test_reset_and_dashboard(admin_client):
+    admin_client.get("/drivers")
+    assert admin_client.post("/admin/perf").status_code == 302
+    assert "drivers" not in admin_client.get("/admin/perf.json").get_json()["endpoints"]
+    assert admin_client.get("/admin/perf").status_code == 200
+
+
+@pytest.mark.parametrize("url", ["/admin/perf", "/admin/perf.json"])
+def test_dashboard_needs_login(app, url):
+    assert app.test_client().get(url).status_code == 302
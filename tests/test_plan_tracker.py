@@ -0,0 +1,61 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import plan_tracker
+import telemetry_store
+
+PAYLOAD = {"params": {"tankSize": 100, "lapTimeGlobal": "2:00", "consLap": 3},
+           "relays": [{"driver": "Ana", "laps": 30, "fuel": 95, "start": "12:00", "end": "13:00"},
+                      {"driver": "Luis", "laps": 30, "fuel": 95, "start": "13:01", "end": "14:01"}]}
+
+
+@pytest.mark.parametrize("tz_offset, utc_hour", [(-120, 10), (0, 12), (300, 17)])
+def test_drift_uses_the_team_clock_not_the_server(tz_offset, utc_hour):
+    # 12:00 en el reloj del equipo, sea cual sea la zona del servidor
+    now = datetime(2026, 6, 1, utc_hour, tzinfo=timezone.utc).timestamp()
+    plan = plan_tracker.ActivePlan(1, "plan", PAYLOAD, tz_offset)
+    stints = plan.snapshot(0, 95.0, None, now)["stints"]
+    assert stints[0]["end_projected"] == "13:00" and stints[0]["drift_s"] == 0
+    assert stints[1]["end_projected"] == "14:01" and stints[1]["drift_s"] == 0
+
+
+def test_state_round_trip_through_json():
+    plan = plan_tracker.ActivePlan(1, "plan", PAYLOAD, -60)
+    plan.on_lap(1, 92.0, None, False, 1000.0)
+    plan.on_lap(2, 89.1, None, False, 1121.0)
+    again = plan_tracker.ActivePlan.from_state(json.loads(json.dumps(plan.to_state())))
+    assert again.to_state() == plan.to_state()
+    assert again.on_lap(3, 86.2, None, False, 1242.0) == plan.on_lap(3, 86.2, None, False, 1242.0)
+
+
+def test_plan_is_shared_between_workers(app, admin_client):
+    """Activación, ingest y lectura desde 'workers' distintos: cada uno con su propio TelemetryStore sobre el mismo archivo."""
+    from app import db, Strategy, User
+    with app.app_context():
+        admin = User.query.filter_by(username="admin").one()
+        s = Strategy(name="relevos", car_class="GT3", car_name="x", payload=json.dumps(PAYLOAD), user_id=admin.id, team_id=admin.team_id)
+        db.session.add(s); db.session.commit(); sid = s.id
+
+    assert admin_client.post("/api/telemetry/plan", json={"strategy_id": sid, "tz_offset": "x"}).status_code == 400
+    resp = admin_client.post("/api/telemetry/plan", json={"strategy_id": sid, "tz_offset": -120})
+    assert resp.status_code == 200 and resp.get_json()["ok"]
+    other_worker = telemetry_store.TelemetryStore(app.config["TELEMETRY_SHM_PATH"])
+    try:
+        assert plan_tracker.projection(other_worker.state(), "default")["strategy_id"] == sid
+
+        for laps, fuel in ((1, 92.0), (2, 89.0)):
+            admin_client.post("/api/telemetry/ingest", json={"laps": laps, "fuel": fuel})
+        shared = other_worker.state()
+        assert shared["plans"]["default"]["last_laps"] == 2
+        assert plan_tracker.projection(shared, "default")["laps"] == 2
+
+        live = admin_client.get("/api/telemetry/live").get_json()
+        assert "plans" not in live and live["plan"]["laps"] == 2
+
+        assert admin_client.delete("/api/telemetry/plan").get_json()["ok"]
+        assert plan_tracker.projection(other_worker.state(), "default") is None
+    finally:
+        other_worker.close()
+
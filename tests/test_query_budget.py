@@ -0,0 +1,19 @@
+import pytest
+
+# Las vistas con @query_budget tienen que hacer las mismas consultas con N filas que con 10xN.
+ROUTES = ["/drivers", "/calendar", "/admin"]
+
+
+def query_count(client, url):
+    resp = client.get(url)
+    assert resp.status_code == 200, resp.status_code
+    return int(resp.headers["X-Query-Count"])
+
+
+@pytest.mark.parametrize("url", ROUTES)
+def test_query_count_independent_of_rows(admin_client, seed, url):
+    prefix = url.strip("/")
+    seed(10, prefix + "a")
+    small = query_count(admin_client, url)
+    seed(90, prefix + "b")
+    assert query_count(admin_client, url) == small
@@ -0,0 +1,74 @@
+import pytest
+
+import race_archive
+
+A, B, C = ("Ana Team", 9101), ("Bea Team", 9102), ("Carlos Solo", 9103)
+
+
+def car(idx, who, lap, t=0.0, on_pit=False, incidents=0, pos=None):
+    return {"car_idx": idx, "name": who[0], "cust_id": who[1], "num": str(idx + 7), "pos": pos or idx + 1, "lap": lap,
+            "last_lap_s": t, "best_lap_s": 0.0, "on_pit": on_pit, "incidents": incidents}
+
+
+def team_race():
+    """Coche 0: Ana 4 vueltas, relevo en boxes, Bea 4 vueltas. Coche 1: Carlos solo. La vuelta 8 acaba en el frame de cool down."""
+    frames = [[car(0, A, 0), car(1, C, 0)]]
+    for lap in range(1, 9):
+        t = 90 + lap % 3 * 0.2
+        driver, inc = (A, 2 if lap >= 3 else 0) if lap <= 4 else (B, 1 if lap >= 7 else 0)
+        frames.append([car(0, driver, lap, t, incidents=inc), car(1, C, lap, t + 1, incidents=0)])
+        if lap == 4:
+            frames.append([car(0, A, 4, t, True, 2), car(1, C, 4, t + 1)])
+            frames.append([car(0, B, 4, t, True, 0), car(1, C, 4, t + 1)])           # relevo con el coche parado
+            frames.append([car(0, B, 4, t, False, 0), car(1, C, 4, t + 1)])
+    return frames
+
+
+def record(tmp_path, frames, session_type="RACE"):
+    rec, prev, closed = race_archive.SessionRecorder(str(tmp_path)), {}, []
+    for i, grid in enumerate(frames):
+        data = {"session_id": "s-1", "session_type": session_type, "track_name": "Spa", "grid": grid,
+                "session_state": race_archive.SESSION_COOLDOWN if i == len(frames) - 1 else 4}
+        closed += rec.on_frame(prev, data, 1000.0 + i)
+        prev = data
+    return closed
+
+
+def test_lap_completed_on_cooldown_frame_is_journaled(tmp_path):
+    [path] = record(tmp_path, team_race())
+    arch = race_archive.build_archive(race_archive.read_journal(path))
+    assert [r["lap"] for r in arch.laps if r["car_idx"] == 1] == list(range(1, 9))
+
+
+def test_team_car_is_split_per_driver(tmp_path):
+    [path] = record(tmp_path, team_race())
+    arch = race_archive.build_archive(race_archive.read_journal(path))
+    drivers = {(d["car_idx"], d["iracing_name"]): d for d in arch.drivers}
+    assert set(drivers) == {(0, A[0]), (0, B[0]), (1, C[0])}
+    ana, bea = drivers[(0, A[0])], drivers[(0, B[0])]
+    assert (ana["seat"], ana["cust_id"], ana["laps"], ana["incidents"]) == (1, A[1], 4, 2)
+    assert (bea["seat"], bea["cust_id"], bea["laps"], bea["incidents"]) == (2, B[1], 4, 1)
+    assert [(s["seat"], s["start_lap"], s["end_lap"]) for s in arch.stints if s["car_idx"] == 0] == [(1, 1, 4), (2, 5, 8)]
+    assert {r["lap"] for r in arch.laps if r["car_idx"] == 0 and r["seat"] == 2} == {5, 6, 7, 8}
+    result = next(r for r in arch.results if r["car_idx"] == 0)
+    assert result["laps"] == 8 and result["incidents"] == 3
+
+
+def test_archive_credits_each_driver_only_with_their_stints(app, tmp_path):
+    from app import db, archive_race, Driver, DriverRaceStats, RaceResult, RaceDriverResult
+    [path] = record(tmp_path, team_race())
+    with app.app_context():
+        ids = {}
+        for name, cust_id in (A, B, C):
+            d = Driver(name=name, iracing_id=str(cust_id)); db.session.add(d); db.session.flush(); ids[name] = d.id
+        db.session.commit()
+        rs = archive_race(path)
+        assert rs is not None
+        stats = {s.driver_id: s for s in DriverRaceStats.query.filter(DriverRaceStats.driver_id.in_(ids.values()))}
+        assert (stats[ids[A[0]]].laps, stats[ids[A[0]]].incidents) == (4, 2)
+        assert (stats[ids[B[0]]].laps, stats[ids[B[0]]].incidents) == (4, 1)
+        assert (stats[ids[C[0]]].laps, stats[ids[C[0]]].races) == (8, 1)
+        assert stats[ids[A[0]]].seconds == pytest.approx(sum(90 + lap % 3 * 0.2 for lap in range(1, 5)))
+        cars = {r.car_idx: r.driver_id for r in RaceResult.query.filter_by(session_id=rs.id)}
+        assert cars == {0: None, 1: ids[C[0]]}            # el coche compartido no se atribuye a nadie
+        assert RaceDriverResult.query.filter_by(session_id=rs.id, car_idx=0).count() == 2
@@ -0,0 +1,69 @@
+import json
+import random
+
+import revisions
+from revisions import json_diff, json_patch
+
+
+def _random_doc(rng, depth=0):
+    r = rng.random()
+    if depth > 3 or r < 0.3: return rng.choice([0, 1, 2.5, "a", "b/c", "~x", None, True])
+    if r < 0.65: return [_random_doc(rng, depth + 1) for _ in range(rng.randint(0, 5))]
+    return {rng.choice(["k", "a/b", "m~n", "~1", "stints", "fuel"]) + str(i): _random_doc(rng, depth + 1) for i in range(rng.randint(0, 4))}
+
+
+def test_diff_patch_round_trip():
+    rng = random.Random(7)
+    for _ in range(300):
+        a, b = _random_doc(rng), _random_doc(rng)
+        ops = json_diff(a, b)
+        assert json_patch(a, ops) == b
+        assert json.loads(revisions.encode(json_patch(json.loads(json.dumps(a)), json.loads(json.dumps(ops)), in_place=True))) == b
+
+
+def test_diff_escapes_keys_and_resizes_lists():
+    a = {"a/b": 1, "m~n": [1, 2, 3, 4], "keep": {"x": 1}}
+    b = {"a/b": 2, "m~n": [1, 9], "keep": {"x": 1}, "new": [0]}
+    ops = json_diff(a, b)
+    assert {"op": "replace", "path": "/a~1b", "value": 2} in ops
+    assert [o["path"] for o in ops if o["op"] == "remove"] == ["/m~0n/3", "/m~0n/2"]   # de atrás hacia delante
+    assert not any(o["path"].startswith("/keep") for o in ops)
+    assert json_patch(a, ops) == b and a["m~n"] == [1, 2, 3, 4]                       # sin in_place no toca el original
+    assert json_diff({"x": 1}, [1]) == [{"op": "replace", "path": "", "value": [1]}]
+
+
+def test_needs_snapshot():
+    K = revisions.SNAPSHOT_EVERY
+    assert revisions.needs_snapshot(1, None, 0, 100)
+    assert not revisions.needs_snapshot(K, 1, 50, 100)
+    assert revisions.needs_snapshot(K + 1, 1, 50, 100)
+    assert revisions.needs_snapshot(3, 1, 101, 100)
+
+
+def _plan(i):
+    return {"race": {"laps": 100 + i, "fuel": 2.8}, "stints": [{"driver": f"D{j}", "laps": 20 + i % 3} for j in range(1 + i % 5)], "notes": "x" * 400, "tag/" + str(i % 2): i}
+
+
+def test_every_revision_rebuilds_and_restore(admin_client):
+    sid = admin_client.post("/estrategia/guardar", json={"name": "Rev", "payload": _plan(0)}).get_json()["id"]
+    history = {1: _plan(0)}
+    for v in range(2, 26):
+        assert admin_client.post(f"/estrategia/actualizar/{sid}", json={"name": "Rev", "payload": _plan(v)}).get_json()["ok"]
+        history[v] = _plan(v)
+
+    listing = admin_client.get(f"/api/estrategia/{sid}/revisiones").get_json()
+    assert listing["current"] == 25
+    kinds = {r["rev"]: r["kind"] for r in listing["revisions"]}
+    assert sorted(kinds) == list(range(1, 26))
+    snaps = sorted(r for r, k in kinds.items() if k == "snapshot")
+    assert snaps[0] == 1 and len(snaps) < 25
+    assert all(b - a <= revisions.SNAPSHOT_EVERY for a, b in zip(snaps, snaps[1:] + [26]))   # como mucho K-1 parches seguidos
+
+    for rev, payload in history.items():
+        got = admin_client.get(f"/api/estrategia/{sid}/revisiones/{rev}").get_json()
+        assert got["payload"] == payload, rev
+    assert admin_client.get(f"/api/estrategia/{sid}/revisiones/99").status_code == 404
+
+    assert admin_client.post(f"/estrategia/{sid}/restaurar/7").get_json() == {"ok": True, "version": 26}
+    assert admin_client.get(f"/api/estrategia/{sid}/revisiones/26").get_json()["payload"] == history[7]
+    assert admin_client.get(f"/api/estrategia/{sid}/revisiones/25").get_json()["payload"] == history[25]   # el historial no se reescribe
@@ -0,0 +1,53 @@
+import os
+import threading
+
+import pytest
+
+static_assets = pytest.importorskip("static_assets")
+
+
+@pytest.fixture
+def static(tmp_path):
+    (tmp_path / "js").mkdir()
+    (tmp_path / "js" / "app.js").write_text("console.log('x');\n" * 100)
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "site.css").write_text("body{margin:0}\n" * 100)
+    return tmp_path
+
+
+def test_prune_keeps_in_flight_temp_files(static):
+    static_assets.AssetManifest(str(static)).build()
+    inflight = static / "dist" / "js" / "app.0123456789ab.js.999-deadbeef.tmp"
+    inflight.write_text("otro worker a mitad de escritura")
+    stale = static / "dist" / "js" / "app.0123456789ab.js"
+    stale.write_text("huella vieja")
+    static_assets.AssetManifest(str(static)).build()
+    assert inflight.exists() and not stale.exists()
+
+
+def test_concurrent_builds_agree(static):
+    manifests, errors = [static_assets.AssetManifest(str(static)) for _ in range(8)], []
+    def run(m):
+        try: m.build()
+        except Exception as e: errors.append(e)
+    threads = [threading.Thread(target=run, args=(m,)) for m in manifests]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert not errors and len({m.version for m in manifests}) == 1
+    for root, _, names in os.walk(static / "dist"):
+        assert not [n for n in names if n.endswith(".tmp")]
+
+
+def test_dist_copy_is_not_linked_to_the_source(static):
+    m = static_assets.AssetManifest(str(static)).build()
+    src, out = static / "js" / "app.js", static / "dist" / m.hashed("js/app.js")
+    with open(src, "r+") as f: f.write("alert('editado en sitio');")        # misma inode, contenido nuevo
+    assert out.read_text().startswith("console.log('x');")
+
+
+def test_hard_links_from_older_builds_are_replaced(static):
+    m = static_assets.AssetManifest(str(static)).build()
+    src, out = static / "js" / "app.js", static / "dist" / m.hashed("js/app.js")
+    out.unlink(); os.link(src, out)
+    static_assets.AssetManifest(str(static)).build()
+    assert not os.path.samefile(src, out) and out.read_bytes() == src.read_bytes()
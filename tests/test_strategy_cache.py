@@ -0,0 +1,23 @@
+def test_reused_id_does_not_match_deleted_strategy(app, admin_client):
+    """SQLite reutiliza el id más alto tras un borrado: ni el ETag ni la caché pueden confundir las dos filas."""
+    from app import db, Strategy, User, strategy_cache
+    with app.app_context():
+        admin = User.query.filter_by(username="admin").one()
+        owner = {"user_id": admin.id, "team_id": admin.team_id}
+        old = Strategy(name="vieja", car_class="GT3", car_name="x", payload='{"plan": "viejo"}', **owner)
+        db.session.add(old); db.session.commit(); sid, version = old.id, old.version
+
+    first = admin_client.get(f"/api/estrategia/{sid}")
+    etag = first.headers["ETag"]
+    assert first.get_json()["payload"] == {"plan": "viejo"}
+
+    # borrado en "otro worker": la caché de este proceso no se entera
+    with app.app_context():
+        db.session.delete(db.session.get(Strategy, sid)); db.session.commit()
+        new = Strategy(name="nueva", car_class="GT3", car_name="x", payload='{"plan": "nuevo"}', **owner)
+        db.session.add(new); db.session.commit()
+        assert new.id == sid and new.version == version
+
+    assert admin_client.get(f"/api/estrategia/{sid}", headers={"If-None-Match": etag}).status_code == 200
+    assert admin_client.get(f"/api/estrategia/{sid}").get_json()["payload"] == {"plan": "nuevo"}
+    assert strategy_cache.stats()["entries"] >= 2
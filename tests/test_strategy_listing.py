@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def strategies(app):
+    """Estrategias del admin (una parte compartidas con el equipo y sin fecha) y de otro usuario del equipo."""
+    from app import db, Strategy, Team, User
+    with app.app_context():
+        team = Team.query.filter_by(name="Legacy eSports").one()
+        admin = User.query.filter_by(username="admin").one()
+        other = User(username="strat-owner", email="strat-owner@test", password_hash="x", team_id=team.id, is_approved=True)
+        db.session.add(other); db.session.flush()
+        base = datetime(2026, 1, 1)
+        for i in range(300):
+            owner = admin if i % 3 else other
+            db.session.add(Strategy(name=f"s{i}", car_class="GT3", car_name="x", payload="{}", user_id=owner.id, team_id=team.id,
+                                    is_shared=owner is other and i % 2 == 0, created_at=base + timedelta(minutes=i // 2)))   # fechas repetidas: desempate por id
+        db.session.commit()
+        # filas heredadas sin fecha (el default del modelo no deja crearlas por el ORM)
+        db.session.execute(db.update(Strategy).where(Strategy.id % 25 == 0).values(created_at=None)); db.session.commit()
+        yield admin.id, team.id
+        Strategy.query.delete(); db.session.delete(other); db.session.commit()
+
+
+def query_plan(stmt):
+    from app import db
+    sql = str(stmt.compile(db.engine, compile_kwargs={"literal_binds": True}))
+    return [row[3] for row in db.session.execute(db.text("EXPLAIN QUERY PLAN " + sql))]
+
+
+@pytest.mark.parametrize("before", [None, (datetime(2026, 1, 1, 1), 500), (None, 500)])
+def test_listing_uses_composite_indexes(app, strategies, before):
+    from app import strategy_page_select
+    user_id, team_id = strategies
+    with app.app_context():
+        plan = query_plan(strategy_page_select(user_id, team_id, before, limit=20))
+    assert any("ix_strategy_user_created" in step for step in plan), plan
+    assert any("ix_strategy_team_shared_created" in step for step in plan), plan
+    assert not any(step.startswith("SCAN strategy") for step in plan), plan
+
+
+def test_keyset_pages_cover_everything_once(app, admin_client, strategies):
+    from app import Strategy
+    user_id, team_id = strategies
+    with app.app_context():
+        expected = {s.id for s in Strategy.query.filter((Strategy.user_id == user_id) | ((Strategy.team_id == team_id) & (Strategy.is_shared == True)))}
+    seen, cursor = [], None
+    while True:
+        resp = admin_client.get("/api/estrategias", query_string={"limit": 17, **({"before": cursor} if cursor else {})})
+        assert resp.status_code == 200
+        body = resp.get_json()
+        seen += [s["id"] for s in body["strategies"]]
+        cursor = body["next"]
+        if not cursor: break
+    assert len(seen) == len(set(seen))
+    assert set(seen) == expected
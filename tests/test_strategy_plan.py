@@ -0,0 +1,42 @@
+import pytest
+
+BASE = {"mode": "time", "duration": "1:00:00", "lap_time": "1:45", "fuel_per_lap": 3.0, "tank": 100}
+
+
+@pytest.mark.parametrize("body", [{**BASE, "pilots": "Ana"}, {**BASE, "pilots": ["Ana"]}, {**BASE, "pilots": {"name": "Ana"}}, [BASE]])
+def test_malformed_input_is_a_400(admin_client, body):
+    resp = admin_client.post("/api/strategy/plan", json=body)
+    assert resp.status_code == 400
+    assert resp.get_json()["ok"] is False
+
+
+def test_valid_plan(admin_client):
+    resp = admin_client.post("/api/strategy/plan", json={**BASE, "pilots": [{"name": "Ana", "lap_s": 105}]})
+    assert resp.status_code == 200 and resp.get_json()["ok"]
+
+
+@pytest.mark.parametrize("extra", [
+    {"duration": "999:00:00"},
+    {"mode": "laps", "laps": 10 ** 7},
+    {"pilots": [{"name": f"P{i}", "lap_s": 105} for i in range(200)]},
+])
+def test_oversized_search_is_a_400(admin_client, extra):
+    resp = admin_client.post("/api/strategy/plan", json={**BASE, "pilots": [{"name": "Ana", "lap_s": 105}, {"name": "Bea", "lap_s": 106}], **extra})
+    assert resp.status_code == 400 and resp.get_json()["ok"] is False
+
+
+def test_consecutive_stints_clamped():
+    # antes: (720, 2000, 865) int16 = 2.3 GiB y MemoryError (500)
+    import stint_planner
+    body = {**BASE, "duration": "24:00:00", "min_stint_laps": 1, "max_consecutive_stints": 2000, "pilots": [{"name": f"P{i}", "lap_s": 100 + i} for i in range(6)]}
+    req = stint_planner.PlanRequest(body)
+    assert req.max_consecutive == stint_planner.MAX_CONSECUTIVE_STINTS
+    result = stint_planner.plan(req)
+    assert result["plans"] and result["evaluated"] <= stint_planner.MAX_CELLS
+
+
+def test_search_space_checked_before_allocating(monkeypatch):
+    import stint_planner
+    monkeypatch.setattr(stint_planner, "MAX_CELLS", 1000)
+    with pytest.raises(ValueError, match="demasiado grande"):
+        stint_planner.plan({**BASE, "duration": "24:00:00", "min_stint_laps": 1, "pilots": [{"name": f"P{i}", "lap_s": 100 + i} for i in range(6)]})
@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+import telemetry_service
+
+
+async def _exchange(raw):
+    svc = telemetry_service.TelemetryService()
+    server = await asyncio.start_server(svc.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw); await writer.drain()
+        reply = await asyncio.wait_for(reader.read(), 5)
+        writer.close()
+    return reply, svc
+
+
+@pytest.mark.parametrize("length", [b"abc", b"-5", b"1e3"])
+def test_malformed_content_length_is_400(length):
+    reply, svc = asyncio.run(_exchange(b"POST /api/telemetry/ingest HTTP/1.1\r\nHost: x\r\nContent-Length: " + length + b"\r\n\r\n{}"))
+    assert reply.startswith(b"HTTP/1.1 400 ") and b"Content-Length" in reply
+    assert svc.connections == 0 and svc.seq == 0
+
+
+def test_valid_request_still_served():
+    reply, _ = asyncio.run(_exchange(b"GET /healthz HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n"))
+    assert reply.startswith(b"HTTP/1.1 200 ") and b'"ok":true' in reply
@@ -0,0 +1,76 @@
+import multiprocessing
+import struct
+
+import pytest
+
+import telemetry_store
+from telemetry_store import FrameTooLarge, TelemetryStore
+
+WRITERS, UPDATES = 3, 150
+
+pytestmark = pytest.mark.skipif(telemetry_store.fcntl is None, reason="sin flock: un solo proceso")
+
+
+def _bump(state):
+    n = state.get("n", 0) + 1
+    pad = "x" * (n * 37 % 5000)                      # frames de longitud variable: una lectura rota no cuadraría
+    return {**state, "n": n, "pad": pad, "check": n * 10007 + len(pad)}
+
+
+def _writer(store, path, fresh):
+    if fresh: store = TelemetryStore(path)
+    for _ in range(UPDATES): store.update(_bump)
+
+
+def test_new_file_has_defaults_and_state_survives_reopen(tmp_path):
+    path = str(tmp_path / "t.shm")
+    store = TelemetryStore(path, defaults={"connected": False})
+    assert store.state() == {"connected": False} and store.seq() % 2 == 0
+    store.update(lambda s: {**s, "connected": True, "speed": 212})
+    store.close()
+    again = TelemetryStore(path, defaults={"connected": False})
+    assert again.state() == {"connected": True, "speed": 212}
+    again.close()
+
+
+@pytest.mark.parametrize("fresh", [False, True], ids=["forked", "opened"])
+def test_writers_in_other_processes_serialize_and_readers_see_whole_frames(tmp_path, fresh):
+    path = str(tmp_path / "t.shm")
+    store = TelemetryStore(path)
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_writer, args=(None if fresh else store, path, fresh)) for _ in range(WRITERS)]
+    for p in procs: p.start()
+    reader, last, reads = TelemetryStore(path), 0, 0
+    while any(p.is_alive() for p in procs) or reads == 0:
+        s = reader.state(); reads += 1
+        n = s.get("n", 0)
+        assert n >= last and (n == 0 or s["check"] == n * 10007 + len(s["pad"]))
+        last = n
+    for p in procs: p.join(); assert p.exitcode == 0
+    assert reader.state()["n"] == WRITERS * UPDATES                  # ningún read-modify-write perdido
+    reader.close(); store.close()
+
+
+def test_reader_retries_while_a_write_is_in_progress(tmp_path, monkeypatch):
+    store = TelemetryStore(str(tmp_path / "t.shm"))
+    store.update(lambda s: {"n": 1})
+    seq = store.seq()
+    struct.pack_into("<Q", store._mm, telemetry_store.SEQ_OFF, seq + 1)   # escritor muerto a mitad de frame
+    store._cache = (None, None)
+    monkeypatch.setattr(telemetry_store, "READ_RETRIES", 5)
+    with pytest.raises(RuntimeError):
+        store.state()
+    assert store.retries == 5
+    store.update(lambda s: {"n": 2})                                 # el siguiente escritor recupera una seq par
+    assert store.seq() == seq + 4 and store.state() == {"n": 2}
+    store.close()
+
+
+def test_frame_too_large_leaves_the_frame_untouched(tmp_path):
+    store = TelemetryStore(str(tmp_path / "t.shm"), capacity=256)
+    store.update(lambda s: {"n": 1})
+    seq = store.seq()
+    with pytest.raises(FrameTooLarge):
+        store.update(lambda s: {"n": 2, "blob": "x" * 300})
+    assert store.seq() == seq and store.read_frame() == (seq, b'{"n":1}') and store.state() == {"n": 1}
+    store.close()
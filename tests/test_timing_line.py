@@ -0,0 +1,125 @@
+import math
+
+import pytest
+
+pytest.importorskip("irsdk")            # dependencia del bridge (PC con iRacing), no del servidor
+import bridge_pro                       # noqa: E402
+
+LAP = 60.0
+HZ = 20
+
+
+class Car:
+    """Ritmo constante: offset = segundos por detrás del líder en la salida."""
+
+    def __init__(self, offset=0.0, lap_time=LAP, start_pct=0.0):
+        self.offset, self.lap_time, self.start_pct = offset, lap_time, start_pct
+
+    def dist(self, t):
+        return self.start_pct + (t - self.offset) / self.lap_time      # vueltas recorridas (continuo)
+
+    def pct(self, t):
+        return self.dist(t) % 1.0
+
+    def completed(self, t):
+        return max(0, math.floor(self.dist(t)))
+
+
+def run(line, cars, t_from, t_to, hz=HZ, override=None):
+    n = int(round((t_to - t_from) * hz))
+    for i in range(n + 1):
+        t = t_from + i / hz
+        pcts, laps = [c.pct(t) for c in cars], [c.completed(t) for c in cars]
+        if override: override(t, pcts, laps)
+        line.sample(t, pcts, laps)
+    return t_from + n / hz
+
+
+def test_constant_pace_gaps_and_intervals_match_truth():
+    # 60 coches a 20 Hz, separados 0.9 s (todos en la vuelta del líder); el último rueda 0.4 s/vuelta más lento
+    cars = [Car(offset=i * 0.9) for i in range(59)] + [Car(offset=59 * 0.9, lap_time=LAP + 0.4)]
+    line = bridge_pro.TimingLine()
+    end = run(line, cars, 100.0, 100.0 + 3 * LAP)
+    for i in range(1, 59):
+        assert line.gap(i, 0) == (pytest.approx(i * 0.9, abs=1e-6), 0)
+        assert line.gap(i, i - 1) == (pytest.approx(0.9, abs=1e-6), 0)
+    # el lento pierde 0.4 s por vuelta: en el checkpoint x (vueltas desde la salida) va 53.1 + 0.4·x por detrás
+    x = math.floor(cars[59].dist(end) * line.k) / line.k
+    assert line.gap(59, 0) == (pytest.approx(59 * 0.9 + 0.4 * x, abs=1e-6), 0)
+    assert bridge_pro.format_gap(*line.gap(3, 0)) == "+2.7"
+
+
+def test_gap_across_the_line_uses_same_lap_checkpoints():
+    cars = [Car(0.0), Car(2.5)]
+    line = bridge_pro.TimingLine()
+    # el líder acaba de cruzar la meta y el segundo no: cada uno en una vuelta distinta en los checkpoints 0-1
+    end = run(line, cars, 100.0, 240.6)                       # líder en 4.01 vueltas, segundo en 3.96
+    assert cars[0].completed(end) == cars[1].completed(end) + 1
+    assert line.gap(1, 0) == (pytest.approx(2.5, abs=1e-6), 0)
+
+
+def test_ahead_of_reference_is_negative():
+    cars = [Car(0.0), Car(1.5)]
+    line = bridge_pro.TimingLine()
+    run(line, cars, 100.0, 150.0)
+    assert line.gap(0, 1) == (pytest.approx(-1.5, abs=1e-6), 0)
+    assert bridge_pro.format_gap(*line.gap(0, 1)) == "-1.5"
+
+
+def test_lapped_car_reports_laps_down():
+    cars = [Car(0.0), Car(0.5, lap_time=LAP * 1.6)]
+    line = bridge_pro.TimingLine()
+    end = run(line, cars, 100.0, 100.0 + 5 * LAP)
+    behind = math.floor(cars[0].dist(end)) - math.floor(cars[1].dist(end))
+    seconds, laps = line.gap(1, 0)
+    assert seconds is None and laps >= 1 and abs(laps - behind) <= 1
+    assert bridge_pro.format_gap(seconds, laps) == f"+{laps} L"
+
+
+def test_tow_jump_is_not_interpolated():
+    cars = [Car(0.0), Car(3.0)]
+    line = bridge_pro.TimingLine()
+    t = run(line, cars, 100.0, 139.8)                         # coche 1 a 0.28 de su tercera vuelta
+    lap_before = line.cp_lap[1][60]
+
+    def tow(t, pcts, laps):
+        pcts[1] = 0.9                                            # grúa: salto de más de 1/4 de vuelta
+    run(line, cars, t + 1 / HZ, t + 1 / HZ, override=tow)
+    assert line.cp_lap[1][60] == lap_before                      # los checkpoints saltados no se inventan
+    assert line.last_cp[1] < 60
+    assert line.progress(1) == pytest.approx(line.lap[1] + 0.9)
+
+
+def test_tow_across_the_line_still_counts_the_lap():
+    line = bridge_pro.TimingLine()
+    line.sample(10.0, [0.80], [3]); line.sample(10.1, [0.85], [3])
+    lap = line.lap[0]
+    line.sample(10.2, [0.20], [3])                               # 0.85 -> 0.20 pasando por meta: 0.35 de vuelta
+    assert line.lap[0] == lap + 1
+
+
+def test_start_behind_the_line_resyncs_to_lap_completed():
+    # el segundo sale por detrás de la meta (0.97): su primer cruce no es una vuelta para iRacing
+    cars = [Car(0.0, start_pct=0.02), Car(0.0, start_pct=-0.03)]
+    line = bridge_pro.TimingLine()
+    run(line, cars, 0.0, 0.7 * LAP)
+    assert line.lap[1] == 0 == line.lap[0]
+    assert line.gap(1, 0) == (pytest.approx(0.05 * LAP, abs=1e-6), 0)
+
+
+def test_session_restart_resets_buffers():
+    cars = [Car(0.0), Car(2.0)]
+    line = bridge_pro.TimingLine()
+    run(line, cars, 100.0, 160.0)
+    assert line.gap(1, 0)[0] is not None
+    line.sample(5.0, [c.pct(5.0) for c in cars], [0, 0])         # SessionTime vuelve atrás: nueva sesión
+    assert line.gap(1, 0) == (None, 0) and max(line.last_cp) == -1
+
+
+def test_race_gap_estimates_until_a_common_checkpoint(monkeypatch):
+    line = bridge_pro.TimingLine()
+    monkeypatch.setattr(bridge_pro, "TIMING", line)
+    line.sample(100.0, [0.50, 0.45], [2, 2])                     # recién conectado: solo referencia
+    assert bridge_pro.race_gap(1, 0, LAP) == (pytest.approx(0.05 * LAP), 0)
+    line.sample(100.1, [0.50, 0.45, 0.30], [2, 2, 0])            # llega un coche dos vueltas por detrás
+    assert bridge_pro.race_gap(2, 1, LAP) == (None, 2)
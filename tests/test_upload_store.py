@@ -0,0 +1,63 @@
+import io
+import os
+from datetime import timedelta
+
+import pytest
+
+import image_variants
+import upload_store
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _png(color):
+    buf = io.BytesIO(); Image.new("RGB", (40, 30), color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_write_blob_dedupes_by_content(tmp_path):
+    data = _png((1, 2, 3))
+    first = upload_store.write_blob(io.BytesIO(data), str(tmp_path), "foto.PNG")
+    again = upload_store.write_blob(io.BytesIO(data), str(tmp_path), "otra.png")
+    other_ext = upload_store.write_blob(io.BytesIO(data), str(tmp_path), "renombrada.jpeg")
+    assert first[2] and first[1] == len(data) and upload_store.is_blob(first[0]) and first[0].endswith(".png")
+    assert again == (first[0], len(data), False) and other_ext == (first[0], len(data), False)
+    assert os.listdir(tmp_path) == [first[0]]                              # sin temporales .upload-*
+    assert (tmp_path / first[0]).read_bytes() == data
+    assert upload_store.extension("x.JPEG") == "jpg" and upload_store.extension("sin_ext") == "bin"
+
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    calls = []
+    monkeypatch.setattr(image_variants, "enqueue", lambda upload_dir, name: calls.append(name))
+    return calls
+
+
+def test_uploads_share_blobs_and_gc_keeps_referenced(app, admin_client, enqueued):
+    from app import db, Driver, Palmares, UploadBlob, gc_uploads
+    upload_dir = app.config["UPLOAD_FOLDER"]
+    photo, diploma = _png((10, 200, 30)), _png((250, 5, 90))
+    for name in ("Blob A", "Blob B"):
+        admin_client.post("/drivers", data={"name": name, "photo": (io.BytesIO(photo), "cara.png")}, content_type="multipart/form-data")
+    with app.app_context():
+        a, b = (Driver.query.filter_by(name=n).one() for n in ("Blob A", "Blob B"))
+        assert a.photo == b.photo and upload_store.is_blob(a.photo)
+        assert enqueued == [a.photo]                                       # variantes solo para el blob nuevo
+        assert db.session.get(UploadBlob, a.photo).size == len(photo)
+        shared, driver_id = a.photo, a.id
+
+    admin_client.post(f"/drivers/palmares/add/{driver_id}", data={"title": "GT3", "diploma": (io.BytesIO(diploma), "diploma.png")}, content_type="multipart/form-data")
+    with app.app_context():
+        p = Palmares.query.filter_by(driver_id=driver_id, title_name="GT3").one()
+        orphan, pid = p.image, p.id
+    admin_client.post(f"/drivers/palmares/delete/{pid}")
+    with app.app_context():
+        assert db.session.get(UploadBlob, orphan) is not None              # aún dentro del periodo de gracia
+        os.makedirs(os.path.join(upload_dir, image_variants.VARIANT_DIR), exist_ok=True)
+        with open(os.path.join(upload_dir, image_variants.VARIANT_DIR, f"{orphan}.card-480.webp"), "wb") as f: f.write(b"v" * 10)
+        count, freed = gc_uploads(grace=timedelta(0))
+        assert count >= 1 and freed >= len(diploma) + 10
+        assert db.session.get(UploadBlob, orphan) is None and not os.path.exists(os.path.join(upload_dir, orphan))
+        assert not os.path.exists(os.path.join(upload_dir, image_variants.VARIANT_DIR, f"{orphan}.card-480.webp"))
+        assert db.session.get(UploadBlob, shared) is not None and os.path.exists(os.path.join(upload_dir, shared))
@@ -0,0 +1,74 @@
+# ==========================================
+# ALMACÉN DE SUBIDAS POR CONTENIDO (SHA-256)
+# ==========================================
+# Cada archivo subido se guarda una sola vez como static/uploads/<sha256>.<ext>:
+# subir la misma foto o diploma otra vez reutiliza el blob existente. Como el
+# nombre depende del contenido, la URL nunca cambia de significado y se puede
+# cachear como immutable. Driver.photo / Palmares.image guardan ese nombre y la
+# tabla upload_blob (modelo UploadBlob en app.py) registra los blobs para que
+# gc_uploads() borre los que ya nadie referencia.
+
+import hashlib
+import os
+import re
+import tempfile
+
+import image_variants
+
+BLOB_RE = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+CHUNK = 1024 * 1024
+KNOWN_EXTENSIONS = ("jpg", "png", "webp", "gif", "pdf")
+
+
+def is_blob(name):
+    return bool(name and BLOB_RE.match(name))
+
+
+def extension(filename):
+    ext = filename.rsplit(".", 1)[1].lower() if "." in filename else "bin"
+    return "jpg" if ext == "jpeg" else ext
+
+
+def find_blob(upload_dir, sha, ext):
+    """Nombre del blob con ese hash si ya existe (el mismo contenido pudo subirse con otra extensión)."""
+    return next((f"{sha}.{e}" for e in dict.fromkeys((ext,) + KNOWN_EXTENSIONS) if os.path.exists(os.path.join(upload_dir, f"{sha}.{e}"))), None)
+
+
+def write_blob(stream, upload_dir, filename):
+    """Copia stream a disco por bloques calculando el hash. Devuelve (nombre_blob, tamaño, nuevo)."""
+    h, size = hashlib.sha256(), 0
+    fd, tmp = tempfile.mkstemp(dir=upload_dir, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: stream.read(CHUNK), b""):
+                h.update(chunk); out.write(chunk); size += len(chunk)
+        sha, ext = h.hexdigest(), extension(filename)
+        if existing := find_blob(upload_dir, sha, ext): return existing, size, False
+        name = f"{sha}.{ext}"
+        os.chmod(tmp, 0o644)                # mkstemp crea 0600; el servidor web tiene que poder leerlo
+        os.replace(tmp, os.path.join(upload_dir, name)); tmp = None
+        return name, size, True
+    finally:
+        if tmp: os.remove(tmp)
+
+
+def adopt(upload_dir, filename):
+    """Copia un archivo heredado (nombre con timestamp) a su blob. Devuelve (nombre_blob, tamaño, nuevo); el original sigue ahí."""
+    with open(os.path.join(upload_dir, filename), "rb") as f: return write_blob(f, upload_dir, filename)
+
+
+def remove_legacy(upload_dir, filename):
+    """Borra un archivo heredado ya adoptado y sus variantes (después del commit que lo sustituye)."""
+    try: os.remove(os.path.join(upload_dir, filename))
+    except FileNotFoundError: pass
+    image_variants.remove(upload_dir, filename)
+
+
+def remove_blob(upload_dir, name):
+    """Borra el blob y sus variantes. Devuelve los bytes liberados."""
+    freed = image_variants.remove(upload_dir, name)
+    try:
+        path = os.path.join(upload_dir, name)
+        freed += os.path.getsize(path); os.remove(path)
+    except FileNotFoundError: pass
+    return freed